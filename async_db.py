@@ -0,0 +1,159 @@
+"""
+Asyncio façade for db_operations.
+
+AsyncRecipeDB runs the blocking db_operations functions on dedicated worker
+threads so they never stall the event loop:
+
+* reads go to a bounded pool of reader threads, each with its own long-lived
+  connection (WAL mode lets them all read while a write is in progress);
+* writes go to a single writer thread with its own connection, since SQLite
+  only allows one writer at a time and several would just contend for the lock.
+
+At most `max_pending` operations may be queued or running at once; further
+callers wait in line (backpressure) instead of piling work onto the executors.
+Cancelling an awaiting caller drops its job if it hasn't started, or interrupts
+the running SQLite statement if it has.
+
+    async with AsyncRecipeDB(readers=8) as db:
+        details = await db.get_recipe_details(42)
+"""
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import database_setup
+import db_operations
+import instrumentation
+
+class AsyncRecipeDB:
+    """Async versions of the db_operations API backed by per-worker connections."""
+
+    def __init__(self, database=None, readers=4, max_pending=64):
+        self.database = database or db_operations.DATABASE_FILE
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='recipe-db-reader',
+                                                 initializer=self._open_worker_connection)
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recipe-db-writer',
+                                                  initializer=self._open_worker_connection)
+        self._slots = asyncio.Semaphore(max_pending)
+        self._closed = False
+
+    def _open_worker_connection(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=instrumentation.InstrumentedConnection)
+        database_setup.apply_storage_profile(conn)
+        conn.row_factory = sqlite3.Row
+        self._local.conn = conn
+        with self._connections_lock:
+            self._connections.append(conn)
+
+    async def _run(self, executor, fn, *args, **kwargs):
+        """Runs fn(*args, conn=<worker connection>, **kwargs) on `executor` and awaits the result."""
+        if self._closed:
+            raise RuntimeError("AsyncRecipeDB is closed")
+
+        async with self._slots:
+            job_lock = threading.Lock()
+            job = {'conn': None, 'cancelled': False}
+
+            def call():
+                with job_lock:
+                    if job['cancelled']:
+                        return None
+                    job['conn'] = self._local.conn
+                instrumentation.apply_hooks(self._local.conn)
+                try:
+                    return fn(*args, conn=self._local.conn, **kwargs)
+                finally:
+                    with job_lock:
+                        job['conn'] = None
+
+            future = asyncio.get_running_loop().run_in_executor(executor, call)
+            try:
+                return await future
+            except asyncio.CancelledError:
+                with job_lock:
+                    job['cancelled'] = True
+                    if job['conn'] is not None:
+                        job['conn'].interrupt()  # The running statement fails with "interrupted".
+                raise
+
+    # Reads
+
+    async def list_all_recipes(self):
+        return await self._run(self._read_executor, db_operations.list_all_recipes)
+
+    async def list_recipes_page(self, page_size=20, after=None):
+        return await self._run(self._read_executor, db_operations.list_recipes_page, page_size, after)
+
+    async def search_recipe_by_name(self, search_term):
+        return await self._run(self._read_executor, db_operations.search_recipe_by_name, search_term)
+
+    async def search_recipes(self, query, mode='all', limit=20):
+        return await self._run(self._read_executor, db_operations.search_recipes, query, mode, limit)
+
+    async def get_recipe_details(self, recipe_id):
+        return await self._run(self._read_executor, db_operations.get_recipe_details, recipe_id)
+
+    async def get_recipe_details_many(self, recipe_ids):
+        return await self._run(self._read_executor, db_operations.get_recipe_details_many, list(recipe_ids))
+
+    async def get_similar_recipes(self, recipe_id, limit=5):
+        return await self._run(self._read_executor, db_operations.get_similar_recipes, recipe_id, limit)
+
+    async def find_recipes_by_pantry(self, pantry, max_missing=0, limit=20):
+        return await self._run(self._read_executor, db_operations.find_recipes_by_pantry, list(pantry), max_missing, limit)
+
+    # Writes
+
+    async def add_recipe(self, recipe_name, description, ingredients_list, instructions_list):
+        return await self._run(self._write_executor, db_operations.add_recipe,
+                               recipe_name, description, ingredients_list, instructions_list)
+
+    async def update_recipe(self, recipe_id, recipe_name=None, description=None, ingredients_list=None, instructions_list=None):
+        return await self._run(self._write_executor, db_operations.update_recipe,
+                               recipe_id, recipe_name, description, ingredients_list, instructions_list)
+
+    async def delete_recipe(self, recipe_id):
+        return await self._run(self._write_executor, db_operations.delete_recipe, recipe_id)
+
+    async def add_recipes_bulk(self, recipes, batch_size=1000):
+        """Note: `recipes` is consumed on the writer thread, so pass a list rather than a slow generator."""
+        return await self._run(self._write_executor, db_operations.add_recipes_bulk, recipes, batch_size)
+
+    # Lifecycle
+
+    async def close(self):
+        """Waits for running work to finish, then closes every worker connection."""
+        if self._closed:
+            return
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._read_executor.shutdown)
+        await loop.run_in_executor(None, self._write_executor.shutdown)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+if __name__ == '__main__':
+    import time
+
+    async def demo():
+        async with AsyncRecipeDB(readers=4) as db:
+            recipes = await db.list_all_recipes()
+            ids = [recipe_id for recipe_id, _ in recipes][:200]
+            started = time.perf_counter()
+            results = await asyncio.gather(*(db.get_recipe_details(recipe_id) for recipe_id in ids))
+            elapsed = time.perf_counter() - started
+            print(f"Fetched {sum(1 for r in results if r)} recipes concurrently in {elapsed * 1000:.1f} ms")
+
+    asyncio.run(demo())
@@ -0,0 +1,165 @@
+"""
+Prefix autocomplete for recipe and ingredient names.
+
+RecipeName and IngredientName are UNIQUE ... COLLATE NOCASE, so their unique
+indexes already hold the names in case-folded order. A prefix query is a
+bounded range scan of that index,
+
+    RecipeName >= 'pre' AND RecipeName < 'prf' ORDER BY RecipeName LIMIT n
+
+(the comparisons use the column's NOCASE collation, so the bounds are case-folded
+the same way: ASCII letters only). Unlike LIKE 'pre%', this needs no escaping of
+'%' and '_' in what the user typed and doesn't depend on the LIKE optimization
+(which PRAGMA case_sensitive_like turns off).
+
+Matches are ranked by popularity:
+* ingredients by how many recipes use them (IngredientUsage, see recipe_stats.py),
+  ties oldest first. Counting the name range (up to SCAN_LIMIT + 1 index
+  entries) picks the plan: a narrow prefix is ranked from its name range, a
+  broad one walks the RecipeCount index from the most used ingredient down and
+  stops after `limit` matches, which for a prefix that broad come early;
+* recipes by how often they were opened in this process (RecipeViews), then by
+  name. Only the first `limit` names of the range can place among recipes that
+  were never opened, so the scan reads `limit` rows plus the opened recipes that match.
+
+The view counts are deliberately per process: counting in the database would
+turn every recipe read into a write. They start from zero on restart and are
+not shared between the CLI, the server and the menu. db_operations renames and
+forgets entries as it updates and deletes recipes, and the names of tracked
+recipes are checked against the database before they are ranked, so renames
+and deletes made elsewhere (or rolled back) never surface a stale name.
+"""
+import heapq
+import json
+import threading
+
+SCAN_LIMIT = 1000  # Most ingredient matches ranked from the name range before walking the popularity index
+
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def name_key(text):
+    """Returns the case-folded form NOCASE compares names by (ASCII letters only), without leading spaces."""
+    return text.lstrip().translate(_ASCII_LOWER)
+
+def prefix_bounds(key):
+    """
+    Returns (low, high) such that low <= k < high exactly when k starts with `key`;
+    high is None when there is no upper bound (an empty key).
+    """
+    if not key:
+        return '', None
+    last = ord(key[-1]) + 1
+    if 0xD800 <= last <= 0xDFFF:
+        last = 0xE000  # Surrogates can't be encoded; the next real code point follows them.
+    if last > 0x10FFFF:
+        return key, prefix_bounds(key[:-1])[1]
+    return key, key[:-1] + chr(last)
+
+def _range(column, low, high):
+    """Returns the WHERE clause and parameters for `column` in [low, high)."""
+    if high is None:
+        return f"{column} >= ?", (low,)
+    return f"{column} >= ? AND {column} < ?", (low, high)
+
+class RecipeViews:
+    """
+    Thread-safe in-memory count of how often each recipe was opened, used as
+    recipe popularity. At most `max_tracked` recipes are remembered; when the
+    table is full the less-viewed half is forgotten.
+    """
+
+    def __init__(self, max_tracked=10000):
+        self.max_tracked = max_tracked
+        self._lock = threading.Lock()
+        self._views = {}  # RecipeID -> [views, name key, RecipeName]
+
+    def record(self, recipe_id, name):
+        with self._lock:
+            entry = self._views.get(recipe_id)
+            if entry is None:
+                if len(self._views) >= self.max_tracked:
+                    keep = heapq.nlargest(self.max_tracked // 2, self._views.items(), key=lambda item: item[1][0])
+                    self._views = dict(keep)
+                entry = self._views[recipe_id] = [0, None, None]
+            entry[0] += 1
+            entry[1:] = [name_key(name), name]  # Follows renames.
+
+    def rename(self, recipe_id, name):
+        """Follows a recipe's rename, keeping its count."""
+        with self._lock:
+            entry = self._views.get(recipe_id)
+            if entry is not None:
+                entry[1:] = [name_key(name), name]
+
+    def forget(self, recipe_ids):
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._views.pop(recipe_id, None)
+
+    def matching(self, low, high):
+        """Returns (views, name key, RecipeID, RecipeName) for every tracked recipe whose key is in [low, high)."""
+        with self._lock:
+            return [(views, key, recipe_id, name) for recipe_id, (views, key, name) in self._views.items()
+                    if key >= low and (high is None or key < high)]
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+def complete_recipes(conn, prefix, limit, views):
+    """
+    Returns up to `limit` recipes whose name starts with `prefix` (case-insensitive),
+    most viewed first, then in name order, as dicts with 'id', 'name' and 'popularity'.
+    """
+    low, high = prefix_bounds(name_key(prefix))
+    where, params = _range('RecipeName', low, high)
+    cursor = conn.execute(f"SELECT RecipeID, RecipeName FROM Recipes WHERE {where} ORDER BY RecipeName LIMIT ?",
+                          (*params, limit))
+    candidates = {row[0]: (0, name_key(row[1]), row[0], row[1]) for row in cursor.fetchall()}
+    # Most viewed first; once `limit` of them check out, no later one can place.
+    viewed = sorted(views.matching(low, high), key=lambda c: (-c[0], c[1]))
+    confirmed = 0
+    for start in range(0, len(viewed), limit):
+        chunk = viewed[start:start + limit]
+        current = {row[0]: row[1] for row in conn.execute(
+            "SELECT RecipeID, RecipeName FROM Recipes WHERE RecipeID IN (SELECT value FROM json_each(?))",
+            (json.dumps([recipe_id for _, _, recipe_id, _ in chunk]),))}
+        for count, _, recipe_id, _ in chunk:
+            name = current.get(recipe_id)
+            key = name_key(name) if name is not None else None
+            if key is not None and key >= low and (high is None or key < high):
+                candidates[recipe_id] = (count, key, recipe_id, name)
+                confirmed += 1
+        if confirmed >= limit:
+            break
+    ranked = sorted(candidates.values(), key=lambda c: (-c[0], c[1]))[:limit]
+    return [{'id': recipe_id, 'name': name, 'popularity': count} for count, _, recipe_id, name in ranked]
+
+def complete_ingredients(conn, prefix, limit):
+    """
+    Returns up to `limit` ingredients whose name starts with `prefix` (case-insensitive),
+    most used first, as dicts with 'id', 'name' and 'popularity' (the number of recipes using it).
+    """
+    low, high = prefix_bounds(name_key(prefix))
+    where, params = _range('I.IngredientName', low, high)
+    # Counting (up to SCAN_LIMIT + 1) reads only the name index, so choosing the plan is cheap.
+    matches = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM Ingredients I WHERE {where} LIMIT ?)",
+                           (*params, SCAN_LIMIT + 1)).fetchone()[0]
+    if matches <= SCAN_LIMIT:
+        cursor = conn.execute(f"""
+            SELECT I.IngredientID, I.IngredientName, COALESCE(U.RecipeCount, 0) AS Popularity
+            FROM Ingredients I LEFT JOIN IngredientUsage U ON U.IngredientID = I.IngredientID
+            WHERE {where}
+            ORDER BY Popularity DESC, I.IngredientID
+            LIMIT ?
+        """, (*params, limit))
+    else:
+        # CROSS JOIN keeps IngredientUsage as the outer loop, read in RecipeCount index order.
+        cursor = conn.execute(f"""
+            SELECT I.IngredientID, I.IngredientName, U.RecipeCount
+            FROM IngredientUsage U CROSS JOIN Ingredients I ON I.IngredientID = U.IngredientID
+            WHERE {where}
+            ORDER BY U.RecipeCount DESC, U.IngredientID
+            LIMIT ?
+        """, (*params, limit))
+    return [{'id': row[0], 'name': row[1], 'popularity': row[2]} for row in cursor.fetchall()]
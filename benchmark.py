@@ -0,0 +1,198 @@
+"""
+Benchmark harness for the db_operations entry points.
+
+For each requested catalog size it builds a fresh database from a synthetic
+catalog (see synthetic_catalog.py), then times add, list, search and details
+operations and reports p50/p99 latency, throughput and peak RSS. Every run is
+appended as one JSON object per line to the results file, so runs can be
+compared over time.
+
+Usage:
+    python benchmark.py                          # 10k links
+    python benchmark.py --links 10000 1000000 10000000
+    python benchmark.py --links 1000000 --output results.jsonl --keep /tmp/bench
+
+Peak RSS is the process-wide high-water mark; run one size per invocation for
+clean per-size memory numbers.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import database_setup
+import db_operations
+import synthetic_catalog
+
+DEFAULT_RESULTS_FILE = 'benchmark_results.jsonl'
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure(name, calls, items_per_call=1):
+    """
+    Runs each zero-argument callable in `calls`, timing every call.
+    Returns a result dict with latency percentiles (ms), throughput and peak RSS.
+    """
+    latencies = []
+    started = time.perf_counter()
+    for call in calls:
+        t0 = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'op': name,
+        'calls': len(latencies),
+        'total_s': round(total, 6),
+        'ops_per_sec': round(len(latencies) / total, 2) if total > 0 else None,
+        'items_per_sec': round(len(latencies) * items_per_call / total, 2) if total > 0 else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'max_ms': round(latencies[-1] * 1000, 4) if latencies else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+def build_catalog(path, link_count, seed):
+    """Creates a fresh database at `path` and bulk-loads a synthetic catalog into it."""
+    database_setup.DATABASE_FILE = path
+    db_operations.DATABASE_FILE = path
+    with contextlib.redirect_stdout(io.StringIO()):
+        database_setup.setup_database()
+    started = time.perf_counter()
+    summary = db_operations.add_recipes_bulk(
+        synthetic_catalog.generate_recipes(link_count=link_count, seed=seed), batch_size=10000)
+    seconds = time.perf_counter() - started
+    links = sum(batch['ingredient_links'] for batch in summary['batches'])
+    return {
+        'op': 'add_recipes_bulk (build)',
+        'calls': len(summary['batches']),
+        'total_s': round(seconds, 6),
+        'recipes': summary['added'],
+        'links': links,
+        'ops_per_sec': round(summary['added'] / seconds, 2) if seconds > 0 else None,
+        'items_per_sec': round(links / seconds, 2) if seconds > 0 else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+def run_size(link_count, args, workdir):
+    """Builds one catalog and times every entry point against it. Returns the list of result dicts."""
+    path = os.path.join(workdir, f"benchmark_{link_count}.db")
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    results = [build_catalog(path, link_count, args.seed)]
+    rng = random.Random(args.seed)
+
+    conn = sqlite3.connect(path)
+    ids = [row[0] for row in conn.execute("SELECT RecipeID FROM Recipes")]
+    ingredient_names = [row[0] for row in conn.execute("SELECT IngredientName FROM Ingredients")]
+    conn.close()
+    n = args.iterations
+
+    def sample_ids(k):
+        return [rng.choice(ids) for _ in range(k)]
+
+    # Reads
+    results.append(measure('get_recipe_details', [lambda i=i: db_operations.get_recipe_details(i) for i in sample_ids(n)]))
+    batches = [sample_ids(100) for _ in range(max(1, n // 100))]
+    results.append(measure('get_recipe_details_many (100 ids)',
+                           [lambda b=b: db_operations.get_recipe_details_many(b) for b in batches], items_per_call=100))
+
+    terms = [rng.choice(synthetic_catalog.DISHES) + (str(rng.randint(1, 9)) if rng.random() < 0.5 else '') for _ in range(n)]
+    results.append(measure('search_recipe_by_name', [lambda t=t: db_operations.search_recipe_by_name(t) for t in terms[:args.scan_iterations]]))
+    queries = [' '.join(rng.sample(ingredient_names, 2)) for _ in range(n)]
+    results.append(measure('search_recipes (full-text)', [lambda q=q: db_operations.search_recipes(q, mode='any') for q in queries]))
+
+    results.append(measure('list_all_recipes', [db_operations.list_all_recipes] * args.scan_iterations))
+    results.append(measure('list_recipes_page (first page)', [lambda: db_operations.list_recipes_page(20)] * n))
+    cursors = [(name, recipe_id) for recipe_id, name in db_operations.list_recipes_page(n, after=None)[0]]
+    results.append(measure('list_recipes_page (next page)', [lambda c=c: db_operations.list_recipes_page(20, after=c) for c in cursors]))
+    results.append(measure('find_recipes_by_pantry',
+                           [lambda p=rng.sample(ingredient_names, min(8, len(ingredient_names))): db_operations.find_recipes_by_pantry(p, max_missing=2)
+                            for _ in range(n)]))
+
+    # Writes last, so reads see the catalog as built.
+    new_recipes = list(synthetic_catalog.generate_recipes(recipe_count=n, seed=args.seed + 1))
+    for i, recipe in enumerate(new_recipes):
+        recipe['name'] = f"Benchmark Added Recipe {i}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        results.append(measure('add_recipe', [
+            lambda r=r: db_operations.add_recipe(r['name'], r['description'], r['ingredients'], r['instructions'])
+            for r in new_recipes]))
+
+    db_operations.close_pool()
+    if not args.keep:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return results
+
+def print_results(link_count, results):
+    print(f"\n=== {link_count:,} recipe-ingredient links ===")
+    print(f"{'operation':<38} {'calls':>7} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>12} {'peak RSS MiB':>13}")
+    for r in results:
+        p50 = f"{r['p50_ms']:.3f}" if 'p50_ms' in r else '-'
+        p99 = f"{r['p99_ms']:.3f}" if 'p99_ms' in r else '-'
+        ops = f"{r['ops_per_sec']:,.1f}" if r.get('ops_per_sec') is not None else '-'
+        print(f"{r['op']:<38} {r['calls']:>7} {p50:>10} {p99:>10} {ops:>12} {r['peak_rss_mb']:>13.1f}")
+    build = results[0]
+    print(f"(built {build['recipes']:,} recipes / {build['links']:,} links in {build['total_s']:.1f}s)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark db_operations against synthetic catalogs.")
+    parser.add_argument('--links', type=int, nargs='+', default=[10000],
+                        help="catalog sizes in recipe-ingredient links (e.g. 10000 1000000 10000000)")
+    parser.add_argument('--iterations', type=int, default=1000, help="calls per point-query operation")
+    parser.add_argument('--scan-iterations', type=int, default=20,
+                        help="calls for operations that scan the whole catalog (list_all_recipes, name search)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=DEFAULT_RESULTS_FILE, help="JSONL file to append results to")
+    parser.add_argument('--keep', help="directory to build databases in (kept afterwards)")
+    args = parser.parse_args(argv)
+
+    workdir = args.keep or tempfile.mkdtemp(prefix='recipe_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        for link_count in args.links:
+            results = run_size(link_count, args, workdir)
+            print_results(link_count, results)
+            record = {
+                'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'links': link_count,
+                'iterations': args.iterations,
+                'seed': args.seed,
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'platform': platform.platform(),
+                'results': results,
+            }
+            with open(args.output, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        print(f"\nResults appended to {args.output}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
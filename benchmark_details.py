@@ -0,0 +1,73 @@
+"""
+Benchmark: per-ID get_recipe_details calls vs. one get_recipe_details_many call.
+
+Builds a throwaway database with enough synthetic recipes (see synthetic_catalog.py)
+for the largest size, then times fetching N recipes both ways.
+
+Usage:
+    python benchmark_details.py [--sizes 10 1000 100000] [--keep DIR]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import database_setup
+import db_operations
+import synthetic_catalog
+
+def build_database(path, recipe_count):
+    """Creates a fresh database at `path` filled with `recipe_count` recipes."""
+    database_setup.DATABASE_FILE = path
+    db_operations.DATABASE_FILE = path
+    with contextlib.redirect_stdout(io.StringIO()):
+        database_setup.setup_database()
+    summary = db_operations.add_recipes_bulk(synthetic_catalog.generate_recipes(recipe_count=recipe_count), batch_size=10000)
+    return summary['added']
+
+def time_call(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-ID and batched recipe detail fetches.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000], help="numbers of IDs to fetch")
+    parser.add_argument('--keep', help="directory to build the database in (kept afterwards)")
+    args = parser.parse_args(argv)
+
+    workdir = args.keep or tempfile.mkdtemp(prefix='recipe_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, 'benchmark.db')
+    if os.path.exists(path):
+        os.remove(path)
+
+    try:
+        total = max(args.sizes)
+        print(f"Building database with {total} recipes in {path} ...")
+        elapsed, added = time_call(lambda: build_database(path, total))
+        print(f"Loaded {added} recipes in {elapsed:.2f}s\n")
+
+        all_ids = [row[0] for row in db_operations.list_all_recipes()]
+        rng = random.Random(7)
+
+        print(f"{'IDs':>8} {'per-ID (s)':>12} {'batched (s)':>12} {'speedup':>9}")
+        for size in args.sizes:
+            ids = rng.sample(all_ids, min(size, len(all_ids)))
+            single_time, singles = time_call(lambda: [db_operations.get_recipe_details(i) for i in ids])
+            batch_time, batched = time_call(lambda: db_operations.get_recipe_details_many(ids))
+            if [d for d in singles if d] != list(batched.values()):
+                print(f"WARNING: results differ for {size} IDs")
+            speedup = single_time / batch_time if batch_time > 0 else float('inf')
+            print(f"{len(ids):>8} {single_time:>12.4f} {batch_time:>12.4f} {speedup:>8.1f}x")
+    finally:
+        db_operations.close_pool()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: memory held by bulk recipe reads in each result form.
+
+Builds a throwaway database of synthetic recipes (see synthetic_catalog.py) and
+loads all of them with get_recipe_details_many (nested dicts), get_recipes
+(recipe_models.Recipe objects) and get_recipe_columns (one RecipeColumns
+batch), reporting the memory each result holds (tracemalloc) and the time
+taken to build it.
+
+Usage:
+    python benchmark_memory.py [--recipes 100000] [--keep DIR]
+"""
+import argparse
+import gc
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import db_operations
+from benchmark_details import build_database
+
+FORMS = [
+    ('dicts (get_recipe_details_many)', db_operations.get_recipe_details_many),
+    ('objects (get_recipes)', db_operations.get_recipes),
+    ('columns (get_recipe_columns)', db_operations.get_recipe_columns),
+]
+
+def measure(load, ids):
+    """
+    Returns (bytes still allocated while the result is alive, seconds to load it).
+    The load is timed in a separate run, since tracing allocations slows it down.
+    """
+    gc.collect()
+    started = time.perf_counter()
+    result = load(ids)
+    elapsed = time.perf_counter() - started
+    del result
+    gc.collect()
+    tracemalloc.start()
+    result = load(ids)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return held, elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the memory held by each recipe result form.")
+    parser.add_argument('--recipes', type=int, default=100000, help="number of recipes to load")
+    parser.add_argument('--keep', help="directory to build the database in (kept afterwards)")
+    args = parser.parse_args(argv)
+
+    workdir = args.keep or tempfile.mkdtemp(prefix='recipe_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, 'benchmark.db')
+    if os.path.exists(path):
+        os.remove(path)
+
+    try:
+        print(f"Building database with {args.recipes} recipes in {path} ...")
+        added = build_database(path, args.recipes)
+        ids = [row[0] for row in db_operations.list_all_recipes()]
+        print(f"Loaded {added} recipes\n")
+
+        print(f"{'form':<34} {'MiB':>8} {'bytes/recipe':>13} {'vs dicts':>9} {'time (s)':>9}")
+        baseline = None
+        for label, load in FORMS:
+            held, elapsed = measure(load, ids)
+            baseline = baseline or held
+            print(f"{label:<34} {held / 2**20:>8.1f} {held / len(ids):>13.0f} {held / baseline:>8.0%} {elapsed:>9.2f}")
+    finally:
+        db_operations.close_pool()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
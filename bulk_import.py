@@ -0,0 +1,324 @@
+"""
+Bulk recipe import from JSONL or CSV files.
+
+JSONL: one recipe object per line, shaped like the sample data:
+    {"name": "...", "description": "...",
+     "ingredients": [{"name": "Salt", "quantity": "1 tsp"}, ...],
+     "instructions": ["Step one.", "Step two."]}
+
+CSV: a header row with the columns name, description, ingredients, instructions.
+    ingredients  - entries separated by ';', each written as "name: quantity"
+    instructions - steps separated by '|'
+
+With --workers N, parsing and validation run in N worker processes, each
+handling a shard of the file (a byte range of whole lines or, for CSV, whole
+records, read by the worker itself), while the main process is the only writer: it
+takes the prepared shards in file order from a bounded queue and writes them
+in large transactions (see import_file_parallel). That single writer bounds the
+import: more workers help only while they parse slower than it writes, and
+only with as many cores; the summary's stages show both rates.
+
+Usage:
+    python bulk_import.py catalog.jsonl [--batch-size 5000] [--workers 4]
+    python bulk_import.py catalog.csv --format csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import bulk_prepare
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_SHARD_SIZE = 1000  # Lines (or CSV records) parsed by a worker per task.
+
+def read_jsonl(path, rejected):
+    """
+    Streams recipe dicts from a JSONL file.
+    Lines that cannot be parsed are appended to `rejected` and skipped.
+    """
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            recipe = _parse_jsonl_line(line, line_number, rejected)
+            if recipe is not None:
+                yield recipe
+
+def _parse_jsonl_line(line, line_number, rejected):
+    """Parses one JSONL line into a recipe dict, or returns None (rejecting it if it isn't blank)."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        recipe = json.loads(line)
+    except json.JSONDecodeError as e:
+        rejected.append({'row': line_number, 'name': None, 'reason': f"invalid JSON: {e}"})
+        return None
+    if not isinstance(recipe, dict):
+        rejected.append({'row': line_number, 'name': None, 'reason': "recipe must be an object"})
+        return None
+    recipe['row'] = line_number
+    return recipe
+
+def parse_csv_ingredients(cell):
+    """Parses "name: quantity; name: quantity" into ingredient dicts."""
+    ingredients = []
+    for entry in (cell or '').split(';'):
+        if not entry.strip():
+            continue
+        name, sep, quantity = entry.partition(':')
+        if not sep:
+            raise ValueError(f"ingredient '{entry.strip()}' has no quantity")
+        ingredients.append({'name': name.strip(), 'quantity': quantity.strip()})
+    return ingredients
+
+def read_csv(path, rejected):
+    """
+    Streams recipe dicts from a CSV file (see module docstring for the columns).
+    Rows that cannot be parsed are appended to `rejected` and skipped.
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            recipe = _parse_csv_row(row, reader.line_num, rejected)
+            if recipe is not None:
+                yield recipe
+
+def _parse_csv_row(row, row_number, rejected):
+    """Turns one CSV row into a recipe dict, or returns None after rejecting it."""
+    try:
+        ingredients = parse_csv_ingredients(row.get('ingredients'))
+    except ValueError as e:
+        rejected.append({'row': row_number, 'name': row.get('name'), 'reason': str(e)})
+        return None
+    instructions = [step.strip() for step in (row.get('instructions') or '').split('|') if step.strip()]
+    return {
+        'row': row_number,
+        'name': row.get('name'),
+        'description': row.get('description'),
+        'ingredients': ingredients,
+        'instructions': instructions,
+    }
+
+def import_file(path, file_format=None, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    """
+    Imports every recipe in `path` using db_operations.add_recipes_bulk.
+    file_format is 'jsonl' or 'csv'; by default it is taken from the file extension.
+    Returns the add_recipes_bulk summary, with file parse errors merged into 'rejected'.
+    """
+    import db_operations  # Not at module level: the worker processes only need bulk_prepare.
+    if file_format is None:
+        file_format = 'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'jsonl'
+
+    parse_rejected = []
+    reader = read_csv if file_format == 'csv' else read_jsonl
+    summary = db_operations.add_recipes_bulk(reader(path, parse_rejected), batch_size=batch_size, on_batch=on_batch)
+    summary['rejected'] = sorted(parse_rejected + summary['rejected'], key=lambda r: r['row'] or 0)
+    return summary
+
+def _jsonl_shards(path, shard_size):
+    """
+    Splits a JSONL file into byte ranges of `shard_size` lines.
+    Yields (start offset, end offset, first line number); only newlines are
+    scanned here, the workers read and parse the lines themselves.
+    """
+    with open(path, 'rb') as f:
+        start = offset = 0
+        first_line = line_number = 1
+        for line in f:
+            offset += len(line)
+            line_number += 1
+            if line_number - first_line >= shard_size:
+                yield start, offset, first_line
+                start, first_line = offset, line_number
+        if offset > start:
+            yield start, offset, first_line
+
+def _csv_shards(path, shard_size):
+    """
+    Splits a CSV file into byte ranges of `shard_size` records. The csv module
+    finds the record boundaries, so a quoted field with line breaks is never
+    split, but only the header row is kept: the workers parse the rows
+    themselves. Yields (start offset, end offset, first line number, header fields).
+    """
+    offset = 0
+
+    def lines(f):
+        nonlocal offset
+        for line in f:
+            offset += len(line.encode('utf-8'))
+            yield line
+
+    with open(path, encoding='utf-8', newline='') as f:
+        reader = csv.reader(lines(f))  # Reads no further than the end of the record it returns.
+        fieldnames = next(reader, None)
+        if fieldnames is None:
+            return
+        start, first_line, records = offset, reader.line_num + 1, 0
+        for _ in reader:
+            records += 1
+            if records >= shard_size:
+                yield start, offset, first_line, fieldnames
+                start, first_line, records = offset, reader.line_num + 1, 0
+        if offset > start:
+            yield start, offset, first_line, fieldnames
+
+def _prepare_jsonl_shard(path, start, end, first_line):
+    """Worker task: parses and prepares one byte range of a JSONL file."""
+    started = time.perf_counter()
+    rejected = []
+    batch = []
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for line_number, line in enumerate(data.split(b'\n'), start=first_line):
+        recipe = _parse_jsonl_line(line.decode('utf-8'), line_number, rejected)
+        if recipe is not None:
+            batch.append((line_number, recipe))
+    return bulk_prepare.prepare_bulk_batch(batch), rejected, time.perf_counter() - started
+
+def _prepare_csv_shard(path, start, end, first_line, fieldnames):
+    """Worker task: parses and prepares one byte range of whole CSV records."""
+    started = time.perf_counter()
+    rejected = []
+    batch = []
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    reader = csv.DictReader(io.StringIO(data.decode('utf-8'), newline=''), fieldnames=fieldnames)
+    for row in reader:
+        row_number = first_line - 1 + reader.line_num
+        recipe = _parse_csv_row(row, row_number, rejected)
+        if recipe is not None:
+            batch.append((row_number, recipe))
+    return bulk_prepare.prepare_bulk_batch(batch), rejected, time.perf_counter() - started
+
+def import_file_parallel(path, workers, file_format=None, batch_size=DEFAULT_BATCH_SIZE,
+                         shard_size=DEFAULT_SHARD_SIZE, max_pending=None, on_batch=None):
+    """
+    Imports `path` like import_file, with parsing and validation spread over
+    `workers` processes. The file is cut into shards of `shard_size` lines; at
+    most `max_pending` shards (default 2 per worker) are queued or in flight, so
+    a slow writer holds the workers back instead of piling up prepared rows in
+    memory. This process is the single writer: it consumes the shards in file
+    order (so duplicates resolve the same way as a serial import) and commits
+    every `batch_size` prepared recipes in one transaction.
+    Returns the import_file summary plus 'stages': seconds and recipes/s for the
+    workers' parsing (time summed over all workers, rate per worker), the writer,
+    and the time the writer spent waiting for the next shard.
+    """
+    import db_operations
+    if file_format is None:
+        file_format = 'csv' if os.path.splitext(path)[1].lower() == '.csv' else 'jsonl'
+    if file_format == 'csv':
+        task, shards = _prepare_csv_shard, ((path, *shard) for shard in _csv_shards(path, shard_size))
+    else:
+        task, shards = _prepare_jsonl_shard, ((path, *shard) for shard in _jsonl_shards(path, shard_size))
+    max_pending = max_pending or 2 * workers
+
+    parse_rejected = []
+    parse_seconds = write_seconds = wait_seconds = 0.0
+    parsed = 0
+    prepared = []
+
+    started = time.perf_counter()
+    with db_operations.bulk_writer(on_batch) as writer, ProcessPoolExecutor(max_workers=workers) as pool:
+        def write(batch):
+            nonlocal write_seconds
+            write_started = time.perf_counter()
+            writer.write(batch)
+            write_seconds += time.perf_counter() - write_started
+
+        def take(future):
+            nonlocal prepared, parse_seconds, wait_seconds, parsed
+            wait_started = time.perf_counter()
+            shard_prepared, shard_rejected, seconds = future.result()
+            wait_seconds += time.perf_counter() - wait_started
+            parse_seconds += seconds
+            parsed += len(shard_prepared) + len(shard_rejected)
+            parse_rejected.extend(shard_rejected)
+            prepared.extend(shard_prepared)
+            if len(prepared) >= batch_size:
+                write(prepared)
+                prepared = []
+
+        pending = deque()
+        for shard in shards:
+            if len(pending) >= max_pending:
+                take(pending.popleft())
+            pending.append(pool.submit(task, *shard))
+        while pending:
+            take(pending.popleft())
+        if prepared:
+            write(prepared)
+    summary = writer.summary
+    summary['seconds'] = time.perf_counter() - started
+
+    summary['rejected'] = sorted(parse_rejected + summary['rejected'], key=lambda r: r['row'] or 0)
+    summary['stages'] = {
+        'workers': workers,
+        'parse_seconds': parse_seconds,
+        'parse_recipes_per_sec': parsed / parse_seconds if parse_seconds > 0 else 0.0,
+        'write_seconds': write_seconds,
+        'write_recipes_per_sec': summary['added'] / write_seconds if write_seconds > 0 else 0.0,
+        'writer_wait_seconds': wait_seconds,
+    }
+    return summary
+
+def print_batch(stats):
+    """Prints one line of per-batch throughput."""
+    print(f"Batch {stats['batch']:>4}: {stats['recipes']:>7} recipes, "
+          f"{stats['ingredient_links']:>8} ingredient links, {stats['steps']:>8} steps, "
+          f"{stats['rejected']:>5} rejected in {stats['seconds']:.3f}s "
+          f"({stats['recipes_per_sec']:,.0f} recipes/s)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import recipes from a JSONL or CSV file.")
+    parser.add_argument('path', help="JSONL or CSV file to import")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="input format (default: from file extension)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="recipes per transaction")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="parse and validate in this many processes (default: 0, all in this process)")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help="lines (CSV: records) per worker task")
+    parser.add_argument('--show-rejected', type=int, default=20, help="how many rejected rows to list")
+    args = parser.parse_args(argv)
+
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    if args.workers < 0 or args.shard_size < 1:
+        parser.error("--workers must be at least 0 and --shard-size at least 1")
+    if not os.path.exists(args.path):
+        parser.error(f"file not found: {args.path}")
+
+    import instrumentation
+
+    instrumentation.configure_logging(os.environ.get('RECIPE_LOG_LEVEL', 'WARNING'))
+    print(f"--- Importing recipes from {args.path} ---")
+    if args.workers:
+        summary = import_file_parallel(args.path, args.workers, args.format, args.batch_size,
+                                       args.shard_size, on_batch=print_batch)
+    else:
+        summary = import_file(args.path, args.format, args.batch_size, on_batch=print_batch)
+
+    print("\n--- Import Summary ---")
+    rate = summary['added'] / summary['seconds'] if summary['seconds'] > 0 else 0.0
+    print(f"Added: {summary['added']} recipes in {summary['seconds']:.2f}s ({rate:,.0f} recipes/s)")
+    if 'stages' in summary:
+        stages = summary['stages']
+        print(f"Parse ({stages['workers']} workers): {stages['parse_seconds']:.2f}s of worker time "
+              f"({stages['parse_recipes_per_sec']:,.0f} recipes/s per worker)")
+        print(f"Write: {stages['write_seconds']:.2f}s ({stages['write_recipes_per_sec']:,.0f} recipes/s), "
+              f"writer waited {stages['writer_wait_seconds']:.2f}s for parsed shards")
+    print(f"Rejected: {len(summary['rejected'])} rows")
+    for rejected in summary['rejected'][:args.show_rejected]:
+        print(f"  Row {rejected['row']}: {rejected['name'] or '(no name)'} - {rejected['reason']}")
+    if len(summary['rejected']) > args.show_rejected:
+        print(f"  ... and {len(summary['rejected']) - args.show_rejected} more")
+    return 0 if summary['added'] or not summary['rejected'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
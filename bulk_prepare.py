@@ -0,0 +1,77 @@
+"""
+Validation and normalization of recipe rows for bulk imports.
+
+prepare_bulk_batch() turns raw recipe dicts into the tuples
+db_operations.BulkWriter writes, without a database connection. It imports only
+the pure name and quantity helpers (fuzzy_index, quantities), so the worker
+processes of bulk_import.py --workers load this module instead of db_operations
+and its caches, indexes and connection pool.
+"""
+import fuzzy_index
+import quantities
+
+def _validate_recipe(recipe):
+    """
+    Checks one recipe dict for db_operations.add_recipes_bulk.
+    Returns (name, description, ingredients, instructions) with names stripped,
+    or raises ValueError with the reason the row is rejected.
+    """
+    if not isinstance(recipe, dict):
+        raise ValueError("recipe must be an object")
+
+    name = recipe.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("missing recipe name")
+    name = name.strip()
+
+    description = recipe.get('description') or None
+    if description is not None and not isinstance(description, str):
+        raise ValueError("description must be a string")
+
+    ingredients = []
+    seen_ingredients = set()
+    for ingredient_info in recipe.get('ingredients') or []:
+        if not isinstance(ingredient_info, dict):
+            raise ValueError(f"invalid ingredient entry: {ingredient_info!r}")
+        ing_name = ingredient_info.get('name')
+        ing_quantity = ingredient_info.get('quantity')
+        if not isinstance(ing_name, str) or not ing_name.strip():
+            raise ValueError(f"invalid ingredient entry: {ingredient_info!r}")
+        if not isinstance(ing_quantity, str) or not ing_quantity.strip():
+            raise ValueError(f"invalid quantity for ingredient '{ing_name.strip()}': {ing_quantity!r}")
+        ing_name = ing_name.strip()
+        if ing_name.lower() in seen_ingredients:
+            raise ValueError(f"ingredient '{ing_name}' listed twice")
+        seen_ingredients.add(ing_name.lower())
+        ingredients.append((ing_name, ing_quantity.strip()))
+
+    instructions = []
+    for instruction_text in recipe.get('instructions') or []:
+        if not isinstance(instruction_text, str) or not instruction_text.strip():
+            raise ValueError("empty instruction step")
+        instructions.append(instruction_text.strip())
+
+    return name, description, ingredients, instructions
+
+def prepare_bulk_batch(batch):
+    """
+    Validates and normalizes a list of (row number, recipe dict) pairs for
+    db_operations.BulkWriter.write() without touching the database, so it can
+    run in another process (bulk_import.py --workers does). Ingredient names are canonicalized
+    and quantities parsed here; only the duplicate recipe name check is left to the writer.
+    Returns a list of (row number, name, prepared recipe, rejection reason): the
+    prepared recipe is (name, description, ingredients, instructions) with
+    ingredients as (name, canonical name, quantity, amount, unit) tuples, or None
+    if the row was rejected.
+    """
+    prepared = []
+    for row_number, recipe in batch:
+        try:
+            name, description, ingredients, instructions = _validate_recipe(recipe)
+        except ValueError as e:
+            prepared.append((row_number, recipe.get('name') if isinstance(recipe, dict) else None, None, str(e)))
+            continue
+        ingredients = [(ing_name, fuzzy_index.canonical_name(ing_name), ing_quantity, *quantities.parse_quantity(ing_quantity))
+                       for ing_name, ing_quantity in ingredients]
+        prepared.append((row_number, name, (name, description, ingredients, instructions), None))
+    return prepared
@@ -0,0 +1,408 @@
+"""
+Immutable, memory-mapped catalog snapshots for read-only serving.
+
+write_snapshot() turns the database into a single binary file, and
+CatalogSnapshot serves recipes from that file with the read API of
+db_operations (list_all_recipes, list_recipes_page, iter_recipes,
+search_recipe_by_name, autocomplete_recipes, get_recipe(s) and
+get_recipe_details(_many)), so a read node needs no SQLite database at all:
+
+    python catalog_snapshot.py export catalog.snap [--db recipes.db]
+    python catalog_snapshot.py info catalog.snap
+
+The file is a header, a directory of named sections and the sections
+themselves (8-byte aligned, little-endian):
+
+* strings / strofs: one UTF-8 pool holding every name, description, quantity
+  and step text, and the offset of each string (string i is
+  strings[strofs[i]:strofs[i + 1]]); quantities are stored once per distinct value;
+* rid, rname, rdesc: recipe IDs and name/description string numbers, in name
+  (COLLATE NOCASE) order, the order the list calls return;
+* ingofs / stepofs: where each recipe's ingredient lines and steps start in
+  lineing, lineqty (ingredient dictionary entry, quantity string) and stepno,
+  steptext;
+* iid, iname: the ingredient dictionary (every ingredient's ID and name);
+* sortid, sortpos: recipe IDs in ascending order and their positions, for
+  lookups by ID;
+* names, nameofs: the ASCII-lowercased names, NUL-separated, which name search
+  and paging compare against directly;
+* meta: JSON with the counts, the creation time and the change log position
+  (see change_log.py) the snapshot was taken at.
+
+Opening a snapshot maps the file and wraps each section in a memoryview;
+nothing is read or decoded per recipe, so it takes the same time whatever the
+catalog size. Strings are decoded straight from the mapped pages when a call
+returns them. The mapping is read-only and shared, so any number of processes
+serving the same file share its pages in the OS page cache. write_snapshot()
+replaces the file atomically; readers that already have it open keep the old
+version until they reopen it.
+"""
+import bisect
+import json
+import mmap
+import os
+import re
+import shutil
+import sqlite3
+import string
+import struct
+import sys
+import tempfile
+import time
+from array import array
+
+import autocomplete
+import recipe_models
+
+MAGIC = b'RCPSNAP\x00'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<8sII')   # magic, format version, number of sections
+_SECTION = struct.Struct('<8sQQ')  # section name, offset, length in bytes
+NO_STRING = 0xFFFFFFFF             # rdesc entry of a recipe without a description
+
+# Section name -> array typecode (None for raw bytes).
+SECTIONS = {
+    'meta': None, 'strings': None, 'strofs': 'Q',
+    'rid': 'q', 'rname': 'I', 'rdesc': 'I', 'ingofs': 'Q', 'stepofs': 'Q',
+    'lineing': 'I', 'lineqty': 'I', 'stepno': 'I', 'steptext': 'I',
+    'iid': 'q', 'iname': 'I', 'sortid': 'q', 'sortpos': 'I',
+    'names': None, 'nameofs': 'Q',
+}
+
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+def _name_key(name):
+    """The bytes name order and name search compare: NOCASE folds ASCII letters only."""
+    return name.translate(_ASCII_LOWER).encode('utf-8')
+
+class _StringPool:
+    """Appends UTF-8 strings to a temporary file and numbers them; intern() stores repeated values once."""
+
+    def __init__(self, directory):
+        self.file = tempfile.TemporaryFile(dir=directory)
+        self.offsets = array('Q', [0])
+        self._interned = {}
+
+    def add(self, text):
+        data = text.encode('utf-8')
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+        return len(self.offsets) - 2
+
+    def intern(self, text):
+        number = self._interned.get(text)
+        if number is None:
+            number = self._interned[text] = self.add(text)
+        return number
+
+def write_snapshot(path, database=None, chunk_size=1000):
+    """
+    Writes a snapshot of `database` (db_operations.DATABASE_FILE by default)
+    to `path`, read in one transaction so it is consistent, and atomically
+    replaces any existing file. Returns the snapshot's metadata.
+    """
+    import change_log
+    import db_operations
+
+    directory = os.path.dirname(os.path.abspath(path))
+    strings = _StringPool(directory)
+    s = {name: array(typecode) for name, typecode in SECTIONS.items() if typecode and name != 'strofs'}
+    s['ingofs'].append(0)
+    s['stepofs'].append(0)
+    names = bytearray()
+    dictionary = {}
+
+    connections = db_operations.ConnectionPool(database or db_operations.DATABASE_FILE, max_connections=1)
+    try:
+        with connections.connection() as conn:
+            conn.execute("BEGIN")  # One consistent view of the whole catalog.
+            try:
+                for ingredient_id, name in conn.execute(
+                        "SELECT IngredientID, IngredientName FROM Ingredients ORDER BY IngredientID"):
+                    dictionary[name] = len(s['iid'])
+                    s['iid'].append(ingredient_id)
+                    s['iname'].append(strings.add(name))
+                change_seq = change_log.latest_seq(conn)
+
+                chunk = []
+                for recipe_id, _ in db_operations.iter_recipes(chunk_size, conn=conn):
+                    chunk.append(recipe_id)
+                    if len(chunk) >= chunk_size:
+                        _add_recipes(db_operations.get_recipe_columns(chunk, conn=conn), s, strings, dictionary, names)
+                        chunk = []
+                _add_recipes(db_operations.get_recipe_columns(chunk, conn=conn), s, strings, dictionary, names)
+                # The read helpers log errors and return what they have; a snapshot must not be partial.
+                expected = conn.execute("SELECT COUNT(*) FROM Recipes").fetchone()[0]
+                if len(s['rid']) != expected:
+                    raise sqlite3.DatabaseError(f"read {len(s['rid'])} of {expected} recipes; snapshot not written")
+            finally:
+                conn.rollback()
+    except BaseException:
+        strings.file.close()
+        raise
+    finally:
+        connections.close()
+    s['nameofs'].append(len(names))
+
+    order = sorted(range(len(s['rid'])), key=s['rid'].__getitem__)
+    s['sortid'] = array('q', (s['rid'][i] for i in order))
+    s['sortpos'] = array('I', order)
+    meta = {
+        'format_version': FORMAT_VERSION,
+        'created_at': time.time(),
+        'change_seq': change_seq,
+        'recipes': len(s['rid']),
+        'ingredients': len(s['iid']),
+        'ingredient_lines': len(s['lineing']),
+        'steps': len(s['stepno']),
+    }
+
+    sections = [('meta', json.dumps(meta).encode('utf-8')), ('strings', strings.file), ('strofs', strings.offsets),
+                ('names', bytes(names))] + [(name, s[name]) for name in SECTIONS if name in s]
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            _write_sections(f, sections)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    finally:
+        strings.file.close()
+    return meta
+
+def _add_recipes(columns, s, strings, dictionary, names):
+    """Appends one RecipeColumns batch (in name order) to the section arrays."""
+    for i in range(len(columns)):
+        name = columns.names[i]
+        description = columns.descriptions[i]
+        s['rid'].append(columns.ids[i])
+        s['rname'].append(strings.add(name))
+        s['rdesc'].append(NO_STRING if description is None else strings.add(description))
+        s['nameofs'].append(len(names))
+        names += _name_key(name) + b'\x00'
+        for ingredient, quantity in columns.ingredients(i):
+            s['lineing'].append(dictionary[ingredient])
+            s['lineqty'].append(strings.intern(quantity))
+        s['ingofs'].append(len(s['lineing']))
+        for number, text in columns.steps(i):
+            s['stepno'].append(number)
+            s['steptext'].append(strings.add(text))
+        s['stepofs'].append(len(s['stepno']))
+
+def _write_sections(f, sections):
+    """Writes the header, the section directory and the 8-byte aligned sections."""
+    if sys.byteorder != 'little':
+        raise OSError("catalog snapshots are written in little-endian byte order only")
+    position = _HEADER.size + _SECTION.size * len(sections)
+    f.write(b'\x00' * position)
+    directory = []
+    for name, data in sections:
+        padding = -position % 8
+        f.write(b'\x00' * padding)
+        position += padding
+        if hasattr(data, 'seek'):  # The string pool's temporary file.
+            data.seek(0)
+            shutil.copyfileobj(data, f)
+        else:
+            f.write(data)
+        length = f.tell() - position
+        directory.append(_SECTION.pack(name.encode('ascii'), position, length))
+        position += length
+    f.seek(0)
+    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+    f.write(b''.join(directory))
+
+# One UTF-8 character other than the NUL separator, for LIKE's '_'.
+_ANY_CHARACTER = rb'(?:[\x01-\x7f]|[\xc0-\xff][\x80-\xbf]*)'
+
+class CatalogSnapshot:
+    """
+    A memory-mapped snapshot, answering the read calls of db_operations with
+    the same results (recipe autocomplete ranks by name only). Thread-safe;
+    close() it (or use it as a context manager) when done.
+    """
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise OSError("catalog snapshots can only be read on little-endian machines")
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._views = [memoryview(self._mmap)]
+        try:
+            magic, version, count = _HEADER.unpack_from(self._views[0], 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{path} is not a version {FORMAT_VERSION} catalog snapshot")
+            sections = {}
+            for k in range(count):
+                name, offset, length = _SECTION.unpack_from(self._views[0], _HEADER.size + k * _SECTION.size)
+                name = name.rstrip(b'\x00').decode('ascii')
+                view = self._views[0][offset:offset + length]
+                self._views.append(view)
+                if SECTIONS.get(name):
+                    view = view.cast(SECTIONS[name])
+                    self._views.append(view)
+                sections[name] = view
+            missing = SECTIONS.keys() - sections.keys()
+            if missing:
+                raise ValueError(f"{path} is missing sections: {', '.join(sorted(missing))}")
+        except Exception:
+            self.close()
+            raise
+        self.meta = json.loads(bytes(sections['meta']))
+        for name in SECTIONS:
+            setattr(self, '_' + name, sections[name])
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._rid)
+
+    def info(self):
+        """Returns the snapshot's metadata plus its path and size in bytes."""
+        return dict(self.meta, path=self.path, bytes=len(self._mmap))
+
+    def _string(self, number):
+        return str(self._strings[self._strofs[number]:self._strofs[number + 1]], 'utf-8')
+
+    def _name_key_at(self, position):
+        return self._names[self._nameofs[position]:self._nameofs[position + 1] - 1].tobytes()
+
+    def _rows(self, start, stop):
+        return [(self._rid[i], self._string(self._rname[i])) for i in range(start, stop)]
+
+    def _position(self, recipe_id):
+        k = bisect.bisect_left(self._sortid, recipe_id)
+        if k < len(self._sortid) and self._sortid[k] == recipe_id:
+            return self._sortpos[k]
+        return None
+
+    def _recipe_at(self, position):
+        description = self._rdesc[position]
+        lines = range(self._ingofs[position], self._ingofs[position + 1])
+        steps = range(self._stepofs[position], self._stepofs[position + 1])
+        return recipe_models.Recipe(
+            self._rid[position], self._string(self._rname[position]),
+            None if description == NO_STRING else self._string(description),
+            [recipe_models.IngredientLine(self._string(self._iname[self._lineing[k]]), self._string(self._lineqty[k]))
+             for k in lines],
+            [recipe_models.Step(self._stepno[k], self._string(self._steptext[k])) for k in steps])
+
+    def list_all_recipes(self):
+        """Returns every (RecipeID, RecipeName) in name order."""
+        return self._rows(0, len(self))
+
+    def list_recipes_page(self, page_size=20, after=None):
+        """Returns (rows, cursor for the next page or None) like db_operations.list_recipes_page."""
+        if page_size < 1:
+            raise ValueError(f"page_size must be at least 1, got {page_size}")
+        start = 0
+        if after is not None:
+            target = (_name_key(after[0]), after[1])
+            start = bisect.bisect_right(range(len(self)), target, key=lambda i: (self._name_key_at(i), self._rid[i]))
+        stop = min(start + page_size, len(self))
+        rows = self._rows(start, stop)
+        if stop < len(self) and rows:
+            return rows, (rows[-1][1], rows[-1][0])
+        return rows, None
+
+    def iter_recipes(self, batch_size=1000):
+        """Yields every (RecipeID, RecipeName) in name order."""
+        for start in range(0, len(self), batch_size):
+            yield from self._rows(start, min(start + batch_size, len(self)))
+
+    def search_recipe_by_name(self, search_term):
+        """
+        Returns the (RecipeID, RecipeName) of recipes whose name matches
+        LIKE '%search_term%' (so '%' and '_' are wildcards), in name order.
+        """
+        parts = []
+        for character in _name_key(search_term).decode('utf-8'):
+            if character == '%':
+                parts.append(rb'[^\x00]*')
+            elif character == '_':
+                parts.append(_ANY_CHARACTER)
+            else:
+                parts.append(re.escape(character.encode('utf-8')))
+        pattern = re.compile(b''.join(parts))
+        if pattern.match(b''):
+            return self.list_all_recipes()  # Only '%'s: every name matches.
+        names, nameofs, rid, rname, string = self._names, self._nameofs, self._rid, self._rname, self._string
+        results, row = [], -1
+        while True:
+            match = pattern.search(names, nameofs[row + 1])
+            if match is None:
+                return results
+            row += 1
+            if nameofs[row + 1] <= match.start():  # Not in the very next name: look it up.
+                row = bisect.bisect_right(nameofs, match.start(), row + 1) - 1
+            results.append((rid[row], string(rname[row])))  # Then go on from the next name.
+
+    def autocomplete_recipes(self, prefix, limit=10):
+        """Returns up to `limit` recipes whose name starts with `prefix`, in name order, like db_operations."""
+        key = _name_key(autocomplete.name_key(prefix))
+        start = bisect.bisect_left(range(len(self)), key, key=self._name_key_at)
+        matches = []
+        for i in range(start, min(start + limit, len(self))):
+            if not self._name_key_at(i).startswith(key):
+                break
+            matches.append({'id': self._rid[i], 'name': self._string(self._rname[i]), 'popularity': 0})
+        return matches
+
+    def get_recipe(self, recipe_id):
+        """Returns a recipe as a recipe_models.Recipe, or None if not found."""
+        position = self._position(int(recipe_id))
+        return None if position is None else self._recipe_at(position)
+
+    def get_recipes(self, recipe_ids):
+        """Returns a dict mapping RecipeID to recipe_models.Recipe in the order given; unknown IDs are left out."""
+        found = {}
+        for recipe_id in dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids):
+            position = self._position(recipe_id)
+            if position is not None:
+                found[recipe_id] = self._recipe_at(position)
+        return found
+
+    def get_recipe_details(self, recipe_id):
+        """Returns the same dictionary as db_operations.get_recipe_details, or None if not found."""
+        recipe = self.get_recipe(recipe_id)
+        return recipe.as_dict() if recipe is not None else None
+
+    def get_recipe_details_many(self, recipe_ids):
+        """Returns the same dict as db_operations.get_recipe_details_many."""
+        return {recipe_id: recipe.as_dict() for recipe_id, recipe in self.get_recipes(recipe_ids).items()}
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write or inspect memory-mapped catalog snapshots.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="write a snapshot of the database")
+    export.add_argument('path')
+    export.add_argument('--db', help="database file (default: recipes.db)")
+    info = commands.add_parser('info', help="print a snapshot's metadata")
+    info.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        started = time.perf_counter()
+        meta = write_snapshot(args.path, args.db)
+        print(f"Wrote {meta['recipes']} recipes and {meta['ingredients']} ingredients to {args.path} "
+              f"in {time.perf_counter() - started:.1f}s ({os.path.getsize(args.path) / 2**20:.1f} MiB).")
+    else:
+        with CatalogSnapshot(args.path) as snapshot:
+            print(json.dumps(snapshot.info(), indent=2))
@@ -0,0 +1,263 @@
+"""
+Append-only change log of the catalog tables, written by triggers.
+
+Every row inserted into, updated in or deleted from Recipes, Ingredients,
+Instructions and RecipeIngredients adds a ChangeLog entry with the next
+sequence number (Seq, AUTOINCREMENT, so numbers are never reused), the table,
+the row's key, the recipe the row belongs to (NULL for Ingredients), the
+operation and the time. As with the statistics triggers, every writer records
+its changes in its own transaction, so a consumer that has seen everything up
+to Seq N can catch up by reading the entries after N, in time proportional to
+what changed rather than to the catalog size (see `recipe_cli.py changes`).
+
+Compaction keeps the log small without breaking consumers:
+* entries superseded by a later entry for the same row are dropped; a consumer
+  only needs to know that a row changed, and the latest entry says so;
+* with `retain_seconds`, entries older than that are dropped as well and the
+  last dropped Seq is kept in ChangeLogState. changes_since() raises
+  ChangeLogTruncated for a consumer that is further behind, which then has to
+  start over from a full export.
+
+    python change_log.py --compact [--retain-days 30]
+"""
+import sqlite3
+from contextlib import contextmanager
+
+# (table, key column, recipe column or None) for every logged table.
+LOGGED_TABLES = [
+    ('Recipes', 'RecipeID', 'RecipeID'),
+    ('Ingredients', 'IngredientID', None),
+    ('Instructions', 'InstructionID', 'RecipeID'),
+    ('RecipeIngredients', 'RecipeIngredientID', 'RecipeID'),
+]
+
+def _triggers(table, key, recipe):
+    def entry(row, operation):
+        recipe_value = f"{row}.{recipe}" if recipe else 'NULL'
+        return f"'{table}', {row}.{key}, {recipe_value}, '{operation}'"
+
+    insert = "INSERT INTO ChangeLog (TableName, RowKey, RecipeID, Operation)"
+    moved = f"old.{key} IS NOT new.{key}" + (f" OR old.{recipe} IS NOT new.{recipe}" if recipe else '')
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_changes_{table.lower()}_insert AFTER INSERT ON {table} BEGIN
+            {insert} VALUES ({entry('new', 'insert')});
+        END;
+        """,
+        # A row moved to another key or recipe is also logged under the old one, so that recipe is seen to change too.
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_changes_{table.lower()}_update AFTER UPDATE ON {table} BEGIN
+            {insert} SELECT {entry('old', 'update')} WHERE {moved};
+            {insert} VALUES ({entry('new', 'update')});
+        END;
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_changes_{table.lower()}_delete AFTER DELETE ON {table} BEGIN
+            {insert} VALUES ({entry('old', 'delete')});
+        END;
+        """,
+    ]
+
+CHANGE_LOG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS ChangeLog (
+        Seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        TableName TEXT NOT NULL,
+        RowKey INTEGER NOT NULL,
+        RecipeID INTEGER, -- the recipe the row belongs to; NULL for Ingredients
+        Operation TEXT NOT NULL, -- 'insert', 'update' or 'delete'
+        ChangedAt INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)) -- Unix time
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ChangeLogState (
+        Id INTEGER PRIMARY KEY CHECK (Id = 1),
+        TruncatedThrough INTEGER NOT NULL DEFAULT 0 -- entries up to this Seq may have been dropped
+    );
+    """,
+    "INSERT OR IGNORE INTO ChangeLogState (Id) VALUES (1);",
+] + [trigger for spec in LOGGED_TABLES for trigger in _triggers(*spec)]
+
+# The per-row insert triggers a bulk writer may suspend in favour of record_bulk_insert().
+INSERT_TRIGGERS = tuple(f"trg_changes_{table.lower()}_insert" for table, _, _ in LOGGED_TABLES)
+
+class ChangeLogTruncated(Exception):
+    """Raised when the entries after a consumer's position have been compacted away."""
+
+    def __init__(self, since, truncated_through):
+        super().__init__(f"Changes after {since} are no longer available (log truncated through {truncated_through}); "
+                         "a full export is needed.")
+        self.since = since
+        self.truncated_through = truncated_through
+
+def create_change_log(conn):
+    """
+    Creates the change log table and triggers if they are missing. The caller commits.
+    Rows written before the log existed were never logged, so on a catalog
+    that isn't empty the log starts out truncated through Seq 1: reading from
+    0 raises ChangeLogTruncated instead of silently missing them.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ChangeLog'").fetchone()
+    for statement in CHANGE_LOG_SCHEMA:
+        conn.execute(statement)
+    if not exists and conn.execute("SELECT EXISTS (SELECT 1 FROM Recipes) OR EXISTS (SELECT 1 FROM Ingredients)").fetchone()[0]:
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('ChangeLog', 1)")
+        conn.execute("UPDATE ChangeLogState SET TruncatedThrough = 1 WHERE Id = 1")
+
+def record_bulk_insert(conn, recipe_ids, ingredient_ids):
+    """
+    Adds the entries INSERT_TRIGGERS would have written for newly inserted
+    recipes (IDs recipe_ids[0]..recipe_ids[1], with their ingredient lines and
+    steps) and ingredients (ingredient_ids[0]..ingredient_ids[1]) with one
+    INSERT ... SELECT per table instead of a trigger per row. Runs in the
+    caller's transaction.
+    """
+    for table, key, recipe in LOGGED_TABLES:
+        column, (first, last) = (recipe, recipe_ids) if recipe else (key, ingredient_ids)
+        conn.execute(f"""
+            INSERT INTO ChangeLog (TableName, RowKey, RecipeID, Operation)
+            SELECT '{table}', {key}, {recipe or 'NULL'}, 'insert' FROM {table}
+            WHERE {column} BETWEEN ? AND ? ORDER BY {key}
+        """, (first, last))
+
+def latest_seq(conn):
+    """Returns the Seq of the newest entry ever written, 0 if none (compaction doesn't lower it)."""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ChangeLog'").fetchone()
+    return row[0] if row else 0
+
+def truncated_through(conn):
+    """Returns the Seq up to which entries may have been dropped by compaction."""
+    return conn.execute("SELECT TruncatedThrough FROM ChangeLogState WHERE Id = 1").fetchone()[0]
+
+@contextmanager
+def _snapshot(conn):
+    """
+    Runs the block in one read transaction (or the caller's, if one is open),
+    so a compaction committed in between can't drop entries after the
+    truncation check has passed.
+    """
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    finally:
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+
+def _check_available(conn, since):
+    floor = truncated_through(conn)
+    if since < floor:
+        raise ChangeLogTruncated(since, floor)
+
+_CHANGES_SQL = """
+    SELECT Seq, TableName, RowKey, RecipeID, Operation, ChangedAt FROM ChangeLog
+    WHERE Seq > ? AND Seq <= ?
+    ORDER BY Seq
+    LIMIT ?
+"""
+
+def read_changes(conn, since, until=None, limit=1000):
+    """
+    Returns up to `limit` entries with since < Seq <= until (until defaults to
+    the latest), oldest first, as dicts with 'seq', 'table', 'key', 'recipe_id',
+    'operation' and 'changed_at'. Raises ChangeLogTruncated if compaction has
+    dropped entries after `since`.
+    """
+    with _snapshot(conn):
+        _check_available(conn, since)
+        until = latest_seq(conn) if until is None else until
+        rows = conn.execute(_CHANGES_SQL, (since, until, limit)).fetchall()
+    return [{'seq': row[0], 'table': row[1], 'key': row[2], 'recipe_id': row[3], 'operation': row[4], 'changed_at': row[5]}
+            for row in rows]
+
+def changes_since(conn, since, until=None, batch_size=1000):
+    """Yields every entry after `since` (up to `until`) like read_changes(), reading `batch_size` at a time."""
+    until = latest_seq(conn) if until is None else until
+    while True:
+        batch = read_changes(conn, since, until, batch_size)
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        since = batch[-1]['seq']
+
+# Recipes to re-export: those a changed row belongs to, plus those using a renamed ingredient.
+_CHANGED_RECIPES_SQL = """
+    SELECT RecipeID FROM ChangeLog WHERE Seq > :since AND Seq <= :until AND RecipeID IS NOT NULL
+    UNION
+    SELECT RecipeID FROM RecipeIngredients WHERE IngredientID IN (
+        SELECT RowKey FROM ChangeLog
+        WHERE Seq > :since AND Seq <= :until AND TableName = 'Ingredients' AND Operation = 'update'
+    )
+"""
+_CHANGED_INGREDIENTS_SQL = """
+    SELECT C.RowKey, I.IngredientName
+    FROM (SELECT DISTINCT RowKey FROM ChangeLog WHERE Seq > :since AND Seq <= :until AND TableName = 'Ingredients') C
+    LEFT JOIN Ingredients I ON I.IngredientID = C.RowKey
+    ORDER BY C.RowKey
+"""
+
+def changed_recipe_ids(conn, since, until):
+    """
+    Returns the sorted IDs of the recipes changed by the entries with
+    since < Seq <= until, including recipes that were deleted and recipes whose
+    ingredients were renamed; since=None returns every recipe (for a full
+    export). Raises ChangeLogTruncated like read_changes().
+    """
+    if since is None:
+        return [row[0] for row in conn.execute("SELECT RecipeID FROM Recipes ORDER BY RecipeID")]
+    with _snapshot(conn):
+        _check_available(conn, since)
+        return [row[0] for row in conn.execute(_CHANGED_RECIPES_SQL, {'since': since, 'until': until})]
+
+def changed_ingredients(conn, since, until):
+    """
+    Returns (IngredientID, current IngredientName or None if deleted) for the
+    ingredients changed by the entries with since < Seq <= until, by ID;
+    since=None returns every ingredient. Raises ChangeLogTruncated like read_changes().
+    """
+    if since is None:
+        return conn.execute("SELECT IngredientID, IngredientName FROM Ingredients ORDER BY IngredientID").fetchall()
+    with _snapshot(conn):
+        _check_available(conn, since)
+        return conn.execute(_CHANGED_INGREDIENTS_SQL, {'since': since, 'until': until}).fetchall()
+
+def compact_change_log(conn, retain_seconds=None):
+    """
+    Drops entries superseded by a later entry for the same row (and recipe)
+    and, if `retain_seconds` is given, entries older than that. Returns the
+    number of entries removed. The caller commits.
+    """
+    removed = conn.execute("""
+        DELETE FROM ChangeLog WHERE Seq NOT IN (
+            SELECT MAX(Seq) FROM ChangeLog GROUP BY TableName, RowKey, RecipeID
+        )
+    """).rowcount
+    if retain_seconds is not None:
+        through = conn.execute("""
+            SELECT MAX(Seq) FROM ChangeLog WHERE ChangedAt < CAST(strftime('%s', 'now') AS INTEGER) - ?
+        """, (retain_seconds,)).fetchone()[0]
+        if through is not None:
+            removed += conn.execute("DELETE FROM ChangeLog WHERE Seq <= ?", (through,)).rowcount
+            conn.execute("UPDATE ChangeLogState SET TruncatedThrough = MAX(TruncatedThrough, ?) WHERE Id = 1", (through,))
+    return removed
+
+if __name__ == '__main__':
+    import argparse
+    import database_setup
+
+    parser = argparse.ArgumentParser(description="Change log maintenance.")
+    parser.add_argument('--compact', action='store_true', help="drop superseded (and, with --retain-days, old) entries")
+    parser.add_argument('--retain-days', type=float, help="also drop entries older than this many days")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(database_setup.DATABASE_FILE)
+    create_change_log(conn)
+    if args.compact:
+        retain = args.retain_days * 86400 if args.retain_days is not None else None
+        print(f"Removed {compact_change_log(conn, retain)} change log entries.")
+    print(f"Latest change: {latest_seq(conn)}; entries available after {truncated_through(conn)}.")
+    conn.commit()
+    conn.close()
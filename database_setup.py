@@ -1,8 +1,31 @@
 import sqlite3
 import os
+import sys
+
+import change_log
+import fuzzy_index
+import quantities
+import recipe_search
+import recipe_stats
+import similar_recipes
 
 DATABASE_FILE = 'recipes.db'
 
+# Per-connection storage settings applied by create_connection() and db_operations.
+# WAL journaling itself is persistent and is switched on by migrate().
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON;",
+    "PRAGMA synchronous = NORMAL;",    # Durable enough with WAL: a power loss can drop the last commits, never corrupt
+    "PRAGMA mmap_size = 268435456;",   # Read through a memory map of up to 256 MiB instead of read() calls
+    "PRAGMA cache_size = -65536;",     # 64 MiB page cache per connection (negative = KiB)
+    "PRAGMA temp_store = MEMORY;",     # Sorts and temporary indexes stay in RAM
+)
+
+def apply_storage_profile(conn):
+    """Applies CONNECTION_PRAGMAS to a freshly opened connection."""
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+
 def create_connection(db_file):
     """ Create a database connection to the SQLite database specified by db_file
     :param db_file: database file path
@@ -13,7 +36,7 @@ def create_connection(db_file):
         conn = sqlite3.connect(db_file)
         print(f"SQLite version: {sqlite3.sqlite_version}")
         print(f"Successfully connected to {db_file}")
-        conn.execute("PRAGMA foreign_keys = ON;")
+        apply_storage_profile(conn)
         return conn
     except sqlite3.Error as e:
         print(f"Error connecting to database: {e}")
@@ -32,54 +55,197 @@ def create_table(conn, create_table_sql):
     except sqlite3.Error as e:
         print(f"Error creating table: {e}")
 
-def setup_database():
-    """Sets up the database by creating tables."""
+sql_create_recipes_table = """
+CREATE TABLE IF NOT EXISTS Recipes (
+    RecipeID INTEGER PRIMARY KEY AUTOINCREMENT,
+    RecipeName TEXT UNIQUE NOT NULL COLLATE NOCASE, -- COLLATE NOCASE for case-insensitive unique check
+    Description TEXT
+);
+"""
 
-    sql_create_recipes_table = """
-    CREATE TABLE IF NOT EXISTS Recipes (
-        RecipeID INTEGER PRIMARY KEY AUTOINCREMENT,
-        RecipeName TEXT UNIQUE NOT NULL COLLATE NOCASE, -- COLLATE NOCASE for case-insensitive unique check
-        Description TEXT
-    );
-    """
+sql_create_ingredients_table = """
+CREATE TABLE IF NOT EXISTS Ingredients (
+    IngredientID INTEGER PRIMARY KEY AUTOINCREMENT,
+    IngredientName TEXT UNIQUE NOT NULL COLLATE NOCASE -- COLLATE NOCASE for case-insensitive unique check
+);
+"""
 
-    sql_create_ingredients_table = """
-    CREATE TABLE IF NOT EXISTS Ingredients (
-        IngredientID INTEGER PRIMARY KEY AUTOINCREMENT,
-        IngredientName TEXT UNIQUE NOT NULL COLLATE NOCASE -- COLLATE NOCASE for case-insensitive unique check
-    );
-    """
+sql_create_instructions_table = """
+CREATE TABLE IF NOT EXISTS Instructions (
+    InstructionID INTEGER PRIMARY KEY AUTOINCREMENT,
+    RecipeID INTEGER NOT NULL,
+    StepNumber INTEGER NOT NULL,
+    StepDescription TEXT NOT NULL,
+    FOREIGN KEY (RecipeID) REFERENCES Recipes (RecipeID) ON DELETE CASCADE -- Cascade delete if recipe is deleted
+);
+"""
 
-    sql_create_instructions_table = """
-    CREATE TABLE IF NOT EXISTS Instructions (
-        InstructionID INTEGER PRIMARY KEY AUTOINCREMENT,
-        RecipeID INTEGER NOT NULL,
-        StepNumber INTEGER NOT NULL,
-        StepDescription TEXT NOT NULL,
-        FOREIGN KEY (RecipeID) REFERENCES Recipes (RecipeID) ON DELETE CASCADE -- Cascade delete if recipe is deleted
-    );
+sql_create_recipe_ingredients_table = """
+CREATE TABLE IF NOT EXISTS RecipeIngredients (
+    RecipeIngredientID INTEGER PRIMARY KEY AUTOINCREMENT,
+    RecipeID INTEGER NOT NULL,
+    IngredientID INTEGER NOT NULL,
+    Quantity TEXT NOT NULL,
+    FOREIGN KEY (RecipeID) REFERENCES Recipes (RecipeID) ON DELETE CASCADE, -- Cascade delete if recipe is deleted
+    FOREIGN KEY (IngredientID) REFERENCES Ingredients (IngredientID), -- Don't cascade delete ingredients if recipe is deleted
+    UNIQUE (RecipeID, IngredientID) -- Ensure an ingredient isn't listed twice for the same recipe
+);
+"""
+
+def create_index(conn, create_index_sql):
+    """ Create an index from the create_index_sql statement; errors abort the migration
+    :param conn: Connection object
+    :param create_index_sql: a CREATE INDEX statement
+    :return:
     """
+    conn.execute(create_index_sql)
+    print(f"Successfully executed: {' '.join(create_index_sql.split('(')[0].split())}")
+
+def migration_base_tables(conn):
+    create_table(conn, sql_create_recipes_table)
+    create_table(conn, sql_create_ingredients_table)
+    create_table(conn, sql_create_instructions_table)
+    create_table(conn, sql_create_recipe_ingredients_table)
+
+def migration_search_index(conn):
+    if recipe_search.create_search_index(conn):
+        print("Successfully created full-text search index")
+    else:
+        print("FTS5 is not available in this SQLite build; full-text search is disabled.")
+
+def migration_secondary_indexes(conn):
+    # Detail fetches read a recipe's steps in order; covering the text avoids a table lookup per step.
+    create_index(conn, """
+    CREATE INDEX IF NOT EXISTS idx_instructions_recipe_step
+        ON Instructions (RecipeID, StepNumber, StepDescription);
+    """)
+    # Ingredient -> recipe lookups. Recipe -> ingredient lookups already use UNIQUE (RecipeID, IngredientID).
+    create_index(conn, """
+    CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_ingredient
+        ON RecipeIngredients (IngredientID, RecipeID);
+    """)
+    conn.execute("ANALYZE")
+
+def migration_quantity_columns(conn):
+    # Parsed form of RecipeIngredients.Quantity (see quantities.py); NULL when the text has no amount.
+    conn.execute("ALTER TABLE RecipeIngredients ADD COLUMN Amount REAL")
+    conn.execute("ALTER TABLE RecipeIngredients ADD COLUMN Unit TEXT")
+    last_id, parsed = 0, 0
+    while True:  # Backfill in chunks so large catalogs aren't loaded into memory at once.
+        rows = conn.execute("""
+            SELECT RecipeIngredientID, Quantity FROM RecipeIngredients
+            WHERE RecipeIngredientID > ? ORDER BY RecipeIngredientID LIMIT 10000
+        """, (last_id,)).fetchall()
+        if not rows:
+            break
+        conn.executemany("UPDATE RecipeIngredients SET Amount = ?, Unit = ? WHERE RecipeIngredientID = ?",
+                         [(*quantities.parse_quantity(quantity), link_id) for link_id, quantity in rows])
+        last_id = rows[-1][0]
+        parsed += len(rows)
+    print(f"Parsed {parsed} existing ingredient quantities")
+
+def migration_canonical_ingredient_names(conn):
+    # Normalized ingredient name (see fuzzy_index.canonical_name) for resolving near-duplicates at insert time.
+    conn.execute("ALTER TABLE Ingredients ADD COLUMN CanonicalName TEXT")
+    rows = conn.execute("SELECT IngredientID, IngredientName FROM Ingredients").fetchall()
+    conn.executemany("UPDATE Ingredients SET CanonicalName = ? WHERE IngredientID = ?",
+                     [(fuzzy_index.canonical_name(name), ingredient_id) for ingredient_id, name in rows])
+    create_index(conn, """
+    CREATE INDEX IF NOT EXISTS idx_ingredients_canonical_name
+        ON Ingredients (CanonicalName);
+    """)
+
+def migration_similar_recipes(conn):
+    count = similar_recipes.create_similarity_index(conn)
+    print(f"Computed similar recipes for {count} recipes")
 
-    sql_create_recipe_ingredients_table = """
-    CREATE TABLE IF NOT EXISTS RecipeIngredients (
-        RecipeIngredientID INTEGER PRIMARY KEY AUTOINCREMENT,
-        RecipeID INTEGER NOT NULL,
-        IngredientID INTEGER NOT NULL,
-        Quantity TEXT NOT NULL,
-        FOREIGN KEY (RecipeID) REFERENCES Recipes (RecipeID) ON DELETE CASCADE, -- Cascade delete if recipe is deleted
-        FOREIGN KEY (IngredientID) REFERENCES Ingredients (IngredientID), -- Don't cascade delete ingredients if recipe is deleted
-        UNIQUE (RecipeID, IngredientID) -- Ensure an ingredient isn't listed twice for the same recipe
-    );
+def migration_statistics_tables(conn):
+    recipe_stats.create_stats_tables(conn)
+    print("Successfully created statistics tables")
+
+def migration_change_log(conn):
+    change_log.create_change_log(conn)
+    print("Successfully created change log")
+
+# (schema version, description, function). A database's version is kept in PRAGMA user_version;
+# migrate() runs every migration above it, each in its own transaction. Append new ones at the end.
+MIGRATIONS = [
+    (1, "base tables", migration_base_tables),
+    (2, "full-text search index", migration_search_index),
+    (3, "secondary indexes for detail and ingredient lookups", migration_secondary_indexes),
+    (4, "parsed ingredient amounts and units", migration_quantity_columns),
+    (5, "canonical ingredient names", migration_canonical_ingredient_names),
+    (6, "similar recipes index", migration_similar_recipes),
+    (7, "materialized statistics tables", migration_statistics_tables),
+    (8, "change log", migration_change_log),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """
+    Brings the database on `conn` up to SCHEMA_VERSION in place and switches it to WAL.
+    Safe to run on every start-up and from several processes at once.
+    Returns the number of migrations applied.
     """
+    applied = 0
+    for version, description, apply_migration in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= get_schema_version(conn):  # Another process got here first.
+                conn.rollback()
+                continue
+            print(f"Applying schema migration {version}: {description}...")
+            apply_migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            applied += 1
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() not in ('wal', 'memory'):
+        conn.execute("PRAGMA journal_mode = WAL")
+    return applied
+
+def upgrade_database(db_file=None):
+    """Opens db_file (DATABASE_FILE by default), creating it if needed, and runs any pending migrations."""
+    conn = sqlite3.connect(db_file or DATABASE_FILE)
+    try:
+        apply_storage_profile(conn)
+        return migrate(conn)
+    finally:
+        conn.close()
+
+def explain_hot_queries(conn):
+    """Prints EXPLAIN QUERY PLAN for each query in db_operations.HOT_QUERIES and flags full table scans."""
+    import db_operations
+
+    print("\n--- Query Plans ---")
+    for name, sql, params in db_operations.HOT_QUERIES:
+        try:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+        except sqlite3.Error as e:
+            print(f"\n{name}: ERROR {e}")
+            continue
+        full_scans = [step for step in plan if step.startswith('SCAN ') and ' INDEX ' not in step]
+        print(f"\n{name}: {'FULL TABLE SCAN' if full_scans else 'OK'}")
+        for step in plan:
+            print(f"    {step}")
+
+def setup_database():
+    """Sets up the database by creating tables."""
 
     conn = create_connection(DATABASE_FILE)
 
     if conn is not None:
         print("\nCreating tables...")
-        create_table(conn, sql_create_recipes_table)
-        create_table(conn, sql_create_ingredients_table)
-        create_table(conn, sql_create_instructions_table)
-        create_table(conn, sql_create_recipe_ingredients_table)
+        migrate(conn)
         print("\nDatabase setup complete.")
         conn.close()
     else:
@@ -88,5 +254,22 @@ def setup_database():
 if __name__ == '__main__':
     if os.path.exists(DATABASE_FILE):
         print(f"Database file '{DATABASE_FILE}' already exists.")
+        conn = create_connection(DATABASE_FILE)
+        if conn is not None:
+            version = get_schema_version(conn)
+            if version < SCHEMA_VERSION:
+                print(f"Upgrading schema from version {version} to {SCHEMA_VERSION}...")
+                migrate(conn)
+                print("Upgrade complete.")
+            else:
+                migrate(conn)  # Still makes sure WAL is on.
+                print(f"Schema is up to date (version {version}).")
+            conn.close()
     else:
         setup_database()
+
+    if '--explain' in sys.argv:
+        conn = create_connection(DATABASE_FILE)
+        if conn is not None:
+            explain_hot_queries(conn)
+            conn.close()
@@ -1,200 +1,1653 @@
+import json
+import logging
+import os
+import pathlib
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import autocomplete
+import bulk_prepare
+import change_log
+import database_setup
+import fuzzy_index
+import instrumentation
+import pantry_index
+import quantities
+import recipe_cache
+import recipe_models
+import recipe_search
+import recipe_stats
+import similar_recipes
 
 DATABASE_FILE = 'recipes.db'
 
+logger = logging.getLogger(__name__)
+
 def get_db_connection():
     """Establishes and returns a database connection."""
     try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        conn.execute("PRAGMA foreign_keys = ON;")
+        conn = sqlite3.connect(DATABASE_FILE, factory=instrumentation.InstrumentedConnection)
+        database_setup.apply_storage_profile(conn)
         conn.row_factory = sqlite3.Row
         return conn
     except sqlite3.Error as e:
-        print(f"Database connection error: {e}")
+        logger.error("Database connection error: %s", e)
         return None
 
+class ConnectionPool:
+    """
+    Thread-aware pool of SQLite connections to one database file.
+    A thread that already holds a connection gets the same one back when it
+    asks again (so nested operations share it), and threads preferentially get
+    back the connection they used last. At most `max_connections` are open at
+    once; further callers wait up to `timeout` seconds for one to be released.
+    Idle connections are checked with a cheap query before reuse if they have
+    not been used for `health_check_interval` seconds, and replaced if broken.
+    """
+
+    def __init__(self, database=None, max_connections=5, health_check_interval=30.0, timeout=10.0):
+        self.database = database or DATABASE_FILE
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self._idle = []  # (connection, last released at) pairs
+        self._open_count = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._local = threading.local()
+
+    def _open(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False, factory=instrumentation.InstrumentedConnection)
+        database_setup.apply_storage_profile(conn)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _take_idle(self):
+        """Pops the calling thread's previous connection if idle, else the most recently used one."""
+        preferred = getattr(self._local, 'last', None)
+        for i, (conn, released_at) in enumerate(self._idle):
+            if conn is preferred:
+                return self._idle.pop(i)
+        return self._idle.pop()
+
+    def acquire(self):
+        """Returns a connection for the calling thread. Pair every call with release()."""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise sqlite3.OperationalError("connection pool is closed")
+                if self._idle:
+                    conn, released_at = self._take_idle()
+                    break
+                if self._open_count < self.max_connections:
+                    self._open_count += 1
+                    conn, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise sqlite3.OperationalError(
+                        f"timed out waiting for a connection ({self.max_connections} in use)")
+
+        try:
+            if conn is not None and time.monotonic() - released_at > self.health_check_interval:
+                if not self._is_healthy(conn):
+                    conn.close()
+                    conn = None
+            if conn is None:
+                conn = self._open()
+        except sqlite3.Error:
+            with self._condition:
+                self._open_count -= 1
+                self._condition.notify()
+            raise
+
+        instrumentation.apply_hooks(conn)
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        """Gives a connection back; any transaction left open is rolled back."""
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+            self._local.last = conn
+
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            conn = None
+
+        with self._condition:
+            if conn is None:
+                self._open_count -= 1
+            elif self._closed:
+                conn.close()
+                self._open_count -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager form of acquire()/release()."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Returns a dict with the number of open, idle and in-use connections."""
+        with self._condition:
+            return {
+                'open': self._open_count,
+                'idle': len(self._idle),
+                'in_use': self._open_count - len(self._idle),
+                'max_connections': self.max_connections,
+            }
+
+    def close(self):
+        """Closes idle connections now and in-use ones as they are released."""
+        with self._condition:
+            self._closed = True
+            for conn, released_at in self._idle:
+                conn.close()
+                self._open_count -= 1
+            self._idle = []
+            self._condition.notify_all()
+
+_pool = None
+_pool_settings = {}
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Returns the module-wide ConnectionPool used when no connection is passed in.
+    The pool is (re)created lazily, so changing DATABASE_FILE takes effect on the next call.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE_FILE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE_FILE, **_pool_settings)
+        return _pool
+
+def configure_pool(**settings):
+    """
+    Replaces the module-wide pool with one using the given ConnectionPool
+    settings (max_connections, health_check_interval, timeout).
+    """
+    global _pool
+    with _pool_lock:
+        _pool_settings.clear()
+        _pool_settings.update(settings)
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def close_pool():
+    """Closes the module-wide pool (a new one is created on next use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+@contextmanager
+def _connection(conn=None):
+    """Yields `conn` if the caller supplied one, otherwise a pooled connection."""
+    if conn is not None:
+        yield conn
+        return
+    with get_pool().connection() as pooled:
+        yield pooled
+
+@contextmanager
+def _transaction(conn, name='recipe_write'):
+    """
+    Runs the block inside a SAVEPOINT. On its own this behaves like a normal
+    transaction (committed when the block succeeds); inside a transaction the
+    caller already opened, only this block is rolled back on error and the
+    commit is left to the caller.
+    """
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        raise
+    else:
+        conn.execute(f"RELEASE {name}")
+
+_cache = None
+_change_listeners = []
+
+def enable_cache(max_entries=10000, ttl=300.0):
+    """
+    Turns on the read cache for list_all_recipes, search_recipe_by_name and
+    get_recipes / get_recipe_details(_many), replacing any existing cache.
+    Only calls that do not pass their own `conn` use the cache. Writes made
+    through this module invalidate exactly the affected entries; writes by
+    other processes become visible once entries expire after `ttl` seconds.
+    Cached results are shared between callers and must not be modified.
+    """
+    global _cache
+    _cache = recipe_cache.RecipeCache(max_entries=max_entries, ttl=ttl)
+    return _cache
+
+def disable_cache():
+    """Turns off the read cache and drops its contents."""
+    global _cache
+    _cache = None
+
+def cache_stats():
+    """Returns the read cache's counters, or None if caching is off."""
+    return _cache.stats() if _cache is not None else None
+
+_replica = None
+_replica_lock = threading.Lock()
+
+def enable_read_replica(refresh_interval=5.0):
+    """
+    Loads DATABASE_FILE into an in-memory read replica (see read_replica.py) and
+    answers list_all_recipes, list_recipes_page, search_recipe_by_name,
+    search_recipes, get_recipes, get_recipe_columns, get_recipe_details(_many),
+    get_similar_recipes and build_shopping_list from it
+    when no `conn` is passed in. Writes still go to the file.
+    The replica is rebuilt in the background shortly after each write made
+    through this module, and every `refresh_interval` seconds if the file was
+    changed by another process (None to only follow this module's writes), so
+    reads can lag a write by the time a rebuild takes.
+    """
+    import read_replica
+
+    global _replica
+    disable_read_replica()
+    replica = read_replica.ReadReplica(DATABASE_FILE, refresh_interval=refresh_interval,
+                                       on_swap=_on_replica_swap)
+    with _replica_lock:
+        _replica = replica
+    return replica
+
+def disable_read_replica():
+    """Sends reads back to the database file and frees the replica."""
+    global _replica
+    with _replica_lock:
+        replica, _replica = _replica, None
+    if replica is not None:
+        replica.close()
+
+def replica_stats():
+    """Returns the read replica's generation, build time and size, or None if it is off."""
+    replica = _replica
+    return replica.stats() if replica is not None else None
+
+def _on_replica_swap(generation):
+    # Entries cached between a write and the rebuild hold the replica's old data.
+    cache = _cache
+    if cache is not None:
+        cache.clear()
+
+@contextmanager
+def _read_connection(conn=None):
+    """Like _connection(), but uses the read replica (when enabled) instead of the pool."""
+    replica = _replica if conn is None else None
+    if replica is not None and replica.database == DATABASE_FILE:
+        instrumentation.metrics.increment('replica.reads')
+        conn = replica.connection()
+        instrumentation.apply_hooks(conn)
+        yield conn
+        return
+    with _connection(conn) as conn:
+        yield conn
+
+_canonicalization = None
+
+def enable_ingredient_canonicalization(min_similarity=0.85):
+    """
+    Makes add_recipe and add_recipes_bulk reuse an existing ingredient instead of
+    creating a near-duplicate. Names with the same canonical form ("Eggs",
+    "egg, large" -> "egg") always resolve to the existing ingredient; add_recipe
+    also accepts a typo whose canonical form is at least `min_similarity` similar
+    to an existing one (trigram similarity; None turns that off).
+    """
+    global _canonicalization
+    _canonicalization = {'min_similarity': min_similarity}
+
+def disable_ingredient_canonicalization():
+    """Goes back to matching ingredient names exactly (case-insensitively)."""
+    global _canonicalization
+    _canonicalization = None
+
+def add_change_listener(callback):
+    """
+    Registers callback(recipe_ids, recipe_names) to be called after this module
+    changes recipes. recipe_ids are the recipes whose own rows, ingredient lines
+    or instructions changed; recipe_names are names that were added or removed.
+    """
+    _change_listeners.append(callback)
+
+def remove_change_listener(callback):
+    if callback in _change_listeners:
+        _change_listeners.remove(callback)
+
+def _name_search_matches(key, names):
+    """True if the cached search_recipe_by_name entry `key` could match any of `names`."""
+    term = key[1]
+    if '%' in term or '_' in term:
+        return True  # LIKE wildcards in the term; don't try to be clever.
+    return any(term in name.lower() for name in names)
+
+def _notify_change(recipe_ids=(), recipe_names=()):
+    """Invalidates cached reads affected by a write and tells the change listeners."""
+    cache = _cache
+    if cache is not None:
+        for recipe_id in recipe_ids:
+            cache.invalidate_tag(('recipe', recipe_id))
+        if recipe_names:
+            cache.invalidate_tag('recipe_list')
+            cache.invalidate_where(lambda key: key[0] == 'search_name' and _name_search_matches(key, recipe_names))
+    replica = _replica
+    if replica is not None:
+        replica.signal()
+    for callback in list(_change_listeners):
+        callback(list(recipe_ids), list(recipe_names))
+
+def _report_error(operation, message, error):
+    """Logs a database error that an operation handles by returning an empty result, and counts it."""
+    instrumentation.metrics.record_error(operation)
+    logger.error("%s: %s", message, error, extra={'op': operation, 'error': type(error).__name__})
+
+def _rows(conn, sql, parameters, row_factory):
+    """Runs `sql` on a new cursor whose rows are built by `row_factory` and returns them all."""
+    cursor = conn.cursor()
+    cursor.row_factory = row_factory
+    return cursor.execute(sql, parameters).fetchall()
+
+@contextmanager
+def _committed_view(conn):
+    """
+    Yields a connection that sees only committed rows, for loading the shared
+    in-memory indexes: `conn` itself outside a transaction, otherwise a
+    short-lived read-only connection to the same file (None for an in-memory
+    database). Rows of an open transaction may still be rolled back, and the
+    indexes would keep them, and their reused IDs, for good.
+    """
+    if not conn.in_transaction:
+        yield conn
+        return
+    database = _database_path(conn)
+    if not database:
+        yield None
+        return
+    committed = sqlite3.connect(f"{pathlib.Path(database).as_uri()}?mode=ro", uri=True)
+    try:
+        yield committed
+    finally:
+        committed.close()
+
+@contextmanager
+def _read_transaction(conn):
+    """
+    Runs the block's reads in one transaction, so they all see the same
+    snapshot of the database; a transaction already open on `conn` is used as is.
+    """
+    if conn.in_transaction:
+        yield
+        return
+    conn.execute("BEGIN")
+    try:
+        yield
+    finally:
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+
+_INGREDIENT_LOOKUP_SQL = "SELECT IngredientID FROM Ingredients WHERE IngredientName = ? COLLATE NOCASE"
+_CANONICAL_LOOKUP_SQL = "SELECT MIN(IngredientID) FROM Ingredients WHERE CanonicalName = ?"
+
+def _find_canonical_ingredient(conn, canonical):
+    """Returns the IngredientID of an existing near-duplicate of `canonical`, or None."""
+    row = conn.execute(_CANONICAL_LOOKUP_SQL, (canonical,)).fetchone()
+    if row[0] is not None:
+        return row[0]
+
+    min_similarity = _canonicalization['min_similarity']
+    if min_similarity is None:
+        return None
+    index = get_name_index(_database_path(conn))
+    with _committed_view(conn) as committed:
+        if committed is None:
+            return None  # An in-memory database mid-transaction has no committed view to index.
+        index.refresh(committed)
+    for ingredient_id, name, score in index.search_ingredients(canonical, limit=5, min_similarity=min_similarity / 2):
+        if fuzzy_index.similarity(canonical, fuzzy_index.canonical_name(name)) < min_similarity:
+            continue
+        # The index follows deletes and renames by other connections only on reset; trust the database.
+        if conn.execute("SELECT 1 FROM Ingredients WHERE IngredientID = ? AND IngredientName = ?",
+                        (ingredient_id, name)).fetchone():
+            return ingredient_id
+    return None
+
 def add_ingredient_if_not_exists(conn, ingredient_name):
     """
     Adds an ingredient to the Ingredients table if it doesn't already exist.
     Returns the IngredientID.
     Handles case-insensitivity for ingredient names.
+    The insert is left uncommitted; it becomes part of the caller's transaction.
+    With ingredient canonicalization on, a near-duplicate of an existing
+    ingredient ("Eggs" or "egg, large" for "Egg") returns the existing IngredientID.
     """
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT IngredientID FROM Ingredients WHERE IngredientName = ? COLLATE NOCASE", (ingredient_name,))
+        cursor.execute(_INGREDIENT_LOOKUP_SQL, (ingredient_name,))
         result = cursor.fetchone()
 
         if result:
             return result['IngredientID']
-        else:
-            cursor.execute("INSERT INTO Ingredients (IngredientName) VALUES (?)", (ingredient_name,))
-            conn.commit()
-            print(f"Added new ingredient: {ingredient_name}")
-            return cursor.lastrowid
+
+        canonical = fuzzy_index.canonical_name(ingredient_name)
+        if _canonicalization is not None:
+            existing_id = _find_canonical_ingredient(conn, canonical)
+            if existing_id is not None:
+                logger.debug("Resolved ingredient '%s' to existing IngredientID %s", ingredient_name, existing_id)
+                return existing_id
+
+        cursor.execute("INSERT INTO Ingredients (IngredientName, CanonicalName) VALUES (?, ?)",
+                       (ingredient_name, canonical))
+        logger.debug("Added new ingredient: %s", ingredient_name)
+        return cursor.lastrowid
     except sqlite3.IntegrityError as e:
-        print(f"Error adding ingredient '{ingredient_name}': {e}")
-        conn.rollback()
+        _report_error('add_ingredient_if_not_exists', f"Error adding ingredient '{ingredient_name}'", e)
         return None
     except sqlite3.Error as e:
-        print(f"Database error adding ingredient '{ingredient_name}': {e}")
-        conn.rollback()
+        _report_error('add_ingredient_if_not_exists', f"Database error adding ingredient '{ingredient_name}'", e)
         return None
 
-def add_recipe(recipe_name, description, ingredients_list, instructions_list):
+@instrumentation.timed()
+def add_recipe(recipe_name, description, ingredients_list, instructions_list, conn=None):
     """
     Adds a complete recipe to the database.
     Handles adding recipe details, ingredients (checking existence),
     linking ingredients with quantities, and adding instructions.
+    Uses `conn` if given (joining any transaction open on it), otherwise a pooled connection.
+    A recipe listing the same ingredient twice (also as two names that
+    canonicalization resolves to one ingredient) is rejected rather than
+    losing one of the quantities.
     Returns the RecipeID if successful, None otherwise.
     """
-    conn = get_db_connection()
-    if not conn:
-        return None
-
-    cursor = conn.cursor()
-    recipe_id = None
-
     try:
-        cursor.execute("INSERT INTO Recipes (RecipeName, Description) VALUES (?, ?)", (recipe_name, description))
-        recipe_id = cursor.lastrowid
-        print(f"\nAdding recipe '{recipe_name}' (ID: {recipe_id})...")
+        with _connection(conn) as conn, _transaction(conn, 'add_recipe'):
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO Recipes (RecipeName, Description) VALUES (?, ?)", (recipe_name, description))
+            recipe_id = cursor.lastrowid
+            logger.debug("Adding recipe '%s' (ID: %s)", recipe_name, recipe_id)
 
-        print("Processing ingredients...")
-        for ingredient_info in ingredients_list:
-            ing_name = ingredient_info.get('name')
-            ing_quantity = ingredient_info.get('quantity')
+            linked = {}  # IngredientID -> the name it was listed as
+            for ingredient_info in ingredients_list:
+                ing_name = ingredient_info.get('name')
+                ing_quantity = ingredient_info.get('quantity')
 
-            if not ing_name or not ing_quantity:
-                print(f"Skipping invalid ingredient entry: {ingredient_info}")
-                continue
+                if not ing_name or not ing_quantity:
+                    logger.warning("Skipping invalid ingredient entry: %r", ingredient_info)
+                    continue
 
-            ingredient_id = add_ingredient_if_not_exists(conn, ing_name)
+                ingredient_id = add_ingredient_if_not_exists(conn, ing_name)
 
-            if ingredient_id:
+                if ingredient_id in linked:
+                    raise ValueError(f"'{ing_name}' is the same ingredient as '{linked[ingredient_id]}'")
+                elif ingredient_id:
+                    linked[ingredient_id] = ing_name
+                    amount, unit = quantities.parse_quantity(ing_quantity)
+                    cursor.execute("""
+                        INSERT INTO RecipeIngredients (RecipeID, IngredientID, Quantity, Amount, Unit)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (recipe_id, ingredient_id, ing_quantity, amount, unit))
+                else:
+                    raise sqlite3.Error(f"Could not process ingredient: {ing_name}")
+
+            for i, instruction_text in enumerate(instructions_list):
+                step_number = i + 1
                 cursor.execute("""
-                    INSERT INTO RecipeIngredients (RecipeID, IngredientID, Quantity)
+                    INSERT INTO Instructions (RecipeID, StepNumber, StepDescription)
                     VALUES (?, ?, ?)
-                """, (recipe_id, ingredient_id, ing_quantity))
-                print(f"  Linked: {ing_name} ({ing_quantity})")
-            else:
-                raise sqlite3.Error(f"Could not process ingredient: {ing_name}")
-
-        print("Adding instructions...")
-        for i, instruction_text in enumerate(instructions_list):
-            step_number = i + 1
-            cursor.execute("""
-                INSERT INTO Instructions (RecipeID, StepNumber, StepDescription)
-                VALUES (?, ?, ?)
-            """, (recipe_id, step_number, instruction_text))
-            print(f"  Step {step_number}: Added.")
-
-        conn.commit()
-        print(f"Successfully added recipe '{recipe_name}'!")
+                """, (recipe_id, step_number, instruction_text))
+
+            recipe_search.sync_search_index(conn)
+            similar_recipes.sync_similar_recipes(conn)
+
+        _notify_change([recipe_id], [recipe_name])
+        logger.info("Added recipe '%s' (ID: %s)", recipe_name, recipe_id)
         return recipe_id
 
+    except ValueError as e:
+        _report_error('add_recipe', f"Rejected recipe '{recipe_name}'", e)
+        return None
     except sqlite3.IntegrityError as e:
-        print(f"\nError adding recipe '{recipe_name}': {e}. Recipe might already exist.")
-        conn.rollback()
+        _report_error('add_recipe', f"Error adding recipe '{recipe_name}' (it might already exist)", e)
         return None
     except sqlite3.Error as e:
-        print(f"\nDatabase error occurred while adding recipe '{recipe_name}': {e}")
-        conn.rollback()
+        _report_error('add_recipe', f"Database error occurred while adding recipe '{recipe_name}'", e)
         return None
-    finally:
-        if conn:
-            conn.close()
 
+def _reload_indexed_recipe(conn, recipe_id):
+    """Brings the in-memory pantry and name indexes up to date with one edited or deleted recipe."""
+    database = _database_path(conn)
+    get_pantry_index(database).reload_recipe(conn, recipe_id)
+    get_name_index(database).reload_recipe(conn, recipe_id)
 
-def list_all_recipes():
-    """Retrieves and returns a list of all recipe names and IDs."""
-    conn = get_db_connection()
-    if not conn:
+@instrumentation.timed()
+def update_recipe(recipe_id, recipe_name=None, description=None, ingredients_list=None, instructions_list=None, conn=None):
+    """
+    Changes a recipe in place. Arguments left as None keep their stored value;
+    ingredients_list and instructions_list (same format as for add_recipe)
+    replace the recipe's whole list (one listing the same ingredient twice is rejected, as in add_recipe).
+    The new values are compared with the stored rows and only the differences
+    are written, in one transaction: ingredient lines are matched by ingredient
+    (a changed quantity is an UPDATE, new and dropped ingredients are INSERTs
+    and DELETEs) and instructions by step number, so unchanged rows keep their IDs.
+    Returns a dict with 'recipe' (True if the name or description changed) and
+    'ingredients' and 'instructions' (dicts with 'added', 'updated' and
+    'removed' counts), or None if the recipe doesn't exist or the update failed.
+    """
+    summary = {'recipe': False,
+               'ingredients': {'added': 0, 'updated': 0, 'removed': 0},
+               'instructions': {'added': 0, 'updated': 0, 'removed': 0}}
+    try:
+        with _connection(conn) as conn:
+            with _transaction(conn, 'update_recipe'):
+                cursor = conn.cursor()
+                cursor.execute("SELECT RecipeName, Description FROM Recipes WHERE RecipeID = ?", (recipe_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    logger.warning("Recipe %s not found; nothing updated", recipe_id)
+                    return None
+                old_name = row['RecipeName']
+                names = {old_name}
+
+                new_name = old_name if recipe_name is None else recipe_name
+                new_description = row['Description'] if description is None else description
+                if new_name != old_name or new_description != row['Description']:
+                    cursor.execute("UPDATE Recipes SET RecipeName = ?, Description = ? WHERE RecipeID = ?",
+                                   (new_name, new_description, recipe_id))
+                    names.add(new_name)
+                    summary['recipe'] = True
+
+                old_ingredient_ids = None
+                if ingredients_list is not None:
+                    cursor.execute("SELECT RecipeIngredientID, IngredientID, Quantity FROM RecipeIngredients WHERE RecipeID = ?",
+                                   (recipe_id,))
+                    stored = {row['IngredientID']: (row['RecipeIngredientID'], row['Quantity']) for row in cursor.fetchall()}
+                    wanted = {}
+                    for ingredient_info in ingredients_list:
+                        ing_name = ingredient_info.get('name')
+                        ing_quantity = ingredient_info.get('quantity')
+                        if not ing_name or not ing_quantity:
+                            logger.warning("Skipping invalid ingredient entry: %r", ingredient_info)
+                            continue
+                        ingredient_id = add_ingredient_if_not_exists(conn, ing_name)
+                        if not ingredient_id:
+                            raise sqlite3.Error(f"Could not process ingredient: {ing_name}")
+                        if ingredient_id in wanted:
+                            raise ValueError(f"'{ing_name}' is the same ingredient as an earlier entry")
+                        wanted[ingredient_id] = ing_quantity
+
+                    for ingredient_id, (link_id, quantity) in stored.items():
+                        if ingredient_id not in wanted:
+                            cursor.execute("DELETE FROM RecipeIngredients WHERE RecipeIngredientID = ?", (link_id,))
+                            summary['ingredients']['removed'] += 1
+                        elif wanted[ingredient_id] != quantity:
+                            cursor.execute("""
+                                UPDATE RecipeIngredients SET Quantity = ?, Amount = ?, Unit = ?
+                                WHERE RecipeIngredientID = ?
+                            """, (wanted[ingredient_id], *quantities.parse_quantity(wanted[ingredient_id]), link_id))
+                            summary['ingredients']['updated'] += 1
+                    for ingredient_id, quantity in wanted.items():
+                        if ingredient_id not in stored:
+                            cursor.execute("""
+                                INSERT INTO RecipeIngredients (RecipeID, IngredientID, Quantity, Amount, Unit)
+                                VALUES (?, ?, ?, ?, ?)
+                            """, (recipe_id, ingredient_id, quantity, *quantities.parse_quantity(quantity)))
+                            summary['ingredients']['added'] += 1
+                    if set(stored) != set(wanted):
+                        old_ingredient_ids = tuple(stored)
+
+                if instructions_list is not None:
+                    cursor.execute("SELECT StepNumber, StepDescription FROM Instructions WHERE RecipeID = ?", (recipe_id,))
+                    stored = {row['StepNumber']: row['StepDescription'] for row in cursor.fetchall()}
+                    for step_number, instruction_text in enumerate(instructions_list, start=1):
+                        if step_number not in stored:
+                            cursor.execute("""
+                                INSERT INTO Instructions (RecipeID, StepNumber, StepDescription)
+                                VALUES (?, ?, ?)
+                            """, (recipe_id, step_number, instruction_text))
+                            summary['instructions']['added'] += 1
+                        elif stored[step_number] != instruction_text:
+                            cursor.execute("UPDATE Instructions SET StepDescription = ? WHERE RecipeID = ? AND StepNumber = ?",
+                                           (instruction_text, recipe_id, step_number))
+                            summary['instructions']['updated'] += 1
+                    removed = [step for step in stored if step > len(instructions_list)]
+                    if removed:
+                        cursor.execute("DELETE FROM Instructions WHERE RecipeID = ? AND StepNumber > ?",
+                                       (recipe_id, len(instructions_list)))
+                        summary['instructions']['removed'] += len(removed)
+
+                recipe_search.sync_search_index(conn)
+                if old_ingredient_ids is not None:
+                    similar_recipes.replace_similar_recipes(conn, {recipe_id: old_ingredient_ids})
+
+            if summary['recipe'] or old_ingredient_ids is not None:
+                _reload_indexed_recipe(conn, recipe_id)
+        if summary['recipe']:
+            _recipe_views.rename(recipe_id, new_name)
+        _notify_change([recipe_id], sorted(names) if summary['recipe'] else [])
+        logger.info("Updated recipe %s: %s", recipe_id, summary)
+        return summary
+
+    except ValueError as e:
+        _report_error('update_recipe', f"Rejected update of recipe {recipe_id}", e)
+        return None
+    except sqlite3.IntegrityError as e:
+        _report_error('update_recipe', f"Error updating recipe {recipe_id} (the new name might already be taken)", e)
+        return None
+    except sqlite3.Error as e:
+        _report_error('update_recipe', f"Database error occurred while updating recipe {recipe_id}", e)
+        return None
+
+@instrumentation.timed()
+def delete_recipe(recipe_id, conn=None):
+    """
+    Deletes a recipe. Its ingredient lines and instructions go with it through
+    the ON DELETE CASCADE foreign keys; ingredients no other recipe uses are
+    kept until delete_orphan_ingredients() runs.
+    Returns True if the recipe was deleted, False if it didn't exist or the delete failed.
+    """
+    try:
+        with _connection(conn) as conn:
+            with _transaction(conn, 'delete_recipe'):
+                row = conn.execute("SELECT RecipeName FROM Recipes WHERE RecipeID = ?", (recipe_id,)).fetchone()
+                if row is None:
+                    logger.warning("Recipe %s not found; nothing deleted", recipe_id)
+                    return False
+                ingredient_ids = tuple(r[0] for r in conn.execute(
+                    "SELECT IngredientID FROM RecipeIngredients WHERE RecipeID = ?", (recipe_id,)).fetchall())
+                conn.execute("DELETE FROM Recipes WHERE RecipeID = ?", (recipe_id,))
+                recipe_search.sync_search_index(conn)
+                similar_recipes.replace_similar_recipes(conn, {recipe_id: ingredient_ids})
+            _reload_indexed_recipe(conn, recipe_id)
+        _recipe_views.forget([recipe_id])
+        _notify_change([recipe_id], [row['RecipeName']])
+        logger.info("Deleted recipe '%s' (ID: %s)", row['RecipeName'], recipe_id)
+        return True
+    except sqlite3.Error as e:
+        _report_error('delete_recipe', f"Database error occurred while deleting recipe {recipe_id}", e)
+        return False
+
+_ORPHAN_INGREDIENTS_SQL = """
+    SELECT IngredientID, IngredientName FROM Ingredients I
+    WHERE NOT EXISTS (SELECT 1 FROM RecipeIngredients RI WHERE RI.IngredientID = I.IngredientID)
+    ORDER BY IngredientName COLLATE NOCASE
+"""
+
+@instrumentation.timed()
+def delete_orphan_ingredients(dry_run=False, conn=None):
+    """
+    Deletes ingredients that no recipe uses any more (left behind by edits and
+    deletes). Returns a list of the (IngredientID, IngredientName) pairs removed,
+    or that would be removed with dry_run=True.
+    """
+    try:
+        with _connection(conn) as conn:
+            with _transaction(conn, 'delete_orphan_ingredients'):
+                orphans = [(row[0], row[1]) for row in conn.execute(_ORPHAN_INGREDIENTS_SQL).fetchall()]
+                if dry_run or not orphans:
+                    return orphans
+                conn.execute("DELETE FROM Ingredients WHERE IngredientID IN (SELECT value FROM json_each(?))",
+                             (json.dumps([ingredient_id for ingredient_id, _ in orphans]),))
+
+            # Ingredients were deleted, which the incremental indexes can't follow.
+            database = _database_path(conn)
+            get_pantry_index(database).reset()
+            get_name_index(database).reset()
+        logger.info("Deleted %d orphaned ingredients", len(orphans))
+        return orphans
+    except sqlite3.Error as e:
+        _report_error('delete_orphan_ingredients', "Error deleting orphaned ingredients", e)
         return []
 
-    cursor = conn.cursor()
+def _next_id(cursor, table, id_column):
+    """Returns the next AUTOINCREMENT value for table (call inside a write transaction)."""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,))
+    row = cursor.fetchone()
+    seq = row[0] if row else 0
+    cursor.execute(f"SELECT MAX({id_column}) FROM {table}")
+    max_id = cursor.fetchone()[0] or 0
+    return max(seq, max_id) + 1
+
+# Preparation needs no database, so it lives in a module bulk_import's worker
+# processes can load without this one; callers of bulk_writer() use it from here.
+prepare_bulk_batch = bulk_prepare.prepare_bulk_batch
+
+# Modules whose per-row insert triggers (INSERT_TRIGGERS) BulkWriter suspends
+# while it writes a batch, applying their record_bulk_insert() once instead.
+_BULK_TRIGGER_OWNERS = (recipe_search, recipe_stats, change_log)
+
+class BulkWriter:
+    """
+    Writes recipes prepared by prepare_bulk_batch() on one autocommit-mode
+    connection (get one from bulk_writer()). The writer owns the in-memory
+    ingredient name->ID and recipe name maps and allocates recipe and ingredient
+    IDs up front, so each call to write() is one transaction with one executemany
+    per table. `summary` accumulates the results in the add_recipes_bulk format.
+
+    The search queue, statistics and change log insert triggers would run
+    several statements for every row written; inside its transaction the writer
+    drops them, maintains those tables with a few set-based statements over the
+    batch's ID ranges, and recreates the triggers before COMMIT, so other
+    connections never see them missing.
+    """
+
+    def __init__(self, conn, on_batch=None):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.on_batch = on_batch
+        self.summary = {'added': 0, 'rejected': [], 'batches': [], 'seconds': 0.0}
+        self._ingredient_ids = {}
+        self._canonical_ids = {}  # Only used with ingredient canonicalization on.
+        self._canonicalization = _canonicalization
+        self._recipe_names = set()
+        self._seen = {'ingredient': 0, 'recipe': 0}
+
+    def _refresh_name_maps(self):
+        """Loads rows added since the last batch (by any writer) into the in-memory maps."""
+        cursor = self.cursor
+        cursor.execute("SELECT IngredientID, IngredientName, CanonicalName FROM Ingredients WHERE IngredientID > ?",
+                       (self._seen['ingredient'],))
+        for row in cursor.fetchall():
+            self._ingredient_ids[row['IngredientName'].lower()] = row['IngredientID']
+            self._canonical_ids.setdefault(row['CanonicalName'], row['IngredientID'])
+            self._seen['ingredient'] = max(self._seen['ingredient'], row['IngredientID'])
+        cursor.execute("SELECT RecipeID, RecipeName FROM Recipes WHERE RecipeID > ?", (self._seen['recipe'],))
+        for row in cursor.fetchall():
+            self._recipe_names.add(row['RecipeName'].lower())
+            self._seen['recipe'] = max(self._seen['recipe'], row['RecipeID'])
+
+    def _duplicate_ingredient(self, ingredients):
+        """
+        Returns why a prepared recipe must be rejected if two of its ingredient
+        lines resolve to one ingredient ("Egg" and "Eggs" with canonicalization
+        on), or None. Nothing is changed, so a rejected recipe adds no ingredients.
+        """
+        listed = {}
+        for ing_name, canonical, *_ in ingredients:
+            ingredient_id = self._ingredient_ids.get(ing_name.lower())
+            if ingredient_id is None and self._canonicalization is not None:
+                ingredient_id = self._canonical_ids.get(canonical)
+            if ingredient_id is None:
+                # A new ingredient; a later line with the same canonical name would resolve to it.
+                ingredient_id = ('new', canonical if self._canonicalization is not None else ing_name.lower())
+            if ingredient_id in listed:
+                return f"'{ing_name}' is the same ingredient as '{listed[ingredient_id]}'"
+            listed[ingredient_id] = ing_name
+        return None
+
+    def _suspend_insert_triggers(self):
+        """
+        Drops the insert triggers of every module in _BULK_TRIGGER_OWNERS whose
+        triggers all exist (a database without, say, the change log keeps the
+        rest). Returns (modules, CREATE statements to run again before COMMIT).
+        """
+        cursor = self.cursor
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row['name']: row['sql'] for row in cursor.fetchall()}
+        modules, statements = [], []
+        for module in _BULK_TRIGGER_OWNERS:
+            if all(name in existing for name in module.INSERT_TRIGGERS):
+                modules.append(module)
+                statements.extend(existing[name] for name in module.INSERT_TRIGGERS)
+                for name in module.INSERT_TRIGGERS:
+                    cursor.execute(f"DROP TRIGGER {name}")
+        return modules, statements
+
+    def write(self, prepared, prepare_seconds=0.0):
+        """
+        Writes one list of prepare_bulk_batch() results in a single transaction.
+        If the transaction fails every row in it is rejected and the import goes on.
+        `prepare_seconds` is added to the batch's time when it was prepared inline.
+        Returns the batch's stats dict (also passed to on_batch).
+        """
+        started = time.perf_counter()
+        cursor = self.cursor
+        ingredient_ids, canonical_ids, recipe_names = self._ingredient_ids, self._canonical_ids, self._recipe_names
+        rejected = [{'row': row_number, 'name': name, 'reason': reason}
+                    for row_number, name, recipe, reason in prepared if recipe is None]
+        recipe_rows, ingredient_rows, link_rows, step_rows = [], [], [], []
+        batch_names = set()
+        new_ingredients = {}
+
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            self._refresh_name_maps()
+            next_recipe_id = _next_id(cursor, 'Recipes', 'RecipeID')
+            next_ingredient_id = _next_id(cursor, 'Ingredients', 'IngredientID')
+
+            for row_number, name, recipe, _ in prepared:
+                if recipe is None:
+                    continue
+                if name.lower() in recipe_names:
+                    rejected.append({'row': row_number, 'name': name, 'reason': f"recipe '{name}' already exists"})
+                    continue
+                _, description, ingredients, instructions = recipe
+                duplicate = self._duplicate_ingredient(ingredients)
+                if duplicate:
+                    rejected.append({'row': row_number, 'name': name, 'reason': duplicate})
+                    continue
+
+                recipe_id = next_recipe_id
+                next_recipe_id += 1
+                recipe_names.add(name.lower())
+                batch_names.add(name.lower())
+                recipe_rows.append((recipe_id, name, description))
+
+                for ing_name, canonical, ing_quantity, amount, unit in ingredients:
+                    key = ing_name.lower()
+                    ingredient_id = ingredient_ids.get(key)
+                    if ingredient_id is None and self._canonicalization is not None:
+                        ingredient_id = canonical_ids.get(canonical)
+                    if ingredient_id is None:
+                        ingredient_id = next_ingredient_id
+                        next_ingredient_id += 1
+                        ingredient_ids[key] = ingredient_id
+                        canonical_ids.setdefault(canonical, ingredient_id)
+                        new_ingredients[key] = (ingredient_id, canonical)
+                        ingredient_rows.append((ingredient_id, ing_name, canonical))
+                    link_rows.append((recipe_id, ingredient_id, ing_quantity, amount, unit))
+
+                for step_number, instruction_text in enumerate(instructions, start=1):
+                    step_rows.append((recipe_id, step_number, instruction_text))
+
+            if recipe_rows:
+                suspended, trigger_statements = self._suspend_insert_triggers()
+                cursor.executemany("INSERT INTO Ingredients (IngredientID, IngredientName, CanonicalName) VALUES (?, ?, ?)", ingredient_rows)
+                cursor.executemany("INSERT INTO Recipes (RecipeID, RecipeName, Description) VALUES (?, ?, ?)", recipe_rows)
+                cursor.executemany("INSERT INTO RecipeIngredients (RecipeID, IngredientID, Quantity, Amount, Unit) VALUES (?, ?, ?, ?, ?)", link_rows)
+                cursor.executemany("INSERT INTO Instructions (RecipeID, StepNumber, StepDescription) VALUES (?, ?, ?)", step_rows)
+                recipe_ids = (recipe_rows[0][0], recipe_rows[-1][0])
+                # An empty range (first > last) when the batch adds no ingredients.
+                ingredient_ids = (ingredient_rows[0][0], ingredient_rows[-1][0]) if ingredient_rows else (1, 0)
+                for module in suspended:
+                    module.record_bulk_insert(self.conn, recipe_ids, ingredient_ids)
+                for statement in trigger_statements:
+                    cursor.execute(statement)
+                recipe_search.sync_search_index(self.conn)
+            cursor.execute("COMMIT")
+        except sqlite3.Error as e:
+            if self.conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            # Undo the in-memory bookkeeping for rows that were never written.
+            recipe_names.difference_update(batch_names)
+            for key, (ingredient_id, canonical) in new_ingredients.items():
+                del ingredient_ids[key]
+                if canonical_ids.get(canonical) == ingredient_id:
+                    del canonical_ids[canonical]
+            rejected = [{'row': row_number, 'name': name, 'reason': f"batch failed: {e}"}
+                        for row_number, name, _, _ in prepared]
+            recipe_rows, link_rows, step_rows = [], [], []
+
+        seconds = time.perf_counter() - started + prepare_seconds
+        stats = {
+            'batch': len(self.summary['batches']) + 1,
+            'recipes': len(recipe_rows),
+            'ingredient_links': len(link_rows),
+            'steps': len(step_rows),
+            'rejected': len(rejected),
+            'seconds': seconds,
+            'recipes_per_sec': len(recipe_rows) / seconds if seconds > 0 else 0.0,
+        }
+        if recipe_rows:
+            _notify_change([row[0] for row in recipe_rows], [row[1] for row in recipe_rows])
+        self.summary['added'] += len(recipe_rows)
+        self.summary['rejected'].extend(rejected)
+        self.summary['batches'].append(stats)
+        if self.on_batch:
+            self.on_batch(stats)
+        return stats
+
+@contextmanager
+def bulk_writer(on_batch=None, conn=None):
+    """
+    Yields a BulkWriter on `conn` if given (it must not have a transaction open),
+    otherwise on a pooled connection, switched to autocommit mode for the
+    writer's own transactions. When the block ends the similar-recipes index is
+    brought up to date once for everything written. Statements this thread runs
+    in the block are bulk work: timed, but not reported as slow queries.
+    """
+    with _connection(conn) as conn, instrumentation.bulk_work():
+        isolation_level = conn.isolation_level
+        conn.isolation_level = None  # Transactions are managed explicitly per batch.
+        try:
+            writer = BulkWriter(conn, on_batch)
+            yield writer
+            if writer.summary['added']:
+                _sync_similar_recipes_after_import(conn)
+        finally:
+            conn.isolation_level = isolation_level
+
+@instrumentation.timed()
+def add_recipes_bulk(recipes, batch_size=1000, on_batch=None, conn=None):
+    """
+    Adds many recipes at once using batched executemany inserts.
+    `recipes` is any iterable (it is consumed lazily) of dicts shaped like the
+    arguments of add_recipe: 'name', 'description', 'ingredients' (list of
+    {'name', 'quantity'}) and 'instructions' (list of strings).
+    Every `batch_size` recipes are written in a single transaction. Ingredient
+    names are resolved against an in-memory name->ID map, and recipe and
+    ingredient IDs are allocated up front so each table gets one executemany
+    per batch. Rows that fail validation (missing name, duplicate recipe,
+    bad ingredient entry, ...) are rejected without aborting the import and
+    reported by their optional 'row' key (e.g. a source line number) or their
+    1-based position in `recipes`.
+    `on_batch`, if given, is called with each batch's stats dict as it commits.
+    Uses `conn` if given (it must not have a transaction open), otherwise a pooled connection.
+    Returns a dict with 'added', 'rejected' (list of dicts with 'row', 'name'
+    and 'reason'), 'batches' (list of per-batch stats) and 'seconds'.
+    """
+    with bulk_writer(on_batch, conn) as writer:
+        started = time.perf_counter()
+        batch = []
+        for position, recipe in enumerate(recipes, start=1):
+            row_number = recipe.get('row', position) if isinstance(recipe, dict) else position
+            batch.append((row_number, recipe))
+            if len(batch) >= batch_size:
+                _write_bulk_batch(writer, batch)
+                batch = []
+        if batch:
+            _write_bulk_batch(writer, batch)
+        writer.summary['seconds'] = time.perf_counter() - started
+    return writer.summary
+
+def _write_bulk_batch(writer, batch):
+    started = time.perf_counter()
+    prepared = prepare_bulk_batch(batch)
+    writer.write(prepared, prepare_seconds=time.perf_counter() - started)
+
+def _sync_similar_recipes_after_import(conn):
+    # Done once after all batches rather than per batch: placing recipes one at a time
+    # would triple the import time, and a large import is cheaper to rebuild in one go.
+    try:
+        with _transaction(conn, 'similar_recipes'):
+            similar_recipes.sync_similar_recipes(conn, rebuild_fraction=similar_recipes.REBUILD_FRACTION)
+    except sqlite3.Error as e:
+        _report_error('add_recipes_bulk', "Error updating similar recipes (run similar_recipes.py to retry)", e)
+
+
+_LIST_ALL_SQL = "SELECT RecipeID, RecipeName FROM Recipes ORDER BY RecipeName COLLATE NOCASE"
+
+@instrumentation.timed()
+def list_all_recipes(conn=None):
+    """Retrieves and returns a list of all recipe names and IDs."""
+    cache = _cache if conn is None else None
+    if cache is not None:
+        hit, recipes = cache.get(('list',))
+        if hit:
+            return list(recipes)
+        generation = cache.generation()
+
     try:
-        cursor.execute("SELECT RecipeID, RecipeName FROM Recipes ORDER BY RecipeName COLLATE NOCASE")
-        recipes = cursor.fetchall()
-        return [(row['RecipeID'], row['RecipeName']) for row in recipes]
+        with _read_connection(conn) as conn:
+            recipes = _rows(conn, _LIST_ALL_SQL, (), None)
+        if cache is not None:
+            cache.put(('list',), recipes, tags=['recipe_list'], generation=generation)
+        return list(recipes)
     except sqlite3.Error as e:
-        print(f"Error listing recipes: {e}")
+        _report_error('list_all_recipes', "Error listing recipes", e)
         return []
-    finally:
-        if conn:
-            conn.close()
 
-def search_recipe_by_name(search_term):
+# Keyset pagination over (RecipeName, RecipeID). RecipeName is declared COLLATE NOCASE, so the
+# row-value comparison and the ORDER BY both use NOCASE and SQLite answers each page with a range
+# scan of the UNIQUE(RecipeName) index (which ends in the rowid, i.e. RecipeID).
+_FIRST_PAGE_SQL = """
+    SELECT RecipeID, RecipeName FROM Recipes
+    ORDER BY RecipeName COLLATE NOCASE, RecipeID
+    LIMIT ?
+"""
+_NEXT_PAGE_SQL = """
+    SELECT RecipeID, RecipeName FROM Recipes
+    WHERE (RecipeName, RecipeID) > (?, ?)
+    ORDER BY RecipeName COLLATE NOCASE, RecipeID
+    LIMIT ?
+"""
+
+@instrumentation.timed()
+def list_recipes_page(page_size=20, after=None, conn=None):
+    """
+    Returns one page of recipes in name order using keyset pagination.
+    `after` is the cursor returned with the previous page (None for the first page).
+    Returns (list of (RecipeID, RecipeName) tuples, cursor for the next page or None if this was the last).
+    Raises ValueError if page_size is less than 1.
+    """
+    if page_size < 1:
+        raise ValueError(f"page_size must be at least 1, got {page_size}")
+    try:
+        with _read_connection(conn) as conn:
+            if after is None:
+                rows = _rows(conn, _FIRST_PAGE_SQL, (page_size + 1,), None)
+            else:
+                rows = _rows(conn, _NEXT_PAGE_SQL, (after[0], after[1], page_size + 1), None)
+    except sqlite3.Error as e:
+        _report_error('list_recipes_page', "Error listing recipes", e)
+        return [], None
+
+    if rows and len(rows) > page_size:
+        rows = rows[:page_size]
+        last_id, last_name = rows[-1]
+        return rows, (last_name, last_id)
+    return rows, None
+
+def iter_recipes(batch_size=1000, conn=None):
+    """
+    Yields every (RecipeID, RecipeName) in name order without loading the whole table.
+    Rows are read one keyset page at a time, and a pooled connection is only held while
+    a page is being read, so slow consumers don't tie up a connection.
+    """
+    after = None
+    while True:
+        rows, after = list_recipes_page(batch_size, after, conn=conn)
+        yield from rows
+        if after is None:
+            return
+
+_SEARCH_NAME_SQL = "SELECT RecipeID, RecipeName FROM Recipes WHERE RecipeName LIKE ? COLLATE NOCASE ORDER BY RecipeName COLLATE NOCASE"
+
+@instrumentation.timed()
+def search_recipe_by_name(search_term, conn=None):
     """
     Searches for recipes where the name contains the search_term (case-insensitive).
     Returns a list of matching (RecipeID, RecipeName) tuples.
     """
-    conn = get_db_connection()
-    if not conn:
+    cache = _cache if conn is None else None
+    if cache is not None:
+        key = ('search_name', search_term.lower())
+        hit, recipes = cache.get(key)
+        if hit:
+            return list(recipes)
+        generation = cache.generation()
+
+    try:
+        with _read_connection(conn) as conn:
+            recipes = _rows(conn, _SEARCH_NAME_SQL, (f'%{search_term}%',), None)
+        if cache is not None:
+            # Renames and deletes of matching recipes invalidate through the name check;
+            # the recipe tags cover changes to recipes already in the result.
+            cache.put(key, recipes, tags=[('recipe', recipe_id) for recipe_id, _ in recipes], generation=generation)
+        return list(recipes)
+    except sqlite3.Error as e:
+        _report_error('search_recipe_by_name', "Error searching recipes", e)
         return []
 
-    cursor = conn.cursor()
+@instrumentation.timed()
+def search_recipes(query, mode='all', limit=20, conn=None):
+    """
+    Ranked full-text search over recipe names, descriptions, ingredients and instructions.
+    mode is 'all', 'any', 'prefix' or 'phrase' (see recipe_search.build_match_query).
+    Returns a list of dicts with 'id', 'name', 'score' and a highlighted 'snippet'.
+    """
     try:
-        query = "SELECT RecipeID, RecipeName FROM Recipes WHERE RecipeName LIKE ? COLLATE NOCASE ORDER BY RecipeName COLLATE NOCASE"
-        cursor.execute(query, (f'%{search_term}%',))
-        recipes = cursor.fetchall()
-        return [(row['RecipeID'], row['RecipeName']) for row in recipes]
+        with _read_connection(conn) as conn:
+            return recipe_search.search_recipes(conn, query, mode=mode, limit=limit)
     except sqlite3.Error as e:
-        print(f"Error searching recipes: {e}")
+        _report_error('search_recipes', "Error running full-text search", e)
         return []
-    finally:
-        if conn:
-            conn.close()
 
-def get_recipe_details(recipe_id):
+_pantry_indexes = {}
+_pantry_indexes_lock = threading.Lock()
+
+def _database_path(conn):
+    """Returns the absolute file path of the main database open on `conn` ('' for in-memory)."""
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+def get_pantry_index(database=None):
+    """Returns the shared PantryIndex for a database file (DATABASE_FILE by default)."""
+    database = os.path.abspath(database or DATABASE_FILE)
+    with _pantry_indexes_lock:
+        index = _pantry_indexes.get(database)
+        if index is None:
+            index = _pantry_indexes[database] = pantry_index.PantryIndex()
+        return index
+
+@instrumentation.timed()
+def find_recipes_by_pantry(pantry, max_missing=0, limit=20, conn=None):
+    """
+    Finds recipes that can be made from the ingredient names in `pantry`,
+    allowing up to `max_missing` ingredients that are not in it.
+    The shared PantryIndex picks up recipes added since the last call before matching.
+    Returns a dict with 'matches' (list of dicts with 'id', 'name', 'matched',
+    'total' and 'missing' ingredient names, best coverage first) and
+    'unknown_ingredients' (pantry names not in the database).
+    """
+    try:
+        with _connection(conn) as conn:
+            index = get_pantry_index(_database_path(conn))
+            with _committed_view(conn) as committed:
+                if committed is not None:
+                    index.refresh(committed)
+            pantry_ids, unknown = index.resolve(pantry)
+            found = index.match(pantry_ids, max_missing=max_missing, limit=limit)
+            if not found:
+                return {'matches': [], 'unknown_ingredients': unknown}
+
+            placeholders = ', '.join('?' * len(found))
+            cursor = conn.execute(f"SELECT RecipeID, RecipeName FROM Recipes WHERE RecipeID IN ({placeholders})",
+                                  [recipe_id for recipe_id, _, _, _ in found])
+            names = {row['RecipeID']: row['RecipeName'] for row in cursor.fetchall()}
+            matches = [{
+                'id': recipe_id,
+                'name': names.get(recipe_id),
+                'matched': matched,
+                'total': total,
+                'missing': sorted((index.ingredient_names[i] for i in missing), key=str.lower),
+            } for recipe_id, matched, total, missing in found if recipe_id in names]
+            return {'matches': matches, 'unknown_ingredients': unknown}
+    except sqlite3.Error as e:
+        _report_error('find_recipes_by_pantry', "Error matching pantry ingredients", e)
+        return {'matches': [], 'unknown_ingredients': []}
+
+_name_indexes = {}
+_name_indexes_lock = threading.Lock()
+
+def get_name_index(database=None):
+    """Returns the shared fuzzy NameIndex for a database file (DATABASE_FILE by default)."""
+    database = os.path.abspath(database or DATABASE_FILE)
+    with _name_indexes_lock:
+        index = _name_indexes.get(database)
+        if index is None:
+            index = _name_indexes[database] = fuzzy_index.NameIndex()
+        return index
+
+def _suggest(kind, text, limit, min_similarity, conn):
+    try:
+        with _connection(conn) as conn:
+            index = get_name_index(_database_path(conn))
+            with _committed_view(conn) as committed:
+                if committed is not None:
+                    index.refresh(committed)
+            search = index.search_ingredients if kind == 'ingredient' else index.search_recipes
+            return [{'id': item_id, 'name': name, 'score': score}
+                    for item_id, name, score in search(text, limit=limit, min_similarity=min_similarity)]
+    except sqlite3.Error as e:
+        _report_error(f"suggest_{kind}s", f"Error looking up {kind} names", e)
+        return []
+
+@instrumentation.timed()
+def suggest_ingredients(text, limit=5, min_similarity=0.3, conn=None):
+    """
+    "Did you mean": ingredients whose names are most similar to `text`, typos
+    included. Returns up to `limit` dicts with 'id', 'name' and 'score'
+    (trigram similarity, 0-1), best first.
+    """
+    return _suggest('ingredient', text, limit, min_similarity, conn)
+
+@instrumentation.timed()
+def suggest_recipes(text, limit=5, min_similarity=0.3, conn=None):
+    """Like suggest_ingredients, for recipe names."""
+    return _suggest('recipe', text, limit, min_similarity, conn)
+
+def _duplicate_ingredient_groups(rows, min_similarity):
+    """Groups ingredient rows by canonical name, joining similar canonical names if `min_similarity` is set."""
+    parent = {}
+
+    def root(key):
+        while parent.get(key, key) != key:
+            key = parent[key]
+        return key
+
+    canonical_names = sorted({row['CanonicalName'] for row in rows})
+    if min_similarity is not None:
+        index = fuzzy_index.TrigramIndex()
+        for position, canonical in enumerate(canonical_names):
+            index.add(position, canonical)
+        for position, canonical in enumerate(canonical_names):
+            for other, _, _ in index.search(canonical, limit=10, min_similarity=min_similarity):
+                a, b = root(canonical), root(canonical_names[other])
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(root(row['CanonicalName']), []).append(row)
+    return [group for group in groups.values() if len(group) > 1]
+
+@instrumentation.timed()
+def merge_duplicate_ingredients(min_similarity=None, dry_run=False, conn=None):
+    """
+    Merges ingredients that are near-duplicates of each other: those with the
+    same canonical name ("Egg", "Eggs", "egg, large") and, if `min_similarity`
+    is given, those whose canonical names are at least that similar.
+    In each group the ingredient used by the most recipes is kept; the other
+    rows' recipe links are moved to it (a recipe that listed both keeps its
+    link to the kept one) and the duplicates are deleted, all in one transaction.
+    Returns a list of {'kept': (IngredientID, name), 'merged': [(IngredientID, name), ...]}.
+    With dry_run=True nothing is changed.
+    """
+    try:
+        with _connection(conn) as conn:
+            rows = conn.execute("""
+                SELECT I.IngredientID, I.IngredientName, I.CanonicalName, COUNT(RI.RecipeID) AS Uses
+                FROM Ingredients I
+                LEFT JOIN RecipeIngredients RI ON RI.IngredientID = I.IngredientID
+                GROUP BY I.IngredientID
+            """).fetchall()
+            merges = []
+            for group in _duplicate_ingredient_groups(rows, min_similarity):
+                group.sort(key=lambda row: (-row['Uses'], row['IngredientID']))
+                merges.append({
+                    'kept': (group[0]['IngredientID'], group[0]['IngredientName']),
+                    'merged': [(row['IngredientID'], row['IngredientName']) for row in group[1:]],
+                })
+            if dry_run or not merges:
+                return merges
+
+            affected = set()
+            with _transaction(conn, 'merge_ingredients'):
+                for merge in merges:
+                    kept_id = merge['kept'][0]
+                    for duplicate_id, _ in merge['merged']:
+                        affected.update(row[0] for row in conn.execute(
+                            "SELECT RecipeID FROM RecipeIngredients WHERE IngredientID = ?", (duplicate_id,)).fetchall())
+                        conn.execute("""
+                            DELETE FROM RecipeIngredients
+                            WHERE IngredientID = ?
+                              AND RecipeID IN (SELECT RecipeID FROM RecipeIngredients WHERE IngredientID = ?)
+                        """, (duplicate_id, kept_id))
+                        conn.execute("UPDATE RecipeIngredients SET IngredientID = ? WHERE IngredientID = ?",
+                                     (kept_id, duplicate_id))
+                        conn.execute("DELETE FROM Ingredients WHERE IngredientID = ?", (duplicate_id,))
+                recipe_search.sync_search_index(conn)
+
+            # Links were moved and ingredients deleted, which the incremental indexes can't follow.
+            database = _database_path(conn)
+            get_pantry_index(database).reset()
+            get_name_index(database).reset()
+        _notify_change(sorted(affected))
+        logger.info("Merged %d duplicate ingredients", sum(len(merge['merged']) for merge in merges))
+        return merges
+    except sqlite3.Error as e:
+        _report_error('merge_duplicate_ingredients', "Error merging duplicate ingredients", e)
+        return []
+
+@instrumentation.timed()
+def get_recipes(recipe_ids, conn=None):
+    """
+    Retrieves full details for any number of recipe IDs with three set-based
+    queries (recipes, ingredients, instructions), however many IDs are given.
+    The IDs are passed as a single JSON array parameter, so there is no limit
+    on the number of bound variables. With the read cache on, only the IDs
+    that miss the cache are fetched.
+    Returns a dict mapping RecipeID to a recipe_models.Recipe, in the order the
+    IDs were given; unknown IDs are left out.
+    """
+    ids = list(dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids))
+    if not ids:
+        return {}
+
+    cache = _cache if conn is None else None
+    if cache is None:
+        return _fetch_recipes(ids, conn)
+
+    cached, missing = {}, []
+    for recipe_id in ids:
+        hit, recipe = cache.get(('details', recipe_id))
+        if hit:
+            cached[recipe_id] = recipe
+        else:
+            missing.append(recipe_id)
+    if missing:
+        generation = cache.generation()
+        fetched = _fetch_recipes(missing, conn)
+        for recipe_id, recipe in fetched.items():
+            cache.put(('details', recipe_id), recipe, tags=[('recipe', recipe_id)], generation=generation)
+        cached.update(fetched)
+    return {recipe_id: cached[recipe_id] for recipe_id in ids if recipe_id in cached}
+
+@instrumentation.timed()
+def get_recipe_details_many(recipe_ids, conn=None):
+    """
+    Like get_recipes(), but returns a dict mapping RecipeID to the same
+    dictionary get_recipe_details returns.
+    """
+    return {recipe_id: recipe.as_dict() for recipe_id, recipe in get_recipes(recipe_ids, conn=conn).items()}
+
+_DETAILS_RECIPES_SQL = """
+    SELECT RecipeID, RecipeName, Description
+    FROM Recipes
+    WHERE RecipeID IN (SELECT value FROM json_each(?))
+"""
+_DETAILS_INGREDIENTS_SQL = """
+    SELECT RI.RecipeID, I.IngredientName, RI.Quantity
+    FROM RecipeIngredients RI
+    JOIN Ingredients I ON RI.IngredientID = I.IngredientID
+    WHERE RI.RecipeID IN (SELECT value FROM json_each(?))
+    ORDER BY RI.RecipeID, I.IngredientName COLLATE NOCASE
+"""
+_DETAILS_INSTRUCTIONS_SQL = """
+    SELECT RecipeID, StepNumber, StepDescription
+    FROM Instructions
+    WHERE RecipeID IN (SELECT value FROM json_each(?))
+    ORDER BY RecipeID, StepNumber
+"""
+
+def _fetch_recipes(ids, conn=None):
+    """Loads the (de-duplicated, int) `ids` from the database for get_recipes."""
+    ids_json = json.dumps(ids)
+    try:
+        # One snapshot for all three queries, so a concurrent write can't leave lines without their recipe.
+        with _read_connection(conn) as conn, _read_transaction(conn):
+            found = {recipe.id: recipe for recipe in _rows(conn, _DETAILS_RECIPES_SQL, (ids_json,), recipe_models.recipe_row)}
+            if not found:
+                return {}
+            for recipe_id, line in _rows(conn, _DETAILS_INGREDIENTS_SQL, (ids_json,), recipe_models.ingredient_line_rows()):
+                found[recipe_id].ingredients.append(line)
+            for recipe_id, step in _rows(conn, _DETAILS_INSTRUCTIONS_SQL, (ids_json,), recipe_models.step_row):
+                found[recipe_id].instructions.append(step)
+            return {recipe_id: found[recipe_id] for recipe_id in ids if recipe_id in found}
+
+    except sqlite3.Error as e:
+        _report_error('get_recipes', "Error retrieving recipe details", e)
+        return {}
+
+# The same three queries for get_recipe_columns, but ordered by each ID's position in the
+# JSON array (json_each's key) so the columns can be filled in a single pass.
+_COLUMNS_RECIPES_SQL = """
+    SELECT J.key, R.RecipeID, R.RecipeName, R.Description
+    FROM json_each(?) J
+    JOIN Recipes R ON R.RecipeID = J.value
+    ORDER BY J.key
+"""
+_COLUMNS_INGREDIENTS_SQL = """
+    SELECT J.key, I.IngredientName, RI.Quantity
+    FROM json_each(?) J
+    JOIN RecipeIngredients RI ON RI.RecipeID = J.value
+    JOIN Ingredients I ON RI.IngredientID = I.IngredientID
+    ORDER BY J.key, I.IngredientName COLLATE NOCASE
+"""
+_COLUMNS_INSTRUCTIONS_SQL = """
+    SELECT J.key, S.StepNumber, S.StepDescription
+    FROM json_each(?) J
+    JOIN Instructions S ON S.RecipeID = J.value
+    ORDER BY J.key, S.StepNumber
+"""
+
+@instrumentation.timed()
+def get_recipe_columns(recipe_ids, conn=None):
+    """
+    Retrieves full details for any number of recipe IDs as one
+    recipe_models.RecipeColumns batch, in the order the IDs were given (unknown
+    IDs are left out). Holds far less memory than get_recipes for large
+    batches; meant for bulk reads such as exports. Bypasses the read cache.
+    Returns an empty batch on error.
+    """
+    ids_json = json.dumps(list(dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids)))
+    try:
+        with _read_connection(conn) as conn, _read_transaction(conn):
+            cursors = []
+            for sql in (_COLUMNS_RECIPES_SQL, _COLUMNS_INGREDIENTS_SQL, _COLUMNS_INSTRUCTIONS_SQL):
+                cursor = conn.cursor()
+                cursor.row_factory = None  # Plain tuples, consumed as they are read.
+                cursors.append(cursor.execute(sql, (ids_json,)))
+            return recipe_models.RecipeColumns.from_rows(*cursors)
+    except sqlite3.Error as e:
+        _report_error('get_recipe_columns', "Error retrieving recipe details", e)
+        return recipe_models.RecipeColumns()
+
+@instrumentation.timed()
+def get_recipe(recipe_id, conn=None):
+    """Retrieves a specific recipe as a recipe_models.Recipe, or None if not found."""
+    recipe = get_recipes([recipe_id], conn=conn).get(int(recipe_id))
+    if recipe is not None:
+        _recipe_views.record(recipe.id, recipe.name)
+    return recipe
+
+@instrumentation.timed()
+def get_recipe_details(recipe_id, conn=None):
     """
     Retrieves full details for a specific recipe ID.
     Returns a dictionary containing recipe info, ingredients, and instructions, or None if not found.
     """
-    conn = get_db_connection()
-    if not conn:
-        return None
+    recipe = get_recipe(recipe_id, conn=conn)
+    return recipe.as_dict() if recipe is not None else None
 
-    cursor = conn.cursor()
-    recipe_details = {}
+# How often each recipe was opened in this process; the popularity used to rank recipe autocomplete.
+_recipe_views = autocomplete.RecipeViews()
 
+@instrumentation.timed()
+def autocomplete_recipes(prefix, limit=10, conn=None):
+    """
+    Type-ahead for recipe names: returns up to `limit` recipes whose name
+    starts with `prefix` (case-insensitive), the ones opened most often with
+    get_recipe_details in this process first (the counts are per process and
+    start from zero on restart), then in name order. Answered
+    with a range scan of the RecipeName index that reads about `limit` rows.
+    Returns a list of dicts with 'id', 'name' and 'popularity'.
+    """
     try:
-        cursor.execute("SELECT RecipeID, RecipeName, Description FROM Recipes WHERE RecipeID = ?", (recipe_id,))
-        recipe_info = cursor.fetchone()
+        with _read_connection(conn) as conn:
+            return autocomplete.complete_recipes(conn, prefix, limit, _recipe_views)
+    except sqlite3.Error as e:
+        _report_error('autocomplete_recipes', "Error completing recipe names", e)
+        return []
 
-        if not recipe_info:
-            return None
+@instrumentation.timed()
+def autocomplete_ingredients(prefix, limit=10, conn=None):
+    """
+    Type-ahead for ingredient names: returns up to `limit` ingredients whose
+    name starts with `prefix` (case-insensitive), the ones used by the most
+    recipes first. Answered with bounded range scans of the name and usage
+    indexes (see autocomplete.py).
+    Returns a list of dicts with 'id', 'name' and 'popularity' (recipes using it).
+    """
+    try:
+        with _read_connection(conn) as conn:
+            return autocomplete.complete_ingredients(conn, prefix, limit)
+    except sqlite3.Error as e:
+        _report_error('autocomplete_ingredients', "Error completing ingredient names", e)
+        return []
 
-        recipe_details['id'] = recipe_info['RecipeID']
-        recipe_details['name'] = recipe_info['RecipeName']
-        recipe_details['description'] = recipe_info['Description']
+@instrumentation.timed()
+def get_catalog_stats(top=10, conn=None):
+    """
+    Returns catalog-wide statistics read from the trigger-maintained summary
+    tables (see recipe_stats.py), so the cost doesn't grow with the catalog:
+    totals, average ingredients and steps per recipe, and the `top` most-used
+    ingredients. Returns None on error.
+    """
+    try:
+        with _read_connection(conn) as conn:
+            return recipe_stats.catalog_stats(conn, top=top)
+    except sqlite3.Error as e:
+        _report_error('get_catalog_stats', "Error reading catalog statistics", e)
+        return None
 
-        cursor.execute("""
-            SELECT I.IngredientName, RI.Quantity
-            FROM RecipeIngredients RI
-            JOIN Ingredients I ON RI.IngredientID = I.IngredientID
-            WHERE RI.RecipeID = ?
-            ORDER BY I.IngredientName COLLATE NOCASE
-        """, (recipe_id,))
-        ingredients = cursor.fetchall()
-        recipe_details['ingredients'] = [{'name': row['IngredientName'], 'quantity': row['Quantity']} for row in ingredients]
+def changes_since(seq, batch_size=1000, conn=None):
+    """
+    Yields the change log entries after sequence number `seq` (see change_log.py),
+    oldest first, as dicts with 'seq', 'table', 'key', 'recipe_id', 'operation'
+    and 'changed_at'. Entries are read `batch_size` at a time and, as in
+    iter_recipes, a pooled connection is only held while a batch is read.
+    Entries written while iterating are included. Raises
+    change_log.ChangeLogTruncated if compaction dropped entries after `seq`;
+    stops early on a database error.
+    """
+    while True:
+        try:
+            with _connection(conn) as c:  # Not the replica: a consumer must never see a lagging log.
+                batch = change_log.read_changes(c, seq, limit=batch_size)
+        except sqlite3.Error as e:
+            _report_error('changes_since', "Error reading the change log", e)
+            return
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        seq = batch[-1]['seq']
 
-        cursor.execute("""
-            SELECT StepNumber, StepDescription
-            FROM Instructions
-            WHERE RecipeID = ?
-            ORDER BY StepNumber
-        """, (recipe_id,))
-        instructions = cursor.fetchall()
-        recipe_details['instructions'] = [{'step': row['StepNumber'], 'description': row['StepDescription']} for row in instructions]
+@instrumentation.timed()
+def compact_change_log(retain_seconds=None, conn=None):
+    """
+    Drops change log entries superseded by a later change to the same row and,
+    with `retain_seconds`, entries older than that (consumers further behind
+    then need a full export). Returns the number of entries removed (0 on error).
+    """
+    try:
+        with _connection(conn) as conn:
+            with _transaction(conn, 'compact_change_log'):
+                removed = change_log.compact_change_log(conn, retain_seconds)
+        logger.info("Removed %d change log entries", removed)
+        return removed
+    except sqlite3.Error as e:
+        _report_error('compact_change_log', "Error compacting the change log", e)
+        return 0
 
-        return recipe_details
+_SIMILAR_RECIPES_SQL = """
+    SELECT S.SimilarRecipeID, R.RecipeName, S.Score
+    FROM SimilarRecipes S
+    JOIN Recipes R ON R.RecipeID = S.SimilarRecipeID
+    WHERE S.RecipeID = ?
+    ORDER BY S.Score DESC, S.SimilarRecipeID
+    LIMIT ?
+"""
 
+@instrumentation.timed()
+def get_similar_recipes(recipe_id, limit=5, conn=None):
+    """
+    Returns up to `limit` recipes with the most ingredients in common with
+    `recipe_id` (precomputed by similar_recipes.py), as a list of dicts with
+    'id', 'name' and 'score' (0 to 1, higher is more similar), best first.
+    """
+    try:
+        with _read_connection(conn) as conn:
+            cursor = conn.execute(_SIMILAR_RECIPES_SQL, (int(recipe_id), limit))
+            return [{'id': row[0], 'name': row[1], 'score': row[2]} for row in cursor.fetchall()]
     except sqlite3.Error as e:
-        print(f"Error retrieving details for recipe ID {recipe_id}: {e}")
-        return None
-    finally:
-        if conn:
-            conn.close()
+        _report_error('get_similar_recipes', "Error finding similar recipes", e)
+        return []
+
+# The meal plan is bound as one JSON object {"<RecipeID>": scale, ...}, so the
+# scaling and summing happen in a single set-based query however many recipes it has.
+_SHOPPING_PLAN_CTE = """
+    WITH Plan (RecipeID, Scale) AS (
+        SELECT CAST(key AS INTEGER), value FROM json_each(?)
+    )
+"""
+_SHOPPING_LIST_SQL = _SHOPPING_PLAN_CTE + """
+    SELECT I.IngredientName, RI.Unit, SUM(RI.Amount * P.Scale) AS Amount, COUNT(*) AS Recipes
+    FROM Plan P
+    JOIN RecipeIngredients RI ON RI.RecipeID = P.RecipeID
+    JOIN Ingredients I ON RI.IngredientID = I.IngredientID
+    WHERE RI.Amount IS NOT NULL
+    GROUP BY RI.IngredientID, RI.Unit
+    ORDER BY I.IngredientName COLLATE NOCASE, RI.Unit
+"""
+_SHOPPING_UNPARSED_SQL = _SHOPPING_PLAN_CTE + """
+    SELECT I.IngredientName, RI.Quantity, RI.RecipeID, P.Scale
+    FROM Plan P
+    JOIN RecipeIngredients RI ON RI.RecipeID = P.RecipeID
+    JOIN Ingredients I ON RI.IngredientID = I.IngredientID
+    WHERE RI.Amount IS NULL
+    ORDER BY I.IngredientName COLLATE NOCASE, RI.RecipeID
+"""
+
+@instrumentation.timed()
+def build_shopping_list(plan, conn=None):
+    """
+    Scales a set of recipes and merges their ingredients into one shopping list.
+    `plan` maps RecipeID to a scale factor (servings wanted / servings the recipe
+    makes, e.g. 2 to double it), or is an iterable of (RecipeID, scale) pairs;
+    a recipe listed twice has its factors added.
+    Amounts are summed per ingredient and canonical unit (ml, g, each, clove, ...;
+    see quantities.py), so the same ingredient may appear once per kind of unit.
+    Returns a dict with 'items' (dicts with 'ingredient', 'amount', 'unit' and
+    'recipes', the number of recipes using it) and 'unparsed' (lines whose
+    quantity has no amount, such as "to taste": 'ingredient', 'quantity',
+    'recipe_id' and 'scale').
+    """
+    scales = {}
+    for recipe_id, scale in (plan.items() if isinstance(plan, dict) else plan):
+        scales[int(recipe_id)] = scales.get(int(recipe_id), 0) + float(scale)
+    if not scales:
+        return {'items': [], 'unparsed': []}
+
+    plan_json = json.dumps({str(recipe_id): scale for recipe_id, scale in scales.items()})
+    try:
+        with _read_connection(conn) as conn:
+            items = [{
+                'ingredient': row['IngredientName'],
+                'amount': row['Amount'],
+                'unit': row['Unit'],
+                'recipes': row['Recipes'],
+            } for row in conn.execute(_SHOPPING_LIST_SQL, (plan_json,)).fetchall()]
+            unparsed = [{
+                'ingredient': row['IngredientName'],
+                'quantity': row['Quantity'],
+                'recipe_id': row['RecipeID'],
+                'scale': row['Scale'],
+            } for row in conn.execute(_SHOPPING_UNPARSED_SQL, (plan_json,)).fetchall()]
+            return {'items': items, 'unparsed': unparsed}
+    except sqlite3.Error as e:
+        _report_error('build_shopping_list', "Error building shopping list", e)
+        return {'items': [], 'unparsed': []}
+
+# The queries on the read and write hot paths, with representative parameters.
+# database_setup.explain_hot_queries() prints their EXPLAIN QUERY PLAN.
+HOT_QUERIES = [
+    ('add_recipe: ingredient lookup', _INGREDIENT_LOOKUP_SQL, ('Salt',)),
+    ('add_recipe: canonical ingredient lookup', _CANONICAL_LOOKUP_SQL, ('egg',)),
+    ('list_all_recipes', _LIST_ALL_SQL, ()),
+    ('list_recipes_page (first page)', _FIRST_PAGE_SQL, (20,)),
+    ('list_recipes_page (next page)', _NEXT_PAGE_SQL, ('M', 1, 20)),
+    ('search_recipe_by_name', _SEARCH_NAME_SQL, ('%cake%',)),
+    ('get_recipe_details: recipes', _DETAILS_RECIPES_SQL, ('[1, 2, 3]',)),
+    ('get_recipe_details: ingredients', _DETAILS_INGREDIENTS_SQL, ('[1, 2, 3]',)),
+    ('get_recipe_details: instructions', _DETAILS_INSTRUCTIONS_SQL, ('[1, 2, 3]',)),
+    ('get_recipe_columns: ingredients', _COLUMNS_INGREDIENTS_SQL, ('[3, 1, 2]',)),
+    ('build_shopping_list', _SHOPPING_LIST_SQL, ('{"1": 2.0, "2": 0.5}',)),
+    ('get_similar_recipes', _SIMILAR_RECIPES_SQL, (1, 5)),
+    ('delete_orphan_ingredients', _ORPHAN_INGREDIENTS_SQL, ()),
+    ('autocomplete_recipes', "SELECT RecipeID, RecipeName FROM Recipes WHERE RecipeName >= ? AND RecipeName < ? ORDER BY RecipeName LIMIT ?",
+     ('choc', 'chod', 10)),
+    ('autocomplete_ingredients (broad prefix)', """
+        SELECT I.IngredientID, I.IngredientName, U.RecipeCount
+        FROM IngredientUsage U CROSS JOIN Ingredients I ON I.IngredientID = U.IngredientID
+        WHERE I.IngredientName >= ? AND I.IngredientName < ?
+        ORDER BY U.RecipeCount DESC, U.IngredientID LIMIT ?
+     """, ('s', 't', 10)),
+    ('changes_since', "SELECT Seq, TableName, RowKey FROM ChangeLog WHERE Seq > ? AND Seq <= ? ORDER BY Seq LIMIT ?",
+     (0, 100, 1000)),
+    ('get_catalog_stats: top ingredients',
+     "SELECT IngredientID, RecipeCount FROM IngredientUsage ORDER BY RecipeCount DESC, IngredientID LIMIT ?", (10,)),
+    ('recipes using an ingredient (search index trigger)',
+     "SELECT RecipeID FROM RecipeIngredients WHERE IngredientID = ?", (1,)),
+]
 
 if __name__ == '__main__':
 
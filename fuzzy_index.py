@@ -0,0 +1,200 @@
+"""
+Typo-tolerant "did you mean" lookup over ingredient and recipe names.
+
+TrigramIndex maps every three-character slice of each (lower-cased, space-padded)
+name to the IDs containing it. A name scores by the share of the query's trigrams
+it contains, so "tomatoe", "choclate cake" or "Eggs" still find "tomato",
+"Chocolate Cake" and "egg". Candidates are gathered only from the query's rarest
+trigrams (any name reaching the score threshold must contain at least one of
+them), which keeps typical lookups around a millisecond or less.
+
+NameIndex holds one TrigramIndex for Ingredients and one for Recipes and, like
+PantryIndex, refreshes incrementally from the highest IDs it has already loaded.
+
+canonical_name() is the normalized form stored in Ingredients.CanonicalName and
+used to resolve near-duplicates such as "Eggs" and "egg, large" to one ingredient.
+
+Usage:
+    python fuzzy_index.py --merge-duplicates [--dry-run] [--min-similarity 0.9]
+"""
+import heapq
+import re
+import sys
+import threading
+from array import array
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+
+def canonical_name(name):
+    """
+    Normalizes an ingredient name for duplicate detection: lower-cased, without
+    trailing notes after a comma or parenthesis, punctuation or extra spaces,
+    and with the last word made singular ("Eggs" and "egg, large" -> "egg").
+    """
+    text = re.split(r"[,(]", name.lower(), maxsplit=1)[0]
+    words = _PUNCTUATION_RE.sub(' ', text).split()
+    if not words:
+        return name.strip().lower()
+    words[-1] = _singular(words[-1])
+    return ' '.join(words)
+
+def _singular(word):
+    if len(word) <= 3:
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith('oes') or word.endswith(('ches', 'shes', 'xes', 'zes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+def trigrams(text):
+    """The set of trigrams of each word of `text`, padded like pg_trgm ('  eg', ' egg', 'egg ')."""
+    grams = set()
+    for word in _PUNCTUATION_RE.sub(' ', text.lower()).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def similarity(a, b):
+    """Trigram Jaccard similarity of two strings, from 0.0 to 1.0."""
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    shared = len(ta & tb)
+    return shared / (len(ta) + len(tb) - shared)
+
+class TrigramIndex:
+    """In-memory trigram -> IDs index over a set of names."""
+
+    # Thresholds tried before the caller's min_similarity: a high one needs only the
+    # query's rarest trigrams to find its candidates, so most lookups stop early.
+    SEARCH_THRESHOLDS = (0.8, 0.6, 0.45)
+
+    def __init__(self):
+        self.names = {}     # ID -> name
+        self.grams = {}     # ID -> tuple of the name's trigrams
+        self.postings = {}  # trigram -> array of IDs (may contain stale IDs; results are re-checked)
+
+    def add(self, item_id, name):
+        grams = []
+        for gram in map(sys.intern, trigrams(name)):  # One shared string per distinct trigram.
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('q')
+            posting.append(item_id)
+            grams.append(gram)
+        self.names[item_id] = name
+        self.grams[item_id] = tuple(grams)
+
+    def remove(self, item_id):
+        self.names.pop(item_id, None)  # Its postings are skipped from now on.
+        self.grams.pop(item_id, None)
+
+    def search(self, text, limit=5, min_similarity=0.3):
+        """
+        Returns up to `limit` (ID, name, score) tuples, best first. The score is the
+        share of the query's trigrams found in the name (so a short query still matches
+        a long name well); ties go to the name closest in length to the query.
+        """
+        query = trigrams(text)
+        if not query:
+            return []
+        by_rarity = sorted(query, key=lambda gram: len(self.postings.get(gram, ())))
+        thresholds = [t for t in self.SEARCH_THRESHOLDS if t > min_similarity] + [min_similarity]
+        for threshold in thresholds:
+            # A name scoring >= threshold shares at least threshold * len(query) trigrams
+            # with the query, so it contains one of the len(query) - that + 1 rarest ones.
+            needed = max(1, int(threshold * len(query) + 0.999999))
+            candidates = set()
+            for gram in by_rarity[:len(query) - needed + 1]:
+                candidates.update(self.postings.get(gram, ()))
+
+            scored = []
+            for item_id in candidates:
+                grams = self.grams.get(item_id)
+                if grams is None:
+                    continue
+                shared = len(query.intersection(grams))
+                if shared >= needed:
+                    jaccard = shared / (len(query) + len(grams) - shared)
+                    scored.append((shared / len(query), jaccard, item_id))
+            if len(scored) >= limit or threshold == thresholds[-1]:
+                best = heapq.nlargest(limit, scored)
+                return [(item_id, self.names[item_id], score) for score, _, item_id in best]
+
+class NameIndex:
+    """Fuzzy indexes over Ingredients.IngredientName and Recipes.RecipeName for one database."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forgets everything; the next refresh() reloads both indexes."""
+        with self._lock:
+            self.ingredients = TrigramIndex()
+            self.recipes = TrigramIndex()
+            self.last_ingredient_id = 0
+            self.last_recipe_id = 0
+
+    def refresh(self, conn):
+        """Loads ingredients and recipes added since the last refresh."""
+        with self._lock:
+            cursor = conn.execute(
+                "SELECT IngredientID, IngredientName FROM Ingredients WHERE IngredientID > ? ORDER BY IngredientID",
+                (self.last_ingredient_id,))
+            for ingredient_id, name in cursor:
+                self.ingredients.add(ingredient_id, name)
+                self.last_ingredient_id = ingredient_id
+
+            cursor = conn.execute(
+                "SELECT RecipeID, RecipeName FROM Recipes WHERE RecipeID > ? ORDER BY RecipeID",
+                (self.last_recipe_id,))
+            for recipe_id, name in cursor:
+                self.recipes.add(recipe_id, name)
+                self.last_recipe_id = recipe_id
+
+    def reload_recipe(self, conn, recipe_id):
+        """Re-reads one recipe's name after it was renamed or deleted (recipes not loaded yet are left to refresh())."""
+        with self._lock:
+            if recipe_id > self.last_recipe_id:
+                return
+            self.recipes.remove(recipe_id)
+            row = conn.execute("SELECT RecipeName FROM Recipes WHERE RecipeID = ?", (recipe_id,)).fetchone()
+            if row is not None:
+                self.recipes.add(recipe_id, row[0])
+
+    def search_ingredients(self, text, limit=5, min_similarity=0.3):
+        with self._lock:
+            return self.ingredients.search(text, limit, min_similarity)
+
+    def search_recipes(self, text, limit=5, min_similarity=0.3):
+        with self._lock:
+            return self.recipes.search(text, limit, min_similarity)
+
+def main(argv=None):
+    import argparse
+    import db_operations
+
+    parser = argparse.ArgumentParser(description="Merge duplicate ingredients such as 'Egg', 'Eggs' and 'egg, large'.")
+    parser.add_argument('--merge-duplicates', action='store_true', help="find and merge duplicate ingredients")
+    parser.add_argument('--dry-run', action='store_true', help="only list what would be merged")
+    parser.add_argument('--min-similarity', type=float,
+                        help="also merge ingredients whose canonical names are at least this similar (e.g. 0.9)")
+    args = parser.parse_args(argv)
+    if not args.merge_duplicates:
+        parser.print_help()
+        return 1
+
+    merges = db_operations.merge_duplicate_ingredients(min_similarity=args.min_similarity, dry_run=args.dry_run)
+    for merge in merges:
+        merged = ', '.join(f"'{name}' ({ingredient_id})" for ingredient_id, name in merge['merged'])
+        print(f"'{merge['kept'][1]}' ({merge['kept'][0]}) <- {merged}")
+    verb = "Would merge" if args.dry_run else "Merged"
+    print(f"{verb} {sum(len(m['merged']) for m in merges)} duplicate ingredients into {len(merges)}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+Instrumentation for the database layer: operation timers and counters, a slow-query
+log, optional sqlite3 trace/progress hooks and structured logging.
+
+* Public db_operations functions are wrapped with @timed, which records call counts,
+  errors and latencies in `metrics`.
+* Connections opened by db_operations use InstrumentedConnection, whose cursors time
+  every statement from execute()/executemany() until its rows are fetched. Statements slower than the configured threshold go
+  to the slow-query log with their SQL text and the *shape* of their bind parameters
+  (types and sizes, never the values). executemany() calls and statements run inside
+  bulk_work() are timed and counted but never reported as slow: a batch of thousands of
+  rows is expected to take long. The log goes through `logging` only once an application
+  configures it (configure_logging() does); a library caller sees nothing on stderr.
+* configure(trace=..., progress=...) installs sqlite3 trace and progress callbacks on
+  every pooled connection.
+* begin_request()/request_totals() count the statements run and their time on the
+  current thread, e.g. for the per-request timing headers of recipe_server.py.
+
+    instrumentation.configure_logging('INFO')
+    instrumentation.configure(slow_query_ms=50)
+    ...
+    print(instrumentation.format_metrics())
+"""
+import collections
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())  # Not logging's last-resort stderr handler when nothing is configured.
+
+SAMPLES_PER_TIMER = 1024   # Recent latencies kept per operation for percentiles
+SLOW_QUERY_LOG_SIZE = 100  # Most recent slow statements kept in memory
+
+class Metrics:
+    """Thread-safe per-operation timers and named counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = collections.Counter()
+            self.slow_queries = collections.deque(maxlen=SLOW_QUERY_LOG_SIZE)
+
+    def _timer(self, name):
+        timer = self._timers.get(name)
+        if timer is None:
+            timer = self._timers[name] = {'calls': 0, 'errors': 0, 'total': 0.0, 'max': 0.0,
+                                          'samples': collections.deque(maxlen=SAMPLES_PER_TIMER)}
+        return timer
+
+    def observe(self, name, seconds):
+        """Records one call of operation `name` that took `seconds`."""
+        with self._lock:
+            timer = self._timer(name)
+            timer['calls'] += 1
+            timer['total'] += seconds
+            timer['max'] = max(timer['max'], seconds)
+            timer['samples'].append(seconds)
+
+    def record_error(self, name):
+        """Counts a failed call of operation `name` (the call itself is still observed by @timed)."""
+        with self._lock:
+            self._timer(name)['errors'] += 1
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def add_slow_query(self, entry):
+        with self._lock:
+            self.slow_queries.append(entry)
+
+    def snapshot(self):
+        """
+        Returns {'timers': {name: {'calls', 'errors', 'total_ms', 'mean_ms', 'p50_ms',
+        'p99_ms', 'max_ms'}}, 'counters': {name: value}, 'slow_queries': [...]}.
+        Percentiles are over the most recent SAMPLES_PER_TIMER calls.
+        """
+        with self._lock:
+            timers = {}
+            for name, timer in sorted(self._timers.items()):
+                samples = sorted(timer['samples'])
+                timers[name] = {
+                    'calls': timer['calls'],
+                    'errors': timer['errors'],
+                    'total_ms': timer['total'] * 1000,
+                    'mean_ms': timer['total'] * 1000 / timer['calls'] if timer['calls'] else 0.0,
+                    'p50_ms': _percentile(samples, 0.50) * 1000,
+                    'p99_ms': _percentile(samples, 0.99) * 1000,
+                    'max_ms': timer['max'] * 1000,
+                }
+            return {'timers': timers, 'counters': dict(sorted(self._counters.items())),
+                    'slow_queries': list(self.slow_queries)}
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+metrics = Metrics()
+
+def timed(name=None):
+    """Decorator recording each call's duration under `name` (the function name by default)."""
+    def decorator(fn):
+        operation = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                metrics.record_error(operation)
+                raise
+            finally:
+                metrics.observe(operation, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+# Statement timing and hooks
+
+_settings = {
+    'slow_query_seconds': 0.1,
+    'trace': None,
+    'progress': None,
+    'progress_interval': 1000,
+    'version': 0,  # Bumped by configure() so connections re-apply their hooks.
+}
+
+def configure(slow_query_ms=None, trace=None, progress=None, progress_interval=None):
+    """
+    Changes the instrumentation settings.
+    slow_query_ms: statements taking at least this long are logged (None leaves it as is;
+        executemany() and bulk_work() statements never are).
+    trace: callable receiving each SQL statement as it runs (sqlite3 set_trace_callback),
+        True to log every statement at DEBUG level, or False to turn tracing off.
+    progress: callable run every `progress_interval` SQLite VM instructions during long
+        statements (sqlite3 set_progress_handler); returning a true value aborts the
+        statement. False turns it off.
+    Hooks are applied to pooled connections the next time they are handed out.
+    """
+    if slow_query_ms is not None:
+        _settings['slow_query_seconds'] = slow_query_ms / 1000
+    if trace is not None:
+        _settings['trace'] = _log_statement if trace is True else (trace or None)
+    if progress is not None:
+        _settings['progress'] = progress or None
+    if progress_interval is not None:
+        _settings['progress_interval'] = progress_interval
+    _settings['version'] += 1
+
+def _log_statement(sql):
+    logger.debug("sql: %s", sql, extra={'sql': sql})
+
+def apply_hooks(conn):
+    """Installs the configured trace and progress callbacks on `conn` if they changed since last time."""
+    version = _settings['version']
+    if getattr(conn, 'hooks_version', 0) == version:
+        return
+    conn.set_trace_callback(_settings['trace'])
+    conn.set_progress_handler(_settings['progress'], _settings['progress_interval'])
+    if isinstance(conn, InstrumentedConnection):
+        conn.hooks_version = version
+
+def parameter_shape(parameters, many=False):
+    """Describes bind parameters by type and size, e.g. '(str[12], int)' or '1000 x (int, int, str[5])'."""
+    if many:
+        if isinstance(parameters, (list, tuple)):
+            first = parameter_shape(parameters[0]) if parameters else '()'
+            return f"{len(parameters)} x {first}"
+        return f"iterator of {type(parameters).__name__}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{key}: {_value_shape(value)}" for key, value in parameters.items()) + '}'
+    return '(' + ', '.join(_value_shape(value) for value in parameters) + ')'
+
+def _value_shape(value):
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+_request_totals = threading.local()
+_bulk_work = threading.local()
+
+def begin_request():
+    """Starts counting the SQL statements run on this thread and their time (see request_totals)."""
+    _request_totals.value = {'statements': 0, 'sql_seconds': 0.0}
+
+def request_totals():
+    """Returns {'statements', 'sql_seconds'} for this thread since begin_request(), or None."""
+    return getattr(_request_totals, 'value', None)
+
+@contextmanager
+def bulk_work():
+    """
+    Marks the statements this thread runs in the block as bulk work (a bulk
+    import batch, say): they are timed and counted as usual but not reported
+    as slow queries.
+    """
+    previous = getattr(_bulk_work, 'active', False)
+    _bulk_work.active = True
+    try:
+        yield
+    finally:
+        _bulk_work.active = previous
+
+def _observe_statement(sql, parameters, seconds, many):
+    metrics.increment('sql.statements')
+    totals = getattr(_request_totals, 'value', None)
+    if totals is not None:
+        totals['statements'] += 1
+        totals['sql_seconds'] += seconds
+    if seconds < _settings['slow_query_seconds'] or many or getattr(_bulk_work, 'active', False):
+        return
+    entry = {
+        'sql': ' '.join(sql.split()),
+        'params': parameter_shape(parameters, many),
+        'ms': round(seconds * 1000, 3),
+        'at': time.time(),
+    }
+    metrics.increment('sql.slow_statements')
+    metrics.add_slow_query(entry)
+    logger.warning("slow query (%.1f ms)", entry['ms'], extra=entry)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor that times each statement from execute()/executemany() through the
+    fetchone/fetchmany/fetchall calls that read its rows. A statement is
+    reported once its rows are exhausted, or when the cursor runs the next
+    statement or is closed. Rows read by iterating over the cursor are not
+    timed, to keep per-row overhead off streaming reads.
+    """
+
+    _statement = None  # [sql, parameters, many, seconds so far]
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            sql, parameters, many, seconds = statement
+            _observe_statement(sql, parameters, seconds, many)
+
+    def _run(self, run, sql, parameters, many):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            run(sql, parameters)
+        finally:
+            self._statement = [sql, parameters, many, time.perf_counter() - started]
+            if self.description is None:  # No result rows to wait for.
+                self._finish()
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, False)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, True)
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        rows = fetch(*args)
+        if self._statement is not None:
+            self._statement[3] += time.perf_counter() - started
+            if not rows or isinstance(rows, list):
+                self._finish()
+        return rows
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including those behind conn.execute) are InstrumentedCursors."""
+
+    hooks_version = 0
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# Logging
+
+_STANDARD_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats records as 'time level logger: message key=value ...' or, with
+    json_lines=True, as one JSON object per line. Fields passed with extra={...}
+    are included either way.
+    """
+
+    def __init__(self, json_lines=False):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = {key: value for key, value in vars(record).items() if key not in _STANDARD_RECORD_FIELDS}
+        if self.json_lines:
+            entry = {'time': record.created, 'level': record.levelname, 'logger': record.name,
+                     'message': record.getMessage(), **fields}
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        text = super().format(record)
+        if fields:
+            text += ' ' + ' '.join(f"{key}={value!r}" for key, value in fields.items())
+        return text
+
+def configure_logging(level='WARNING', json_lines=False, stream=None):
+    """Sends log records at `level` and above to stderr (or `stream`) through a StructuredFormatter."""
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(StructuredFormatter(json_lines=json_lines))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if getattr(existing, 'structured', False):
+            root.removeHandler(existing)
+    handler.structured = True
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    return handler
+
+def format_metrics(snapshot=None):
+    """Renders a metrics snapshot (the current one by default) as a text table."""
+    snapshot = snapshot or metrics.snapshot()
+    lines = [f"{'operation':<28} {'calls':>7} {'errors':>6} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+    for name, timer in snapshot['timers'].items():
+        lines.append(f"{name:<28} {timer['calls']:>7} {timer['errors']:>6} {timer['mean_ms']:>9.3f} "
+                     f"{timer['p50_ms']:>9.3f} {timer['p99_ms']:>9.3f} {timer['max_ms']:>9.3f}")
+    if len(lines) == 1:
+        lines.append("(no operations recorded yet)")
+    if snapshot['counters']:
+        lines.append("")
+        lines.extend(f"{name}: {value}" for name, value in snapshot['counters'].items())
+    if snapshot['slow_queries']:
+        lines.append("")
+        lines.append(f"Slowest recent statements (threshold {_settings['slow_query_seconds'] * 1000:g} ms):")
+        for entry in sorted(snapshot['slow_queries'], key=lambda e: e['ms'], reverse=True)[:10]:
+            lines.append(f"  {entry['ms']:>9.1f} ms  {entry['sql'][:100]}  {entry['params']}")
+    return '\n'.join(lines)
@@ -0,0 +1,40 @@
+"""
+Maintenance jobs for the recipe database.
+
+Usage:
+    python maintenance.py --delete-orphan-ingredients [--dry-run]
+    python maintenance.py --compact-change-log [--retain-days 30]
+"""
+import argparse
+import sys
+
+import db_operations
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recipe database maintenance.")
+    parser.add_argument('--delete-orphan-ingredients', action='store_true',
+                        help="delete ingredients that no recipe uses any more")
+    parser.add_argument('--dry-run', action='store_true', help="only list what would be deleted")
+    parser.add_argument('--compact-change-log', action='store_true',
+                        help="drop change log entries superseded by later changes to the same rows")
+    parser.add_argument('--retain-days', type=float,
+                        help="with --compact-change-log, also drop entries older than this many days")
+    args = parser.parse_args(argv)
+    if not args.delete_orphan_ingredients and not args.compact_change_log:
+        parser.print_help()
+        return 1
+
+    if args.delete_orphan_ingredients:
+        orphans = db_operations.delete_orphan_ingredients(dry_run=args.dry_run)
+        for ingredient_id, name in orphans:
+            print(f"'{name}' ({ingredient_id})")
+        verb = "Would delete" if args.dry_run else "Deleted"
+        print(f"{verb} {len(orphans)} orphaned ingredients.")
+    # After the orphan cleanup, whose deletes are logged too.
+    if args.compact_change_log:
+        retain = args.retain_days * 86400 if args.retain_days is not None else None
+        print(f"Removed {db_operations.compact_change_log(retain)} change log entries.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+"What can I cook?" matching over the RecipeIngredients table.
+
+PantryIndex keeps an in-memory inverted index from IngredientID to a sorted
+array of RecipeIDs, plus each recipe's own ingredient array. A pantry query
+counts, per recipe, how many of its ingredients are in the pantry by walking
+only the posting lists of the pantry's ingredients, so the cost depends on
+how popular those ingredients are rather than on the catalog size.
+
+The index is loaded once and then kept current incrementally: refresh() reads
+only the RecipeIngredients and Ingredients rows whose (AUTOINCREMENT) IDs are
+above the highest ones already loaded, so newly added recipes are picked up
+with one cheap range query per table no matter who wrote them.
+"""
+import bisect
+import threading
+from array import array
+from collections import Counter
+
+import fuzzy_index
+
+class PantryIndex:
+    """Inverted IngredientID -> RecipeIDs index for one database."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forgets everything; the next refresh() reloads the whole index."""
+        with self._lock:
+            self.postings = {}            # IngredientID -> sorted array of RecipeIDs
+            self.recipe_ingredients = {}  # RecipeID -> array of IngredientIDs
+            self.ingredient_ids = {}      # lower-cased IngredientName -> IngredientID
+            self.canonical_ids = {}       # CanonicalName -> lowest IngredientID with it
+            self.ingredient_names = {}    # IngredientID -> IngredientName
+            self.last_link_id = 0
+            self.last_ingredient_id = 0
+
+    def refresh(self, conn):
+        """Loads rows added since the last refresh. Returns the number of new recipe-ingredient links."""
+        with self._lock:
+            cursor = conn.execute(
+                "SELECT IngredientID, IngredientName, CanonicalName FROM Ingredients WHERE IngredientID > ? ORDER BY IngredientID",
+                (self.last_ingredient_id,))
+            for ingredient_id, name, canonical in cursor:
+                self.ingredient_ids[name.lower()] = ingredient_id
+                self.canonical_ids.setdefault(canonical, ingredient_id)
+                self.ingredient_names[ingredient_id] = name
+                self.last_ingredient_id = ingredient_id
+
+            cursor = conn.execute(
+                "SELECT RecipeIngredientID, RecipeID, IngredientID FROM RecipeIngredients "
+                "WHERE RecipeIngredientID > ? ORDER BY RecipeIngredientID",
+                (self.last_link_id,))
+            added = 0
+            for link_id, recipe_id, ingredient_id in cursor:
+                self._add_link(recipe_id, ingredient_id)
+                self.last_link_id = link_id
+                added += 1
+            return added
+
+    def _add_link(self, recipe_id, ingredient_id):
+        posting = self.postings.get(ingredient_id)
+        if posting is None:
+            posting = self.postings[ingredient_id] = array('q')
+        if not posting or posting[-1] < recipe_id:
+            posting.append(recipe_id)  # New recipes almost always have the highest ID.
+        else:
+            position = bisect.bisect_left(posting, recipe_id)
+            if position == len(posting) or posting[position] != recipe_id:
+                posting.insert(position, recipe_id)
+
+        ingredients = self.recipe_ingredients.get(recipe_id)
+        if ingredients is None:
+            ingredients = self.recipe_ingredients[recipe_id] = array('q')
+        ingredients.append(ingredient_id)
+
+    def reload_recipe(self, conn, recipe_id):
+        """
+        Re-reads one recipe's ingredients after it was edited or deleted. Only its
+        links already covered by the index are re-added; newer ones, like any
+        other new rows, arrive with the next refresh().
+        """
+        with self._lock:
+            for ingredient_id in self.recipe_ingredients.pop(recipe_id, ()):
+                posting = self.postings[ingredient_id]
+                position = bisect.bisect_left(posting, recipe_id)
+                if position < len(posting) and posting[position] == recipe_id:
+                    del posting[position]
+            cursor = conn.execute(
+                "SELECT RecipeIngredientID, IngredientID FROM RecipeIngredients WHERE RecipeID = ?", (recipe_id,))
+            for link_id, ingredient_id in cursor.fetchall():
+                if link_id <= self.last_link_id:
+                    self._add_link(recipe_id, ingredient_id)
+
+    def resolve(self, ingredient_names):
+        """
+        Maps pantry ingredient names to IngredientIDs, case-insensitively and, failing
+        that, by canonical name (so "eggs" finds "Egg"; see fuzzy_index.canonical_name).
+        Returns (set of IngredientIDs, list of names not found in the database).
+        """
+        found, unknown = set(), []
+        for name in ingredient_names:
+            ingredient_id = self.ingredient_ids.get(name.strip().lower())
+            if ingredient_id is None:
+                ingredient_id = self.canonical_ids.get(fuzzy_index.canonical_name(name))
+            if ingredient_id is None:
+                unknown.append(name.strip())
+            else:
+                found.add(ingredient_id)
+        return found, unknown
+
+    def match(self, pantry_ids, max_missing=0, limit=20):
+        """
+        Finds recipes that use at least one pantry ingredient and miss at most
+        `max_missing` of their own ingredients.
+        Returns up to `limit` (RecipeID, matched count, total count, missing IngredientIDs)
+        tuples, best coverage first (then fewest missing, then most matched).
+        """
+        with self._lock:
+            counts = Counter()
+            for ingredient_id in pantry_ids:
+                posting = self.postings.get(ingredient_id)
+                if posting:
+                    counts.update(posting)
+
+            candidates = []
+            for recipe_id, matched in counts.items():
+                total = len(self.recipe_ingredients[recipe_id])
+                if total - matched <= max_missing:
+                    candidates.append((-matched / total, total - matched, -matched, recipe_id))
+            candidates.sort()
+
+            results = []
+            for _, missing_count, neg_matched, recipe_id in candidates[:limit]:
+                ingredients = self.recipe_ingredients[recipe_id]
+                missing = [i for i in ingredients if i not in pantry_ids]
+                results.append((recipe_id, -neg_matched, len(ingredients), missing))
+            return results
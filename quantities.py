@@ -0,0 +1,99 @@
+"""
+Parser for the free-text ingredient quantities stored in RecipeIngredients.Quantity.
+
+parse_quantity() turns text such as "1 1/2 cups", "3 tbsp, melted" or "2-3 cloves"
+into a numeric amount and a canonical unit, so sums and scaling can be done in SQL
+on the Amount and Unit columns instead of re-parsing strings on every request:
+
+* volumes are converted to millilitres ('ml') and weights to grams ('g');
+* countable units (clove, can, slice, ...) keep their singular name;
+* a bare number ("2", "3 large") is counted as 'each'.
+
+Ranges use their upper bound, so a shopping list never comes up short.
+Text that doesn't start with an amount ("to taste", "a handful") parses to (None, None).
+"""
+import re
+
+# unit spelling -> (canonical unit, factor to convert one of it into the canonical unit)
+UNITS = {}
+
+def _add_units(canonical, factor, *spellings):
+    for spelling in spellings:
+        UNITS[spelling] = (canonical, factor)
+
+_add_units('ml', 1.0, 'ml', 'mls', 'milliliter', 'milliliters', 'millilitre', 'millilitres')
+_add_units('ml', 10.0, 'cl', 'centiliter', 'centiliters', 'centilitre', 'centilitres')
+_add_units('ml', 1000.0, 'l', 'liter', 'liters', 'litre', 'litres')
+_add_units('ml', 4.92892, 'tsp', 'tsps', 'teaspoon', 'teaspoons')
+_add_units('ml', 14.7868, 'tbsp', 'tbsps', 'tbs', 'tablespoon', 'tablespoons')
+_add_units('ml', 29.5735, 'fl oz', 'fluid ounce', 'fluid ounces')
+_add_units('ml', 236.588, 'cup', 'cups', 'c')
+_add_units('ml', 473.176, 'pint', 'pints', 'pt')
+_add_units('ml', 946.353, 'quart', 'quarts', 'qt')
+_add_units('ml', 3785.41, 'gallon', 'gallons', 'gal')
+_add_units('g', 0.001, 'mg', 'milligram', 'milligrams')
+_add_units('g', 1.0, 'g', 'gram', 'grams', 'gr')
+_add_units('g', 1000.0, 'kg', 'kilogram', 'kilograms')
+_add_units('g', 28.3495, 'oz', 'ounce', 'ounces')
+_add_units('g', 453.592, 'lb', 'lbs', 'pound', 'pounds')
+
+COUNT_UNITS = ['bunch', 'can', 'clove', 'dash', 'drop', 'handful', 'head', 'jar', 'package', 'packet',
+               'piece', 'pinch', 'slice', 'sprig', 'stalk', 'stick']
+for _unit in COUNT_UNITS:
+    _add_units(_unit, 1.0, _unit, _unit + 's', _unit + 'es')
+
+_VULGAR_FRACTIONS = {'¼': '1/4', '½': '1/2', '¾': '3/4', '⅓': '1/3', '⅔': '2/3', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8'}
+
+_NUMBER = r"\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?|\.\d+"
+_AMOUNT_RE = re.compile(rf"^\s*({_NUMBER})(?:\s*(?:-|–|to)\s*({_NUMBER}))?\s*", re.IGNORECASE)
+_UNIT_RE = re.compile(r"^(fl\.?\s*oz|fluid ounces?|[a-z]+)\.?(?![a-z])", re.IGNORECASE)
+
+def _to_number(text):
+    """Converts '2', '2.5', '3/4' or '1 1/2' to a float."""
+    total = 0.0
+    for part in text.split():
+        if '/' in part:
+            numerator, denominator = part.split('/')
+            total += float(numerator) / float(denominator) if float(denominator) else 0.0
+        else:
+            total += float(part)
+    return total
+
+def parse_quantity(text):
+    """
+    Parses a quantity string into (amount, unit) with the unit in canonical form.
+    Returns (None, None) if the text doesn't start with a number.
+    """
+    if not text:
+        return None, None
+    text = str(text)
+    for symbol, fraction in _VULGAR_FRACTIONS.items():
+        text = text.replace(symbol, f" {fraction}")
+
+    match = _AMOUNT_RE.match(text)
+    if not match:
+        return None, None
+    amount = _to_number(match.group(2) or match.group(1))
+
+    unit_match = _UNIT_RE.match(text[match.end():])
+    if unit_match:
+        spelling = ' '.join(unit_match.group(1).lower().replace('.', ' ').split())
+        if spelling in ('fl oz', 'floz'):
+            spelling = 'fl oz'
+        if spelling in UNITS:
+            canonical, factor = UNITS[spelling]
+            return amount * factor, canonical
+    return amount, 'each'
+
+def format_quantity(amount, unit):
+    """Formats an amount in a canonical unit for display, e.g. (1500, 'ml') -> '1.5 l'."""
+    if unit == 'ml' and amount >= 1000:
+        amount, unit = amount / 1000, 'l'
+    elif unit == 'g' and amount >= 1000:
+        amount, unit = amount / 1000, 'kg'
+    number = f"{amount:.2f}".rstrip('0').rstrip('.')
+    if unit == 'each':
+        return number
+    if unit in COUNT_UNITS and amount != 1:
+        unit += 'es' if unit.endswith(('sh', 'ch')) else 's'
+    return f"{number} {unit}"
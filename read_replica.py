@@ -0,0 +1,164 @@
+"""
+In-memory read replica of the recipe database.
+
+ReadReplica copies the database file into a shared-cache in-memory database with
+sqlite3's backup API and hands out per-thread read-only connections to it, so
+reads never touch the disk. Writes keep going to the file.
+
+Each refresh builds a complete new copy under a new name (a "generation") and
+then swaps it in with a single reference assignment, so readers only ever see a
+finished copy: a thread keeps using the generation it started a query on and
+moves to the newest one on its next read. An old copy is freed once its last
+reader connection is closed. Readers connect to a generation under the same
+lock the swap closes the old anchor under: a shared-cache in-memory database
+whose last connection has closed is gone, and connecting to its name would
+silently create a new, empty one.
+
+A background thread refreshes the replica when it is signalled (see signal(),
+which db_operations calls after its own writes) and every `refresh_interval`
+seconds if the file changed, which also catches writes from other processes.
+"""
+import itertools
+import logging
+import sqlite3
+import threading
+import time
+
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+_replica_ids = itertools.count(1)
+
+class _Generation:
+    """One complete in-memory copy, kept alive by its anchor connection."""
+
+    def __init__(self, number, uri, anchor, build_seconds):
+        self.number = number
+        self.uri = uri
+        self.anchor = anchor
+        self.built_at = time.time()
+        self.build_seconds = build_seconds
+        page_count = anchor.execute("PRAGMA page_count").fetchone()[0]
+        page_size = anchor.execute("PRAGMA page_size").fetchone()[0]
+        self.size_bytes = page_count * page_size
+
+class ReadReplica:
+    """Shared-cache in-memory copy of a database file, refreshed in the background."""
+
+    def __init__(self, database, refresh_interval=5.0, on_swap=None):
+        """
+        database: path of the database file to copy.
+        refresh_interval: seconds between checks for changes made by other
+            connections or processes (None to refresh only when signalled).
+        on_swap: optional callback(generation number) run after each new copy goes live.
+        """
+        self.database = database
+        self.refresh_interval = refresh_interval
+        self.on_swap = on_swap
+        self._id = next(_replica_ids)
+        self._generations = itertools.count(1)
+        self._current = None
+        self._local = threading.local()
+        self._build_lock = threading.Lock()
+        self._swap_lock = threading.Lock()  # Held while swapping generations and while connecting to one
+        self._wake = threading.Event()
+        self._stopped = False
+        self._refreshes = 0
+        self._monitor = sqlite3.connect(database, check_same_thread=False)
+        self._data_version = None
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name=f"read-replica-{self._id}", daemon=True)
+        self._thread.start()
+
+    def _changed(self):
+        """True if the file was written since the last check (PRAGMA data_version covers every other connection)."""
+        version = self._monitor.execute("PRAGMA data_version").fetchone()[0]
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def refresh(self):
+        """Builds a fresh copy of the file now and swaps it in. Returns the new generation number."""
+        with self._build_lock:
+            self._changed()  # Anything committed from here on triggers the next refresh.
+            started = time.perf_counter()
+            number = next(self._generations)
+            uri = f"file:recipe-replica-{self._id}-{number}?mode=memory&cache=shared"
+            anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            source = sqlite3.connect(self.database)
+            try:
+                source.backup(anchor)
+            except sqlite3.Error:
+                anchor.close()
+                raise
+            finally:
+                source.close()
+            generation = _Generation(number, uri, anchor, time.perf_counter() - started)
+
+            with self._swap_lock:
+                previous, self._current = self._current, generation  # The swap.
+                if previous is not None:
+                    previous.anchor.close()  # Freed once the last reader moves on.
+            self._refreshes += 1
+        logger.info("Read replica generation %d built in %.1f ms (%d bytes)",
+                    number, generation.build_seconds * 1000, generation.size_bytes)
+        if self.on_swap:
+            self.on_swap(number)
+        return number
+
+    def signal(self):
+        """Asks the background thread to refresh soon (after a write, for example)."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            signalled = self._wake.wait(self.refresh_interval)
+            self._wake.clear()
+            if self._stopped:
+                return
+            try:
+                if self._changed() or signalled:
+                    self.refresh()
+            except sqlite3.Error as e:
+                logger.error("Read replica refresh failed: %s", e)
+            if self._stopped:
+                return
+
+    def connection(self):
+        """Returns the calling thread's read-only connection to the newest copy."""
+        held = getattr(self._local, 'held', None)
+        if held is not None and held[0] is self._current:
+            return held[1]  # An open connection keeps its generation alive.
+        with self._swap_lock:
+            current = self._current
+            if current is None:
+                raise sqlite3.OperationalError("read replica is closed")
+            # The old connection is not closed here: a cursor still reading from it keeps it
+            # (and its generation) alive until it is done.
+            conn = sqlite3.connect(current.uri, uri=True, factory=instrumentation.InstrumentedConnection)
+        conn.execute("PRAGMA query_only = ON")
+        conn.row_factory = sqlite3.Row
+        self._local.held = (current, conn)
+        return conn
+
+    def stats(self):
+        current = self._current
+        return {
+            'generation': current.number if current else None,
+            'built_at': current.built_at if current else None,
+            'build_ms': current.build_seconds * 1000 if current else None,
+            'size_bytes': current.size_bytes if current else 0,
+            'refreshes': self._refreshes,
+        }
+
+    def close(self):
+        """Stops refreshing and releases the current copy (threads' connections close as they are collected)."""
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+        with self._build_lock, self._swap_lock:
+            if self._current is not None:
+                self._current.anchor.close()
+                self._current = None
+        self._monitor.close()
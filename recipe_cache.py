@@ -0,0 +1,109 @@
+"""
+Bounded in-process cache for recipe reads.
+
+RecipeCache is an LRU map with a maximum number of entries and a time-to-live.
+Every entry can carry tags (for example ('recipe', 12)), and invalidate_tag()
+drops exactly the entries carrying a tag, which is how db_operations keeps the
+cache consistent with its own write paths.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class RecipeCache:
+    """Thread-safe LRU + TTL cache with tag-based invalidation and hit/miss counters."""
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires at, tags)
+        self._tags = {}                # tag -> set of keys
+        self._lock = threading.Lock()
+        self._generation = 0           # bumped by every invalidation
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def generation(self):
+        """
+        Returns a token to take before reading from the database. put() ignores
+        values read under an older token, so a read that races with a write
+        cannot put stale data back into the cache.
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """Returns (True, value) on a hit or (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return False, None
+            value, expires_at, tags = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return True, value
+
+    def put(self, key, value, tags=(), generation=None):
+        """Stores a value, evicting the least recently used entries beyond max_entries."""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        value, expires_at, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tag(self, tag):
+        """Drops every entry carrying `tag`. Returns how many were dropped."""
+        with self._lock:
+            self._generation += 1
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            self._stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def invalidate_where(self, predicate):
+        """Drops every entry whose key satisfies predicate(key). Returns how many were dropped."""
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            self._stats['invalidations'] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        """Returns the hit/miss/eviction/expiration/invalidation counters and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            return stats
@@ -0,0 +1,397 @@
+"""
+Non-interactive command-line interface for scripts and pipelines.
+
+Every command prints newline-delimited JSON (one object per line) on stdout;
+log messages go to stderr. The exit status is 1 if any operation failed.
+
+    python recipe_cli.py show 3 7
+    python recipe_cli.py list [--limit 20] [--after CURSOR]
+    python recipe_cli.py search pie [--full-text] [--limit 20]
+    python recipe_cli.py add recipes.jsonl          # one recipe object per line ('-' for stdin)
+    python recipe_cli.py import catalog.csv [--workers 4]
+    python recipe_cli.py export [--output catalog.jsonl]
+    python recipe_cli.py changes --since 1234 [--output delta.jsonl]
+    python recipe_cli.py run ops.jsonl [--atomic]   # many operations in one process
+
+`add` and `run` read all their input first and then execute it over one
+connection in one transaction. A `run` file holds one operation per line:
+
+    {"op": "add", "recipe": {"name": "...", "ingredients": [...], "instructions": [...]}}
+    {"op": "show", "id": 3}
+    {"op": "search", "text": "pie", "full_text": true}
+    {"op": "list", "limit": 10}
+    {"op": "update", "id": 3, "description": "..."}
+    {"op": "delete", "id": 4}
+
+Failed writes are rolled back on their own and the rest are committed, unless
+--atomic is given, in which case any failure rolls back the whole run. A
+malformed operation (unknown op, missing or mistyped field) fails like any
+other, with {"ok": false, "error": ...} and a non-zero exit status.
+
+`changes` is the incremental feed for downstream copies (see change_log.py).
+It prints one line per recipe or ingredient changed after the given sequence
+number, then a checkpoint to pass as --since next time:
+
+    {"type": "recipe", "op": "upsert", "id": 3, "name": "...", "description": "...", "ingredients": [...], "instructions": [...]}
+    {"type": "recipe", "op": "delete", "id": 4}
+    {"type": "ingredient", "op": "upsert", "id": 9, "name": "Salt"}
+    {"type": "checkpoint", "seq": 1290}
+
+If the entries after --since were compacted away (or --full is given), the
+feed starts with {"type": "reset", ...} and lists the whole catalog instead.
+
+Only argparse and json are imported up front; the database layer is imported
+when a command runs, and the bulk import/export machinery only by `import`.
+"""
+import argparse
+import json
+import os
+import sys
+
+DEFAULT_DATABASE = 'recipes.db'
+EXPORT_CHUNK_SIZE = 1000
+
+class OperationError(Exception):
+    """An operation that could not be carried out; reported as {"ok": false, "error": ...}."""
+
+def emit(obj, out=None):
+    """Writes one NDJSON line."""
+    out = out or sys.stdout
+    out.write(json.dumps(obj, ensure_ascii=False, default=str))
+    out.write('\n')
+
+def _open_database(path):
+    """Points db_operations at `path`, upgrading its schema first, and returns the module."""
+    import contextlib
+    import database_setup
+    import db_operations
+    import instrumentation
+
+    instrumentation.configure_logging(os.environ.get('RECIPE_LOG_LEVEL', 'WARNING'))
+    db_operations.DATABASE_FILE = path
+    # Migration progress is printed; keep it out of the JSON on stdout.
+    with contextlib.redirect_stdout(sys.stderr):
+        database_setup.upgrade_database(path)
+    return db_operations
+
+def _read_json_lines(path):
+    """Returns the objects in an NDJSON file ('-' for stdin), raising ValueError on the first bad line."""
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        objects = []
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                objects.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                raise ValueError(f"line {line_number}: invalid JSON: {e}")
+        return objects
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+# Operations shared by the subcommands and `run`. Each takes the operation dict
+# and a connection and returns a list of result objects.
+
+def _op_show(db, op, conn):
+    ids = op.get('ids', [op.get('id')])
+    try:
+        found = db.get_recipe_details_many(ids, conn=conn)
+    except (TypeError, ValueError):
+        raise OperationError("recipe IDs must be integers")
+    missing = [recipe_id for recipe_id in ids if int(recipe_id) not in found]
+    if missing:
+        raise OperationError(f"recipe not found: {', '.join(map(str, missing))}")
+    return list(found.values())
+
+def _limit(op, default=None):
+    """The operation's 'limit' as a positive int (a numeric string is accepted), or `default` if it has none."""
+    limit = op.get('limit')
+    if limit is None:
+        return default
+    if not isinstance(limit, bool):
+        try:
+            value = int(limit)
+        except (TypeError, ValueError):
+            value = 0
+        if value >= 1:
+            return value
+    raise OperationError(f"'limit' must be a positive integer, got {limit!r}")
+
+def _op_list(db, op, conn):
+    limit = _limit(op)
+    if limit is None:
+        return [{'id': recipe_id, 'name': name} for recipe_id, name in db.iter_recipes(conn=conn)]
+    after = op.get('after')
+    if after:
+        if not isinstance(after, list) or len(after) != 2 or not isinstance(after[0], str):
+            raise OperationError("'after' must be the [name, id] cursor of the previous page")
+        after = (after[0], int(after[1]))
+    rows, cursor = db.list_recipes_page(limit, after, conn=conn)
+    results = [{'id': recipe_id, 'name': name} for recipe_id, name in rows]
+    if cursor:
+        results.append({'next': list(cursor)})
+    return results
+
+def _op_search(db, op, conn):
+    text = op.get('text') or ''
+    if op.get('full_text'):
+        return db.search_recipes(text, mode=op.get('mode', 'all'), limit=_limit(op, 20), conn=conn)
+    limit = _limit(op)
+    results = [{'id': recipe_id, 'name': name} for recipe_id, name in db.search_recipe_by_name(text, conn=conn)]
+    return results[:limit] if limit else results
+
+def _op_add(db, op, conn):
+    recipe = op.get('recipe')
+    if not isinstance(recipe, dict) or not recipe.get('name'):
+        raise OperationError("'recipe' must be an object with a 'name'")
+    recipe_id = db.add_recipe(recipe['name'], recipe.get('description'), recipe.get('ingredients') or [],
+                              recipe.get('instructions') or [], conn=conn)
+    if recipe_id is None:
+        raise OperationError(f"could not add recipe '{recipe['name']}' (it might already exist)")
+    return [{'id': recipe_id, 'name': recipe['name']}]
+
+def _op_update(db, op, conn):
+    summary = db.update_recipe(op.get('id'), op.get('name'), op.get('description'), op.get('ingredients'),
+                               op.get('instructions'), conn=conn)
+    if summary is None:
+        raise OperationError(f"could not update recipe {op.get('id')}")
+    return [dict(summary, id=op.get('id'))]
+
+def _op_delete(db, op, conn):
+    if not db.delete_recipe(op.get('id'), conn=conn):
+        raise OperationError(f"could not delete recipe {op.get('id')}")
+    return [{'id': op.get('id'), 'deleted': True}]
+
+OPERATIONS = {
+    'show': _op_show,
+    'list': _op_list,
+    'search': _op_search,
+    'add': _op_add,
+    'update': _op_update,
+    'delete': _op_delete,
+}
+WRITE_OPERATIONS = {'add', 'update', 'delete'}
+
+def run_operations(db, operations, atomic=False, report=emit):
+    """
+    Runs operation dicts in order over one connection in one transaction,
+    passing each outcome to `report` as {"op", "ok", "result"} or {"op", "ok", "error", "line"}.
+    Returns the number of failed operations.
+    """
+    failures = 0
+    with db.get_pool().connection() as conn:
+        writes = any(isinstance(op, dict) and op.get('op') in WRITE_OPERATIONS for op in operations)
+        conn.execute("BEGIN IMMEDIATE" if writes else "BEGIN")
+        try:
+            for number, op in enumerate(operations, start=1):
+                name = op.get('op') if isinstance(op, dict) else None
+                try:
+                    if name not in OPERATIONS:
+                        raise OperationError(f"unknown operation {name!r}")
+                    report({'op': name, 'ok': True, 'result': OPERATIONS[name](db, op, conn)})
+                except (OperationError, TypeError, ValueError) as e:
+                    failures += 1
+                    report({'op': name, 'ok': False, 'error': str(e), 'line': number})
+                except (LookupError, AttributeError) as e:
+                    # A missing key or a value of the wrong shape somewhere in the operation.
+                    failures += 1
+                    report({'op': name, 'ok': False, 'error': f"malformed operation: {type(e).__name__}: {e}", 'line': number})
+        except BaseException:
+            _rollback(db, conn)
+            raise
+        if atomic and failures:
+            _rollback(db, conn)
+            report({'op': None, 'ok': False, 'error': f"{failures} operations failed; nothing was committed"})
+        else:
+            conn.commit()
+    return failures
+
+def _rollback(db, conn):
+    conn.rollback()
+    # The in-memory indexes may have picked up rows that no longer exist.
+    db.get_pantry_index(db.DATABASE_FILE).reset()
+    db.get_name_index(db.DATABASE_FILE).reset()
+
+def _print_results(outcome):
+    """`report` for single-operation commands: prints the result objects themselves, one per line."""
+    if outcome['ok']:
+        for result in outcome['result']:
+            emit(result)
+    else:
+        emit({'error': outcome['error']})
+
+def cmd_show(args):
+    db = _open_database(args.db)
+    operations = [{'op': 'show', 'id': recipe_id} for recipe_id in args.ids]
+    return 1 if run_operations(db, operations, report=_print_results) else 0
+
+def cmd_list(args):
+    db = _open_database(args.db)
+    after = json.loads(args.after) if args.after else None
+    return 1 if run_operations(db, [{'op': 'list', 'limit': args.limit, 'after': after}], report=_print_results) else 0
+
+def cmd_search(args):
+    db = _open_database(args.db)
+    op = {'op': 'search', 'text': args.text, 'full_text': args.full_text, 'limit': args.limit}
+    return 1 if run_operations(db, [op], report=_print_results) else 0
+
+def cmd_add(args):
+    recipes = _read_json_lines(args.path)
+    db = _open_database(args.db)
+    return 1 if run_operations(db, [{'op': 'add', 'recipe': recipe} for recipe in recipes], atomic=args.atomic) else 0
+
+def cmd_run(args):
+    operations = _read_json_lines(args.path)
+    db = _open_database(args.db)
+    return 1 if run_operations(db, operations, atomic=args.atomic) else 0
+
+def cmd_import(args):
+    _open_database(args.db)
+    import bulk_import
+
+    def on_batch(stats):
+        emit(dict(stats, type='batch'))
+
+    if args.workers:
+        summary = bulk_import.import_file_parallel(args.path, args.workers, args.format, args.batch_size, on_batch=on_batch)
+    else:
+        summary = bulk_import.import_file(args.path, args.format, args.batch_size, on_batch=on_batch)
+    emit({'type': 'summary', 'added': summary['added'], 'rejected': summary['rejected'],
+          'seconds': summary['seconds'], 'stages': summary.get('stages')})
+    return 0 if summary['added'] or not summary['rejected'] else 1
+
+def cmd_export(args):
+    """Writes every recipe, in name order, in the JSONL format `import` reads."""
+    db = _open_database(args.db)
+    out = sys.stdout if args.output in (None, '-') else open(args.output, 'w', encoding='utf-8')
+    try:
+        with db.get_pool().connection() as conn:
+            conn.execute("BEGIN")  # One snapshot for the whole export.
+            try:
+                chunk = []
+                for recipe_id, _ in db.iter_recipes(EXPORT_CHUNK_SIZE, conn=conn):
+                    chunk.append(recipe_id)
+                    if len(chunk) >= EXPORT_CHUNK_SIZE:
+                        _export_chunk(db, chunk, conn, out)
+                        chunk = []
+                _export_chunk(db, chunk, conn, out)
+            finally:
+                conn.rollback()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+def cmd_changes(args):
+    """Writes what changed after --since as an upsert/delete feed, ending with a checkpoint."""
+    import change_log
+
+    db = _open_database(args.db)
+    out = sys.stdout if args.output in (None, '-') else open(args.output, 'w', encoding='utf-8')
+    try:
+        with db.get_pool().connection() as conn:
+            conn.execute("BEGIN")  # The changes and the rows they point at come from one snapshot.
+            try:
+                until = change_log.latest_seq(conn)
+                since, reset = (None, {'type': 'reset'}) if args.full else (args.since, None)
+                try:
+                    recipe_ids = change_log.changed_recipe_ids(conn, since, until)
+                except change_log.ChangeLogTruncated as e:
+                    since, reset = None, {'type': 'reset', 'reason': str(e)}
+                    recipe_ids = change_log.changed_recipe_ids(conn, since, until)
+                if reset:
+                    emit(reset, out)
+                for start in range(0, len(recipe_ids), EXPORT_CHUNK_SIZE):
+                    chunk = recipe_ids[start:start + EXPORT_CHUNK_SIZE]
+                    found = _export_chunk(db, chunk, conn, out, feed=True)
+                    for recipe_id in chunk:
+                        if recipe_id not in found:
+                            emit({'type': 'recipe', 'op': 'delete', 'id': recipe_id}, out)
+                for ingredient_id, name in change_log.changed_ingredients(conn, since, until):
+                    if name is None:
+                        emit({'type': 'ingredient', 'op': 'delete', 'id': ingredient_id}, out)
+                    else:
+                        emit({'type': 'ingredient', 'op': 'upsert', 'id': ingredient_id, 'name': name}, out)
+                emit({'type': 'checkpoint', 'seq': until}, out)
+            finally:
+                conn.rollback()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+def _export_chunk(db, recipe_ids, conn, out, feed=False):
+    """
+    Writes the recipes among `recipe_ids` in the export format (with feed=True,
+    as `changes` upserts) and returns the set of IDs found.
+    """
+
+    columns = db.get_recipe_columns(recipe_ids, conn=conn)
+    for i in range(len(columns)):
+        recipe = {
+            'name': columns.names[i],
+            'description': columns.descriptions[i],
+            'ingredients': [{'name': name, 'quantity': quantity} for name, quantity in columns.ingredients(i)],
+            'instructions': [description for _, description in columns.steps(i)],
+        }
+        emit({'type': 'recipe', 'op': 'upsert', 'id': columns.ids[i], **recipe} if feed else recipe, out)
+    return set(columns.ids)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scriptable recipe database commands with NDJSON output.")
+    parser.add_argument('--db', default=os.environ.get('RECIPE_DB', DEFAULT_DATABASE), help="database file")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    show = commands.add_parser('show', help="print recipe details")
+    show.add_argument('ids', nargs='+', type=int)
+    show.set_defaults(func=cmd_show)
+
+    list_parser = commands.add_parser('list', help="list recipes in name order")
+    list_parser.add_argument('--limit', type=int, help="one page of this many (default: all)")
+    list_parser.add_argument('--after', help="the 'next' cursor printed with the previous page, as JSON")
+    list_parser.set_defaults(func=cmd_list)
+
+    search = commands.add_parser('search', help="search recipe names, or everything with --full-text")
+    search.add_argument('text')
+    search.add_argument('--full-text', action='store_true')
+    search.add_argument('--limit', type=int, default=20)
+    search.set_defaults(func=cmd_search)
+
+    add = commands.add_parser('add', help="add recipes from an NDJSON file or stdin, in one transaction")
+    add.add_argument('path', nargs='?', default='-')
+    add.add_argument('--atomic', action='store_true', help="add nothing if any recipe fails")
+    add.set_defaults(func=cmd_add)
+
+    run = commands.add_parser('run', help="run NDJSON operations from a file or stdin, in one transaction")
+    run.add_argument('path', nargs='?', default='-')
+    run.add_argument('--atomic', action='store_true', help="commit nothing if any operation fails")
+    run.set_defaults(func=cmd_run)
+
+    import_parser = commands.add_parser('import', help="bulk import a JSONL or CSV catalog")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=['jsonl', 'csv'])
+    import_parser.add_argument('--batch-size', type=int, default=5000)
+    import_parser.add_argument('--workers', type=int, default=0)
+    import_parser.set_defaults(func=cmd_import)
+
+    export = commands.add_parser('export', help="write every recipe as JSONL (the format `import` reads)")
+    export.add_argument('--output', help="file to write (default: stdout)")
+    export.set_defaults(func=cmd_export)
+
+    changes = commands.add_parser('changes', help="write the recipes and ingredients changed after a checkpoint")
+    changes.add_argument('--since', type=int, default=0, help="the checkpoint printed by the previous run (default: 0)")
+    changes.add_argument('--full', action='store_true', help="list the whole catalog regardless of --since")
+    changes.add_argument('--output', help="file to write (default: stdout)")
+    changes.set_defaults(func=cmd_changes)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        emit({'error': str(e)})
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
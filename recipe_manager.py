@@ -1,5 +1,48 @@
+import database_setup
 import db_operations
+import instrumentation
+import os
+import quantities
 import sys
+from contextlib import contextmanager
+
+try:
+    import readline
+except ImportError:  # Not available on Windows; input() then works without Tab completion.
+    readline = None
+else:
+    if 'libedit' in (readline.__doc__ or ''):
+        readline.parse_and_bind("bind ^I rl_complete")
+    else:
+        readline.parse_and_bind("tab: complete")
+
+AUTOCOMPLETE_LIMIT = 10
+
+@contextmanager
+def tab_completion(complete):
+    """
+    While the block runs, pressing Tab at an input() prompt offers the names
+    returned by complete(typed text) (e.g. db_operations.autocomplete_recipes).
+    Does nothing where readline is unavailable.
+    """
+    if readline is None:
+        yield
+        return
+    matches = []
+
+    def completer(text, state):
+        if state == 0:
+            matches[:] = [match['name'] for match in complete(readline.get_line_buffer(), limit=AUTOCOMPLETE_LIMIT)]
+        return matches[state] if state < len(matches) else None
+
+    previous_completer, previous_delims = readline.get_completer(), readline.get_completer_delims()
+    readline.set_completer(completer)
+    readline.set_completer_delims('')  # Complete whole names, spaces included.
+    try:
+        yield
+    finally:
+        readline.set_completer(previous_completer)
+        readline.set_completer_delims(previous_delims)
 
 def display_menu():
     """Prints the main menu options to the console."""
@@ -8,18 +51,25 @@ def display_menu():
     print("2. List All Recipes")
     print("3. Search Recipe by Name")
     print("4. View Recipe Details")
-    print("5. Exit")
+    print("5. Full-Text Search")
+    print("6. What Can I Cook?")
+    print("7. Shopping List")
+    print("8. Show Performance Metrics")
+    print("9. Edit a Recipe")
+    print("10. Delete a Recipe")
+    print("11. Catalog Statistics")
+    print("12. Exit")
     print("----------------------------")
 
 def get_user_choice():
     """Prompts the user for menu choice and returns it."""
     while True:
         try:
-            choice = input("Enter your choice (1-5): ")
-            if choice in ['1', '2', '3', '4', '5']:
+            choice = input("Enter your choice (1-12): ").strip()
+            if choice in ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12']:
                 return choice
             else:
-                print("Invalid choice. Please enter a number between 1 and 5.")
+                print("Invalid choice. Please enter a number between 1 and 12.")
         except EOFError:
              print("\nExiting.")
              sys.exit(0)
@@ -41,9 +91,10 @@ def get_recipe_input():
     description = input("Enter Recipe Description (optional): ").strip()
 
     ingredients = []
-    print("\nEnter Ingredients (type 'done' when finished):")
+    print("\nEnter Ingredients (type 'done' when finished, Tab completes known names):")
     while True:
-        ing_name = input("  Ingredient Name: ").strip()
+        with tab_completion(db_operations.autocomplete_ingredients):
+            ing_name = input("  Ingredient Name: ").strip()
         if ing_name.lower() == 'done':
             if not ingredients:
                  print("Warning: No ingredients added.")
@@ -92,20 +143,34 @@ def handle_add_recipe():
     else:
         print("\nFailed to add recipe.")
 
+LIST_PAGE_SIZE = 20
+
 def handle_list_recipes():
-    """Handles listing all recipes."""
+    """Handles listing all recipes, one page at a time."""
     print("\n--- All Recipes ---")
-    recipes = db_operations.list_all_recipes()
-    if recipes:
+    recipes, cursor = db_operations.list_recipes_page(LIST_PAGE_SIZE)
+    if not recipes:
+        print("No recipes found in the database.")
+        return
+
+    shown = 0
+    while True:
         for r_id, r_name in recipes:
             print(f"ID: {r_id:<5} Name: {r_name}")
-    else:
-        print("No recipes found in the database.")
+        shown += len(recipes)
+        if cursor is None:
+            print(f"({shown} recipes)")
+            return
+        more = input(f"-- {shown} shown. Press Enter for more, or 'q' to stop: ").strip().lower()
+        if more == 'q':
+            return
+        recipes, cursor = db_operations.list_recipes_page(LIST_PAGE_SIZE, after=cursor)
 
 def handle_search_recipe():
     """Handles searching for recipes by name."""
     print("\n--- Search Recipe by Name ---")
-    search_term = input("Enter search term: ").strip()
+    with tab_completion(db_operations.autocomplete_recipes):
+        search_term = input("Enter search term (Tab completes names): ").strip()
     if not search_term:
         print("Search term cannot be empty.")
         return
@@ -117,6 +182,112 @@ def handle_search_recipe():
             print(f"ID: {r_id:<5} Name: {r_name}")
     else:
         print(f"No recipes found matching '{search_term}'.")
+        suggestions = db_operations.suggest_recipes(search_term, limit=5, min_similarity=0.5)
+        if suggestions:
+            print("Did you mean:")
+            for suggestion in suggestions:
+                print(f"ID: {suggestion['id']:<5} Name: {suggestion['name']}")
+
+def handle_full_text_search():
+    """Handles ranked full-text search over names, descriptions, ingredients and instructions."""
+    print("\n--- Full-Text Search ---")
+    print("Tips: \"quoted words\" match a phrase, a trailing * matches a prefix (e.g. choc*).")
+    query = input("Enter search query: ").strip()
+    if not query:
+        print("Search query cannot be empty.")
+        return
+
+    results = db_operations.search_recipes(query)
+    if results:
+        print("\nSearch Results (best match first):")
+        for result in results:
+            print(f"ID: {result['id']:<5} Name: {result['name']}")
+            print(f"       {result['snippet']}")
+    else:
+        print(f"No recipes found matching '{query}'.")
+
+def handle_what_can_i_cook():
+    """Handles finding recipes that can be made from the ingredients on hand."""
+    print("\n--- What Can I Cook? ---")
+    pantry_text = input("Enter the ingredients you have (comma-separated): ").strip()
+    pantry = [name.strip() for name in pantry_text.split(',') if name.strip()]
+    if not pantry:
+        print("Please enter at least one ingredient.")
+        return
+
+    missing_text = input("How many ingredients may be missing? (default 0): ").strip()
+    try:
+        max_missing = int(missing_text) if missing_text else 0
+    except ValueError:
+        print("Invalid number. Using 0.")
+        max_missing = 0
+
+    result = db_operations.find_recipes_by_pantry(pantry, max_missing=max_missing)
+    for name in result['unknown_ingredients']:
+        suggestions = db_operations.suggest_ingredients(name, limit=3, min_similarity=0.5)
+        hint = f" (did you mean {', '.join(s['name'] for s in suggestions)}?)" if suggestions else ""
+        print(f"Not used by any recipe: {name}{hint}")
+
+    if result['matches']:
+        print("\nMatching Recipes (best coverage first):")
+        for match in result['matches']:
+            print(f"ID: {match['id']:<5} Name: {match['name']} ({match['matched']}/{match['total']} ingredients)")
+            if match['missing']:
+                print(f"       Missing: {', '.join(match['missing'])}")
+    else:
+        print("No recipes can be made with those ingredients.")
+
+def handle_shopping_list():
+    """Handles building a combined, scaled shopping list for several recipes."""
+    print("\n--- Shopping List ---")
+    print("Enter recipe IDs, each optionally followed by 'x' and a scale factor (e.g. 3, 7x2, 12x0.5).")
+    plan_text = input("Recipes: ").strip()
+    plan = []
+    for entry in plan_text.replace(',', ' ').split():
+        recipe_id, _, scale = entry.lower().partition('x')
+        try:
+            plan.append((int(recipe_id), float(scale) if scale else 1.0))
+        except ValueError:
+            print(f"Skipping invalid entry: {entry}")
+    if not plan:
+        print("Please enter at least one recipe ID.")
+        return
+
+    shopping_list = db_operations.build_shopping_list(plan)
+    if not shopping_list['items'] and not shopping_list['unparsed']:
+        print("No ingredients found for those recipes.")
+        return
+
+    print("\nYou will need:")
+    for item in shopping_list['items']:
+        print(f"  - {item['ingredient']}: {quantities.format_quantity(item['amount'], item['unit'])}")
+    for item in shopping_list['unparsed']:
+        print(f"  - {item['ingredient']}: {item['quantity']} (recipe {item['recipe_id']})")
+
+def handle_show_metrics():
+    """Prints the timings and counters collected by the instrumentation module this session."""
+    print("\n--- Performance Metrics ---")
+    print(instrumentation.format_metrics())
+    cache = db_operations.cache_stats()
+    if cache:
+        print(f"\nRead cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%} hit rate), "
+              f"{cache['entries']} entries")
+
+def handle_catalog_stats():
+    """Shows catalog totals, averages and the most-used ingredients."""
+    print("\n--- Catalog Statistics ---")
+    stats = db_operations.get_catalog_stats(top=10)
+    if stats is None:
+        print("Could not read the statistics.")
+        return
+    print(f"Recipes: {stats['recipes']}    Ingredients: {stats['ingredients']}    "
+          f"Ingredient lines: {stats['ingredient_links']}    Steps: {stats['steps']}")
+    print(f"Average per recipe: {stats['avg_ingredients_per_recipe']:.1f} ingredients, "
+          f"{stats['avg_steps_per_recipe']:.1f} steps")
+    if stats['top_ingredients']:
+        print("\nMost-used ingredients:")
+        for rank, ingredient in enumerate(stats['top_ingredients'], start=1):
+            print(f"  {rank:>2}. {ingredient['name']} ({ingredient['recipes']} recipes)")
 
 def handle_view_details():
     """Handles viewing the details of a specific recipe."""
@@ -156,14 +327,116 @@ def handle_view_details():
                 print(f"  {instr['step']}. {instr['description']}")
         else:
             print("  (No instructions listed)")
+        similar = db_operations.get_similar_recipes(recipe_id)
+        if similar:
+            print("\nRecipes like this one:")
+            for recipe in similar:
+                print(f"  - {recipe['name']} (ID: {recipe['id']}, {recipe['score']:.0%} ingredient overlap)")
         print("------------------------------")
     else:
         print(f"Recipe with ID {recipe_id} not found.")
 
+def read_recipe_id(prompt):
+    """Asks for a recipe ID; returns None if the user cancels."""
+    while True:
+        try:
+            recipe_id_str = input(prompt).strip()
+            if not recipe_id_str:
+                print("Recipe ID cannot be empty.")
+                continue
+            return int(recipe_id_str)
+        except ValueError:
+            print("Invalid ID. Please enter a number.")
+        except (EOFError, KeyboardInterrupt):
+            print("\nReturning to menu.")
+            return None
+
+def handle_edit_recipe():
+    """Handles editing an existing recipe; only the parts that change are written."""
+    print("\n--- Edit Recipe ---")
+    recipe_id = read_recipe_id("Enter the ID of the recipe to edit: ")
+    if recipe_id is None:
+        return
+    details = db_operations.get_recipe_details(recipe_id)
+    if not details:
+        print(f"Recipe with ID {recipe_id} not found.")
+        return
+
+    print("Press Enter to keep the current value.")
+    name = input(f"Name [{details['name']}]: ").strip() or None
+    description = input(f"Description [{details['description'] or ''}] ('-' to clear): ").strip()
+    description = '' if description == '-' else (description or None)
+
+    ingredients = None
+    if input("Edit ingredients? (yes/no): ").strip().lower() == 'yes':
+        ingredients = []
+        print("For each ingredient, enter a new quantity, 'remove', or press Enter to keep it.")
+        for ing in details['ingredients']:
+            answer = input(f"  {ing['name']} ({ing['quantity']}): ").strip()
+            if answer.lower() != 'remove':
+                ingredients.append({'name': ing['name'], 'quantity': answer or ing['quantity']})
+        print("Add ingredients (type 'done' when finished):")
+        while True:
+            ing_name = input("  Ingredient Name: ").strip()
+            if not ing_name or ing_name.lower() == 'done':
+                break
+            ing_quantity = input(f"  Quantity for '{ing_name}': ").strip()
+            if ing_quantity:
+                ingredients.append({'name': ing_name, 'quantity': ing_quantity})
+            else:
+                print("  Quantity cannot be empty; ingredient skipped.")
+
+    instructions = None
+    if input("Edit instructions? (yes/no): ").strip().lower() == 'yes':
+        instructions = []
+        print("For each step, enter new text, 'remove', or press Enter to keep it.")
+        for instr in details['instructions']:
+            answer = input(f"  {instr['step']}. {instr['description']}: ").strip()
+            if answer.lower() != 'remove':
+                instructions.append(answer or instr['description'])
+        print("Add steps (type 'done' when finished):")
+        while True:
+            instruction = input(f"  Step {len(instructions) + 1}: ").strip()
+            if not instruction or instruction.lower() == 'done':
+                break
+            instructions.append(instruction)
+
+    summary = db_operations.update_recipe(recipe_id, name, description, ingredients, instructions)
+    if summary is None:
+        print("\nFailed to update recipe.")
+        return
+    changes = []
+    if summary['recipe']:
+        changes.append("name/description")
+    for part in ('ingredients', 'instructions'):
+        counts = summary[part]
+        if any(counts.values()):
+            changes.append(f"{part}: {counts['added']} added, {counts['updated']} changed, {counts['removed']} removed")
+    print(f"\nRecipe {recipe_id} updated ({'; '.join(changes)})." if changes else "\nNo changes.")
+
+def handle_delete_recipe():
+    """Handles deleting a recipe after confirmation."""
+    print("\n--- Delete Recipe ---")
+    recipe_id = read_recipe_id("Enter the ID of the recipe to delete: ")
+    if recipe_id is None:
+        return
+    details = db_operations.get_recipe_details(recipe_id)
+    if not details:
+        print(f"Recipe with ID {recipe_id} not found.")
+        return
+    confirm = input(f"Delete '{details['name']}' and all its ingredients and instructions? (yes/no): ").strip().lower()
+    if confirm != 'yes':
+        print("Nothing deleted.")
+    elif db_operations.delete_recipe(recipe_id):
+        print(f"\nRecipe '{details['name']}' deleted.")
+    else:
+        print("\nFailed to delete recipe.")
+
 def main():
     """Main function to run the recipe manager application."""
+    instrumentation.configure_logging(os.environ.get('RECIPE_LOG_LEVEL', 'WARNING'))
     print("Welcome to the Recipe Database Manager!")
-    print("Please ensure 'database_setup.py' has been run at least once.")
+    database_setup.upgrade_database(db_operations.DATABASE_FILE)
 
     while True:
         display_menu()
@@ -178,6 +451,20 @@ def main():
         elif choice == '4':
             handle_view_details()
         elif choice == '5':
+            handle_full_text_search()
+        elif choice == '6':
+            handle_what_can_i_cook()
+        elif choice == '7':
+            handle_shopping_list()
+        elif choice == '8':
+            handle_show_metrics()
+        elif choice == '9':
+            handle_edit_recipe()
+        elif choice == '10':
+            handle_delete_recipe()
+        elif choice == '11':
+            handle_catalog_stats()
+        elif choice == '12':
             print("Exiting Recipe Database Manager. Goodbye!")
             break
 
@@ -0,0 +1,184 @@
+"""
+Compact result types for recipe reads.
+
+Recipe, IngredientLine and Step use __slots__, so an instance carries no
+per-object __dict__. They are built straight from cursor rows by the row
+factories below (cursor.row_factory = recipe_row, ...), skipping the
+intermediate sqlite3.Row. Results may be shared through the read cache, so
+treat them as read-only.
+
+RecipeColumns holds a batch of recipes column by column: one list (or array)
+per field, with the ingredient lines and steps of every recipe concatenated
+and located through offset arrays. A batch of N recipes is a fixed number of
+containers instead of N objects plus their nested lists, which is the form to
+use for bulk reads such as exports.
+
+Ingredient names repeat across recipes; both forms keep one string per
+distinct name within a result (see Interner).
+"""
+from array import array
+
+class Interner:
+    """Returns one shared str object for each distinct string value it is given."""
+
+    __slots__ = ('_strings',)
+
+    def __init__(self):
+        self._strings = {}
+
+    def __call__(self, text):
+        return self._strings.setdefault(text, text)
+
+class IngredientLine:
+    __slots__ = ('name', 'quantity')
+
+    def __init__(self, name, quantity):
+        self.name = name
+        self.quantity = quantity
+
+    def as_dict(self):
+        return {'name': self.name, 'quantity': self.quantity}
+
+    def __eq__(self, other):
+        return isinstance(other, IngredientLine) and (self.name, self.quantity) == (other.name, other.quantity)
+
+    def __repr__(self):
+        return f"IngredientLine({self.name!r}, {self.quantity!r})"
+
+class Step:
+    __slots__ = ('step', 'description')
+
+    def __init__(self, step, description):
+        self.step = step
+        self.description = description
+
+    def as_dict(self):
+        return {'step': self.step, 'description': self.description}
+
+    def __eq__(self, other):
+        return isinstance(other, Step) and (self.step, self.description) == (other.step, other.description)
+
+    def __repr__(self):
+        return f"Step({self.step!r}, {self.description!r})"
+
+class Recipe:
+    __slots__ = ('id', 'name', 'description', 'ingredients', 'instructions')
+
+    def __init__(self, id, name, description, ingredients=None, instructions=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.ingredients = [] if ingredients is None else ingredients
+        self.instructions = [] if instructions is None else instructions
+
+    def as_dict(self):
+        """Returns the dictionary get_recipe_details has always returned."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'ingredients': [line.as_dict() for line in self.ingredients],
+            'instructions': [step.as_dict() for step in self.instructions],
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, Recipe) and all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    def __repr__(self):
+        return f"Recipe({self.id!r}, {self.name!r}, {len(self.ingredients)} ingredients, {len(self.instructions)} steps)"
+
+# Row factories. The queries select (RecipeID, ...) so rows can be grouped by recipe.
+
+def recipe_row(cursor, row):
+    """(RecipeID, RecipeName, Description) -> Recipe."""
+    return Recipe(row[0], row[1], row[2])
+
+def ingredient_line_rows(intern=None):
+    """Returns a row factory for (RecipeID, IngredientName, Quantity) -> (RecipeID, IngredientLine)."""
+    intern = intern or Interner()
+    return lambda cursor, row: (row[0], IngredientLine(intern(row[1]), row[2]))
+
+def step_row(cursor, row):
+    """(RecipeID, StepNumber, StepDescription) -> (RecipeID, Step)."""
+    return row[0], Step(row[1], row[2])
+
+class RecipeColumns:
+    """
+    A batch of recipes stored column-wise. Recipe i's ingredient lines are
+    entries ingredient_offsets[i] to ingredient_offsets[i + 1] of the
+    ingredient columns, and likewise for its steps.
+    """
+
+    __slots__ = ('ids', 'names', 'descriptions',
+                 'ingredient_offsets', 'ingredient_names', 'ingredient_quantities',
+                 'step_offsets', 'step_numbers', 'step_descriptions')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.names = []
+        self.descriptions = []
+        self.ingredient_offsets = array('q', [0])
+        self.ingredient_names = []
+        self.ingredient_quantities = []
+        self.step_offsets = array('q', [0])
+        self.step_numbers = array('q')
+        self.step_descriptions = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def ingredients(self, i):
+        """Returns recipe i's ingredient lines as (name, quantity) pairs."""
+        start, end = self.ingredient_offsets[i], self.ingredient_offsets[i + 1]
+        return list(zip(self.ingredient_names[start:end], self.ingredient_quantities[start:end]))
+
+    def steps(self, i):
+        """Returns recipe i's steps as (step number, description) pairs."""
+        start, end = self.step_offsets[i], self.step_offsets[i + 1]
+        return list(zip(self.step_numbers[start:end], self.step_descriptions[start:end]))
+
+    def recipe(self, i):
+        """Returns recipe i as a Recipe."""
+        return Recipe(self.ids[i], self.names[i], self.descriptions[i],
+                      [IngredientLine(name, quantity) for name, quantity in self.ingredients(i)],
+                      [Step(number, description) for number, description in self.steps(i)])
+
+    def __iter__(self):
+        return (self.recipe(i) for i in range(len(self)))
+
+    @classmethod
+    def from_rows(cls, recipe_rows, ingredient_rows, step_rows):
+        """
+        Builds a batch from three row iterables, each ordered by the position of
+        its recipe in the batch: (position, RecipeID, RecipeName, Description),
+        (position, IngredientName, Quantity) and (position, StepNumber,
+        StepDescription). Positions need not be contiguous (positions without
+        a recipe row are skipped), but must be ascending.
+        """
+        columns = cls()
+        index = {}
+        for position, recipe_id, name, description in recipe_rows:
+            index[position] = len(columns.ids)
+            columns.ids.append(recipe_id)
+            columns.names.append(name)
+            columns.descriptions.append(description)
+        count = len(columns.ids)
+
+        intern = Interner()
+        ingredient_counts = array('q', bytes(8 * count))
+        for position, name, quantity in ingredient_rows:
+            ingredient_counts[index[position]] += 1
+            columns.ingredient_names.append(intern(name))
+            columns.ingredient_quantities.append(quantity)
+        step_counts = array('q', bytes(8 * count))
+        for position, number, description in step_rows:
+            step_counts[index[position]] += 1
+            columns.step_numbers.append(number)
+            columns.step_descriptions.append(description)
+
+        for counts, offsets in ((ingredient_counts, columns.ingredient_offsets), (step_counts, columns.step_offsets)):
+            total = 0
+            for n in counts:
+                total += n
+                offsets.append(total)
+        return columns
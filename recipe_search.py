@@ -0,0 +1,231 @@
+"""
+Full-text recipe search backed by an SQLite FTS5 index.
+
+RecipeSearch holds one row per recipe (rowid = RecipeID) with the recipe name,
+description, ingredient names and instruction text. Triggers on the base tables
+record the IDs of changed recipes in SearchIndexQueue, and sync_search_index()
+re-indexes just those recipes. The write paths in db_operations call it inside
+their own transactions, so the index is current as soon as a write commits.
+"""
+import re
+import sqlite3
+
+# Relative bm25 weights for the RecipeName, Description, Ingredients and Instructions columns.
+COLUMN_WEIGHTS = (10.0, 3.0, 5.0, 1.0)
+
+SEARCH_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS RecipeSearch USING fts5(
+        RecipeName, Description, Ingredients, Instructions,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS SearchIndexQueue (
+        RecipeID INTEGER PRIMARY KEY -- Recipes whose RecipeSearch row is out of date
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_recipes_insert AFTER INSERT ON Recipes BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (new.RecipeID);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_recipes_update AFTER UPDATE OF RecipeName, Description ON Recipes BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (new.RecipeID);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_recipes_delete AFTER DELETE ON Recipes BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (old.RecipeID);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_ingredients_update AFTER UPDATE OF IngredientName ON Ingredients BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID)
+        SELECT RecipeID FROM RecipeIngredients WHERE IngredientID = new.IngredientID;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_recipe_ingredients_insert AFTER INSERT ON RecipeIngredients BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (new.RecipeID);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_recipe_ingredients_update AFTER UPDATE ON RecipeIngredients BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (old.RecipeID);
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (new.RecipeID);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_recipe_ingredients_delete AFTER DELETE ON RecipeIngredients BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (old.RecipeID);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_instructions_insert AFTER INSERT ON Instructions BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (new.RecipeID);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_instructions_update AFTER UPDATE ON Instructions BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (old.RecipeID);
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (new.RecipeID);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_search_instructions_delete AFTER DELETE ON Instructions BEGIN
+        INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) VALUES (old.RecipeID);
+    END;
+    """,
+]
+
+# Builds index rows for every queued recipe with one grouped pass over each child table.
+_REINDEX_QUEUED_SQL = """
+    INSERT INTO RecipeSearch (rowid, RecipeName, Description, Ingredients, Instructions)
+    SELECT R.RecipeID, R.RecipeName, COALESCE(R.Description, ''), COALESCE(ING.Names, ''), COALESCE(STEPS.Texts, '')
+    FROM Recipes R
+    LEFT JOIN (
+        SELECT RI.RecipeID, group_concat(I.IngredientName, ' ') AS Names
+        FROM RecipeIngredients RI
+        JOIN Ingredients I ON RI.IngredientID = I.IngredientID
+        WHERE RI.RecipeID IN (SELECT RecipeID FROM SearchIndexQueue)
+        GROUP BY RI.RecipeID
+    ) ING ON ING.RecipeID = R.RecipeID
+    LEFT JOIN (
+        SELECT RecipeID, group_concat(StepDescription, ' ') AS Texts
+        FROM (
+            SELECT RecipeID, StepDescription FROM Instructions
+            WHERE RecipeID IN (SELECT RecipeID FROM SearchIndexQueue)
+            ORDER BY RecipeID, StepNumber
+        )
+        GROUP BY RecipeID
+    ) STEPS ON STEPS.RecipeID = R.RecipeID
+    WHERE R.RecipeID IN (SELECT RecipeID FROM SearchIndexQueue)
+"""
+
+SEARCH_MODES = ('all', 'any', 'prefix', 'phrase')
+
+# The per-row insert triggers a bulk writer may suspend in favour of record_bulk_insert().
+INSERT_TRIGGERS = ('trg_search_recipes_insert', 'trg_search_recipe_ingredients_insert', 'trg_search_instructions_insert')
+
+def create_search_index(conn):
+    """
+    Creates the FTS5 table, queue table and triggers if they are missing and
+    indexes every existing recipe. The caller commits.
+    Returns False if this SQLite build lacks FTS5.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'RecipeSearch'").fetchone()
+    try:
+        for statement in SEARCH_SCHEMA:
+            conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        if 'fts5' in str(e):
+            return False
+        raise
+    if not exists:
+        rebuild_search_index(conn)
+    return True
+
+def rebuild_search_index(conn):
+    """Re-indexes every recipe from scratch. Returns the number of recipes indexed."""
+    conn.execute("DELETE FROM SearchIndexQueue")
+    conn.execute("INSERT INTO SearchIndexQueue (RecipeID) SELECT RecipeID FROM Recipes")
+    conn.execute("DELETE FROM RecipeSearch")
+    return sync_search_index(conn)
+
+def record_bulk_insert(conn, recipe_ids, ingredient_ids):
+    """
+    Queues what INSERT_TRIGGERS would have queued for newly inserted recipes
+    (IDs recipe_ids[0]..recipe_ids[1], with their ingredient lines and steps),
+    in one statement. New ingredients queue nothing. Runs in the caller's transaction.
+    """
+    conn.execute("INSERT OR IGNORE INTO SearchIndexQueue (RecipeID) SELECT RecipeID FROM Recipes WHERE RecipeID BETWEEN ? AND ?",
+                 recipe_ids)
+
+def sync_search_index(conn):
+    """
+    Re-indexes the recipes queued by the triggers and clears the queue.
+    Runs in the caller's transaction; does nothing if the index has not been created.
+    Returns the number of recipes processed.
+    """
+    try:
+        queued = conn.execute("SELECT COUNT(*) FROM SearchIndexQueue").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0  # No search index in this database.
+    if not queued:
+        return 0
+    conn.execute("DELETE FROM RecipeSearch WHERE rowid IN (SELECT RecipeID FROM SearchIndexQueue)")
+    conn.execute(_REINDEX_QUEUED_SQL)
+    conn.execute("DELETE FROM SearchIndexQueue")
+    return queued
+
+def build_match_query(text, mode='all'):
+    """
+    Turns user input into an FTS5 MATCH expression.
+      all    - every term must appear (default)
+      any    - at least one term must appear
+      prefix - like 'all', but every term also matches as a word prefix
+      phrase - the whole input must appear as a phrase
+    In 'all' and 'any' mode, "double quoted" parts are kept together as phrases
+    and a trailing * makes a term a prefix match (e.g. choc*).
+    Returns None if the input has no searchable terms.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"unknown search mode '{mode}'")
+
+    if mode == 'phrase':
+        words = re.findall(r'\w+', text)
+        return '"' + ' '.join(words) + '"' if words else None
+
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        is_prefix = mode == 'prefix' or word.endswith('*')
+        words = re.findall(r'\w+', phrase or word)
+        if not words:
+            continue
+        term = '"' + ' '.join(words) + '"'
+        if is_prefix and not phrase:
+            term += '*'
+        terms.append(term)
+    if not terms:
+        return None
+    return (' OR ' if mode == 'any' else ' ').join(terms)
+
+def search_recipes(conn, text, mode='all', limit=20, highlight=('[', ']')):
+    """
+    Runs a ranked full-text search over recipe names, descriptions, ingredients and instructions.
+    Returns a list of dicts with 'id', 'name', 'score' (higher is better) and
+    'snippet' (the best matching fragment with matches wrapped in `highlight`).
+    """
+    match = build_match_query(text, mode)
+    if match is None:
+        return []
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+    cursor = conn.execute(f"""
+        SELECT rowid AS RecipeID, RecipeName,
+               bm25(RecipeSearch, {weights}) AS Rank,
+               snippet(RecipeSearch, -1, ?, ?, '...', 12) AS Snippet
+        FROM RecipeSearch
+        WHERE RecipeSearch MATCH ?
+        ORDER BY Rank
+        LIMIT ?
+    """, (highlight[0], highlight[1], match, limit))
+    return [{'id': row[0], 'name': row[1], 'score': -row[2], 'snippet': row[3]} for row in cursor.fetchall()]
+
+if __name__ == '__main__':
+    import sys
+    import database_setup
+
+    conn = sqlite3.connect(database_setup.DATABASE_FILE)
+    if not create_search_index(conn):
+        print("This SQLite build does not include FTS5.")
+    elif '--rebuild' in sys.argv:
+        count = rebuild_search_index(conn)
+        print(f"Indexed {count} recipes.")
+    else:
+        print("Search index is ready. Run with --rebuild to re-index every recipe.")
+    conn.commit()
+    conn.close()
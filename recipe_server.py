@@ -0,0 +1,386 @@
+"""
+Long-running JSON API over db_operations, for callers that would otherwise pay
+for interpreter start-up, imports and connection setup on every invocation.
+
+The server keeps everything warm between requests: pooled connections (with
+their prepared-statement caches), the read cache, the in-memory pantry and name
+indexes, and optionally the in-memory read replica. Requests are handled on
+one thread each; writes are serialized through a lock, since SQLite only
+allows one writer at a time. It uses only the standard library and listens on
+localhost or a Unix socket, never anything public by default.
+
+Every response carries a Server-Timing header with the time spent in SQL
+(and the number of statements), in the handler, and in total:
+
+    Server-Timing: sql;dur=0.412;desc="3 statements", app;dur=0.655, total;dur=0.702
+
+Endpoints (all JSON):
+    GET  /recipes?limit=20&after=CURSOR     one page of recipes in name order
+    GET  /recipes/search?name=TEXT          recipes whose name contains TEXT
+    GET  /search?q=QUERY&mode=all&limit=20  ranked full-text search
+    GET  /pantry?have=a,b,c&max_missing=0   recipes you can cook from a pantry
+    GET  /recipes/ID                        recipe details
+    GET  /recipes/ID/similar?limit=5        similar recipes
+    POST /recipes                           add a recipe ({"name", "description", "ingredients", "instructions"})
+    POST /recipes/details                   details of many recipes ({"ids": [...]})
+    POST /recipes/bulk                      add many recipes in batched transactions ({"recipes": [...]})
+    POST /batch                             several requests in one round trip ({"requests": [{"method", "path", "body"}]})
+    GET  /stats                             operation timers, cache, pool and replica stats
+
+With --snapshot, a stateless read node serves the recipe list, name search and
+details from a memory-mapped catalog snapshot (see catalog_snapshot.py)
+instead of the database; the other endpoints answer 501.
+
+Usage:
+    python recipe_server.py [--port 8080] [--socket /tmp/recipes.sock] [--replica]
+    python recipe_server.py --snapshot catalog.snap [--port 8080]
+"""
+import argparse
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import database_setup
+import db_operations
+import instrumentation
+import recipe_search
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8080
+MAX_BODY_BYTES = 64 * 1024 * 1024
+MAX_LIMIT = 1000         # Largest ?limit= a read endpoint accepts
+MAX_BATCH_SIZE = 100000  # Largest ?batch_size= for bulk adds
+
+class ApiError(Exception):
+    """Raised by handlers to answer with an HTTP error status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+_write_lock = threading.Lock()
+
+# What the list, name search and details endpoints read from: db_operations, or a CatalogSnapshot (use_snapshot()).
+_catalog = db_operations
+
+def _int_param(query, name, default, minimum=None, maximum=None):
+    value = query.get(name, [None])[0]
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be an integer")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        bounds = f"at least {minimum}" if maximum is None else f"between {minimum} and {maximum}"
+        raise ApiError(400, f"'{name}' must be {bounds}")
+    return value
+
+def _limit(query, default):
+    return _int_param(query, 'limit', default, minimum=1, maximum=MAX_LIMIT)
+
+def _recipe_id(text):
+    try:
+        return int(text)
+    except ValueError:
+        raise ApiError(404, f"no such resource: /recipes/{text}")
+
+def list_recipes(query, body):
+    after = query.get('after', [None])[0]
+    if after is not None:
+        try:
+            name, recipe_id = json.loads(after)
+            after = (name, int(recipe_id))
+        except (ValueError, TypeError):
+            raise ApiError(400, "invalid 'after' cursor")
+    rows, cursor = _catalog.list_recipes_page(_limit(query, 20), after)
+    return {'recipes': [{'id': recipe_id, 'name': name} for recipe_id, name in rows],
+            'next': json.dumps(cursor) if cursor else None}
+
+def search_by_name(query, body):
+    name = query.get('name', [''])[0]
+    return {'recipes': [{'id': recipe_id, 'name': recipe_name}
+                        for recipe_id, recipe_name in _catalog.search_recipe_by_name(name)]}
+
+def full_text_search(query, body):
+    text = query.get('q', [''])[0]
+    mode = query.get('mode', ['all'])[0]
+    if mode not in recipe_search.SEARCH_MODES:
+        raise ApiError(400, f"'mode' must be one of {', '.join(recipe_search.SEARCH_MODES)}")
+    return {'results': db_operations.search_recipes(text, mode=mode, limit=_limit(query, 20))}
+
+def pantry(query, body):
+    have = [name.strip() for name in query.get('have', [''])[0].split(',') if name.strip()]
+    return db_operations.find_recipes_by_pantry(have, max_missing=_int_param(query, 'max_missing', 0, minimum=0),
+                                                limit=_limit(query, 20))
+
+def recipe_details(query, body, recipe_id):
+    details = _catalog.get_recipe_details(_recipe_id(recipe_id))
+    if details is None:
+        raise ApiError(404, f"recipe {recipe_id} not found")
+    return details
+
+def similar(query, body, recipe_id):
+    return {'similar': db_operations.get_similar_recipes(_recipe_id(recipe_id), limit=_limit(query, 5))}
+
+def _check_recipe_body(body):
+    """Raises ApiError(400) unless `body` has the shape add_recipe takes."""
+    if not isinstance(body, dict) or not isinstance(body.get('name'), str) or not body['name'].strip():
+        raise ApiError(400, "body must be a recipe object with a 'name'")
+    if not isinstance(body.get('description'), (str, type(None))):
+        raise ApiError(400, "'description' must be a string")
+    ingredients = body.get('ingredients') or []
+    if not isinstance(ingredients, list) or not all(
+            isinstance(entry, dict) and all(isinstance(entry.get(key), str) and entry[key].strip()
+                                            for key in ('name', 'quantity'))
+            for entry in ingredients):
+        raise ApiError(400, "'ingredients' must be a list of {\"name\", \"quantity\"} objects with string values")
+    instructions = body.get('instructions') or []
+    if not isinstance(instructions, list) or not all(isinstance(step, str) for step in instructions):
+        raise ApiError(400, "'instructions' must be a list of strings")
+
+def add_recipe(query, body):
+    _check_recipe_body(body)
+    with _write_lock:
+        recipe_id = db_operations.add_recipe(body['name'], body.get('description'),
+                                             body.get('ingredients') or [], body.get('instructions') or [])
+    if recipe_id is None:
+        raise ApiError(409, f"recipe '{body['name']}' could not be added (it might already exist)")
+    return {'id': recipe_id}
+
+def details_many(query, body):
+    ids = body.get('ids') if isinstance(body, dict) else None
+    if not isinstance(ids, list):
+        raise ApiError(400, "body must be {\"ids\": [...]}")
+    try:
+        found = _catalog.get_recipe_details_many(ids)
+    except (TypeError, ValueError):
+        raise ApiError(400, "recipe IDs must be integers")
+    return {'recipes': list(found.values())}
+
+def add_recipes_bulk(query, body):
+    recipes = body.get('recipes') if isinstance(body, dict) else None
+    if not isinstance(recipes, list):
+        raise ApiError(400, "body must be {\"recipes\": [...]}")
+    batch_size = _int_param(query, 'batch_size', 1000, minimum=1, maximum=MAX_BATCH_SIZE)
+    with _write_lock:
+        summary = db_operations.add_recipes_bulk(recipes, batch_size=batch_size)
+    return {'added': summary['added'], 'rejected': summary['rejected'], 'seconds': summary['seconds']}
+
+def batch(query, body):
+    requests = body.get('requests') if isinstance(body, dict) else None
+    if not isinstance(requests, list):
+        raise ApiError(400, "body must be {\"requests\": [...]}")
+    responses = []
+    for request in requests:
+        if not isinstance(request, dict):
+            responses.append({'status': 400, 'body': {'error': "each request must be an object"}})
+            continue
+        method, path = request.get('method', 'GET'), request.get('path', '')
+        if not isinstance(method, str) or not isinstance(path, str):
+            responses.append({'status': 400, 'body': {'error': "method and path must be strings"}})
+            continue
+        status, result = dispatch(method, path, request.get('body'), nested=True)
+        responses.append({'status': status, 'body': result})
+    return {'responses': responses}
+
+def stats(query, body):
+    if _catalog is not db_operations:
+        return {'metrics': instrumentation.metrics.snapshot(), 'snapshot': _catalog.info()}
+    return {
+        'metrics': instrumentation.metrics.snapshot(),
+        'cache': db_operations.cache_stats(),
+        'pool': db_operations.get_pool().stats(),
+        'replica': db_operations.replica_stats(),
+    }
+
+# (method, path segments) -> handler; '*' matches one segment, passed to the handler.
+ROUTES = {
+    ('GET', ('recipes',)): list_recipes,
+    ('GET', ('recipes', 'search')): search_by_name,
+    ('GET', ('search',)): full_text_search,
+    ('GET', ('pantry',)): pantry,
+    ('GET', ('recipes', '*')): recipe_details,
+    ('GET', ('recipes', '*', 'similar')): similar,
+    ('POST', ('recipes',)): add_recipe,
+    ('POST', ('recipes', 'details')): details_many,
+    ('POST', ('recipes', 'bulk')): add_recipes_bulk,
+    ('POST', ('batch',)): batch,
+    ('GET', ('stats',)): stats,
+}
+
+# The endpoints a catalog snapshot can answer.
+SNAPSHOT_HANDLERS = {list_recipes, search_by_name, recipe_details, details_many, batch, stats}
+
+def _route(method, segments):
+    """Returns (handler, wildcard values) for a request, preferring literal segments over '*'."""
+    matches = []
+    for (route_method, pattern), handler in ROUTES.items():
+        if len(pattern) == len(segments) and all(p in ('*', s) for p, s in zip(pattern, segments)):
+            args = [s for p, s in zip(pattern, segments) if p == '*']
+            matches.append((len(args), route_method, handler, args))
+    allowed = sorted((match for match in matches if match[1] == method), key=lambda match: match[0])
+    if allowed:
+        return allowed[0][2], allowed[0][3]
+    if matches:
+        raise ApiError(405, f"{method} is not allowed here")
+    raise ApiError(404, "no such resource")
+
+def dispatch(method, path, body, nested=False):
+    """
+    Runs one API request. Returns (HTTP status, JSON-serializable result).
+    nested: True for a sub-request of /batch, which may not be another /batch.
+    """
+    try:
+        url = urlsplit(path)
+        segments = tuple(segment for segment in url.path.split('/') if segment)
+        handler, args = _route(method.upper(), segments)
+        if nested and handler is batch:
+            raise ApiError(400, "batch requests cannot be nested")
+        if _catalog is not db_operations and handler not in SNAPSHOT_HANDLERS:
+            raise ApiError(501, "not available when serving a catalog snapshot")
+        return 200, handler(parse_qs(url.query), body, *args)
+    except ApiError as e:
+        return e.status, {'error': str(e)}
+    except Exception:
+        logger.exception("Error handling %s %s", method, path)
+        return 500, {'error': "internal server error"}
+
+class RecipeRequestHandler(BaseHTTPRequestHandler):
+    """Decodes JSON requests, dispatches them and adds the Server-Timing header."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so clients reuse their connection.
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't delay the second.
+    server_version = 'RecipeServer/1.0'
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        started = time.perf_counter()
+        instrumentation.begin_request()
+        status, result = self._read_body()
+        if status is None:
+            status, result = dispatch(self.command, self.path, result)
+        app_seconds = time.perf_counter() - started
+        payload = json.dumps(result, default=str).encode('utf-8')
+        totals = instrumentation.request_totals()
+        total_seconds = time.perf_counter() - started
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Server-Timing',
+                         f'sql;dur={totals["sql_seconds"] * 1000:.3f};desc="{totals["statements"]} statements", '
+                         f'app;dur={app_seconds * 1000:.3f}, total;dur={total_seconds * 1000:.3f}')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        """Returns (None, parsed JSON body or None), or (error status, error result)."""
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return 413, {'error': "request body too large"}
+        if not length:
+            return None, None
+        try:
+            return None, json.loads(self.rfile.read(length))
+        except (ValueError, UnicodeDecodeError) as e:
+            return 400, {'error': f"invalid JSON body: {e}"}
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ThreadingHTTPServer's Unix-socket counterpart."""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)  # Left behind by a server that didn't shut down cleanly.
+        super().server_bind()
+
+def warm_up(cache_entries=10000, replica=False, max_connections=8):
+    """
+    Prepares the database layer for serving: upgrades the schema, sizes the
+    connection pool, turns on the read cache (and the read replica if asked)
+    and loads the in-memory pantry and name indexes before the first request.
+    """
+    database_setup.upgrade_database(db_operations.DATABASE_FILE)
+    db_operations.configure_pool(max_connections=max_connections)
+    db_operations.enable_cache(max_entries=cache_entries)
+    if replica:
+        db_operations.enable_read_replica()
+    started = time.perf_counter()
+    db_operations.find_recipes_by_pantry([])
+    db_operations.suggest_recipes('')
+    db_operations.list_recipes_page(1)
+    logger.info("Warmed up in %.0f ms", (time.perf_counter() - started) * 1000)
+
+def use_snapshot(path):
+    """Serves reads from the catalog snapshot at `path` instead of the database. Returns the snapshot."""
+    import catalog_snapshot
+
+    global _catalog
+    _catalog = catalog_snapshot.CatalogSnapshot(path)
+    logger.info("Serving catalog snapshot %s (%d recipes)", path, len(_catalog))
+    return _catalog
+
+def make_server(host='127.0.0.1', port=DEFAULT_PORT, socket_path=None):
+    """Creates (without starting) a threaded server on host:port, or on a Unix socket if socket_path is given."""
+    if socket_path:
+        return UnixHTTPServer(socket_path, RecipeRequestHandler)
+    server = ThreadingHTTPServer((host, port), RecipeRequestHandler)
+    server.daemon_threads = True
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the recipe database as a local JSON API.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: localhost only)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--replica', action='store_true', help="serve reads from the in-memory read replica")
+    parser.add_argument('--snapshot', help="serve reads only, from this catalog snapshot (no database needed)")
+    parser.add_argument('--max-connections', type=int, default=8, help="size of the connection pool")
+    parser.add_argument('--log-level', default=os.environ.get('RECIPE_LOG_LEVEL', 'INFO'))
+    args = parser.parse_args(argv)
+
+    instrumentation.configure_logging(args.log_level)
+    if args.snapshot:
+        use_snapshot(args.snapshot)
+    else:
+        warm_up(replica=args.replica, max_connections=args.max_connections)
+    server = make_server(args.host, args.port, args.socket)
+    where = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving recipes on {where} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+        if _catalog is not db_operations:
+            _catalog.close()
+        db_operations.disable_read_replica()
+        db_operations.close_pool()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+Materialized catalog statistics, kept current by triggers.
+
+* IngredientUsage: how many recipes use each ingredient (indexed by count, so
+  "most-used ingredients" reads the top of an index instead of aggregating
+  RecipeIngredients).
+* RecipeStats: each recipe's ingredient and step counts.
+* CatalogStats: one row of table totals, from which averages such as steps per
+  recipe follow without a scan.
+
+The triggers adjust the counts by one for every row inserted into, deleted
+from or moved between recipes in RecipeIngredients and Instructions, so every
+writer (db_operations, the maintenance jobs, plain SQL) keeps them in step in
+the same transaction. verify_stats() recomputes everything from the base tables
+and reports differences; rebuild_stats() replaces the stored counts.
+
+    python recipe_stats.py --verify
+    python recipe_stats.py --rebuild
+"""
+import sqlite3
+
+STATS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS IngredientUsage (
+        IngredientID INTEGER PRIMARY KEY,
+        RecipeCount INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_ingredient_usage_count ON IngredientUsage (RecipeCount DESC, IngredientID);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RecipeStats (
+        RecipeID INTEGER PRIMARY KEY,
+        IngredientCount INTEGER NOT NULL DEFAULT 0,
+        StepCount INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CatalogStats (
+        Id INTEGER PRIMARY KEY CHECK (Id = 1),
+        Recipes INTEGER NOT NULL DEFAULT 0,
+        Ingredients INTEGER NOT NULL DEFAULT 0,
+        IngredientLinks INTEGER NOT NULL DEFAULT 0,
+        Steps INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+    "INSERT OR IGNORE INTO CatalogStats (Id) VALUES (1);",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_recipes_insert AFTER INSERT ON Recipes BEGIN
+        INSERT OR IGNORE INTO RecipeStats (RecipeID) VALUES (new.RecipeID);
+        UPDATE CatalogStats SET Recipes = Recipes + 1 WHERE Id = 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_recipes_delete AFTER DELETE ON Recipes BEGIN
+        DELETE FROM RecipeStats WHERE RecipeID = old.RecipeID;
+        UPDATE CatalogStats SET Recipes = Recipes - 1 WHERE Id = 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_ingredients_insert AFTER INSERT ON Ingredients BEGIN
+        INSERT OR IGNORE INTO IngredientUsage (IngredientID) VALUES (new.IngredientID);
+        UPDATE CatalogStats SET Ingredients = Ingredients + 1 WHERE Id = 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_ingredients_delete AFTER DELETE ON Ingredients BEGIN
+        DELETE FROM IngredientUsage WHERE IngredientID = old.IngredientID;
+        UPDATE CatalogStats SET Ingredients = Ingredients - 1 WHERE Id = 1;
+    END;
+    """,
+    # Decrements use plain UPDATEs: when a recipe is deleted its ingredient lines
+    # cascade, and its RecipeStats row may already be gone.
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_recipe_ingredients_insert AFTER INSERT ON RecipeIngredients BEGIN
+        UPDATE IngredientUsage SET RecipeCount = RecipeCount + 1 WHERE IngredientID = new.IngredientID;
+        UPDATE RecipeStats SET IngredientCount = IngredientCount + 1 WHERE RecipeID = new.RecipeID;
+        UPDATE CatalogStats SET IngredientLinks = IngredientLinks + 1 WHERE Id = 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_recipe_ingredients_update
+    AFTER UPDATE OF RecipeID, IngredientID ON RecipeIngredients BEGIN
+        UPDATE IngredientUsage SET RecipeCount = RecipeCount - 1 WHERE IngredientID = old.IngredientID;
+        UPDATE IngredientUsage SET RecipeCount = RecipeCount + 1 WHERE IngredientID = new.IngredientID;
+        UPDATE RecipeStats SET IngredientCount = IngredientCount - 1 WHERE RecipeID = old.RecipeID;
+        UPDATE RecipeStats SET IngredientCount = IngredientCount + 1 WHERE RecipeID = new.RecipeID;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_recipe_ingredients_delete AFTER DELETE ON RecipeIngredients BEGIN
+        UPDATE IngredientUsage SET RecipeCount = RecipeCount - 1 WHERE IngredientID = old.IngredientID;
+        UPDATE RecipeStats SET IngredientCount = IngredientCount - 1 WHERE RecipeID = old.RecipeID;
+        UPDATE CatalogStats SET IngredientLinks = IngredientLinks - 1 WHERE Id = 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_instructions_insert AFTER INSERT ON Instructions BEGIN
+        UPDATE RecipeStats SET StepCount = StepCount + 1 WHERE RecipeID = new.RecipeID;
+        UPDATE CatalogStats SET Steps = Steps + 1 WHERE Id = 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_instructions_update AFTER UPDATE OF RecipeID ON Instructions BEGIN
+        UPDATE RecipeStats SET StepCount = StepCount - 1 WHERE RecipeID = old.RecipeID;
+        UPDATE RecipeStats SET StepCount = StepCount + 1 WHERE RecipeID = new.RecipeID;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_stats_instructions_delete AFTER DELETE ON Instructions BEGIN
+        UPDATE RecipeStats SET StepCount = StepCount - 1 WHERE RecipeID = old.RecipeID;
+        UPDATE CatalogStats SET Steps = Steps - 1 WHERE Id = 1;
+    END;
+    """,
+]
+
+# What the stored counts should be, computed from the base tables.
+_EXPECTED_INGREDIENT_USAGE_SQL = """
+    SELECT I.IngredientID, COUNT(RI.RecipeID)
+    FROM Ingredients I LEFT JOIN RecipeIngredients RI ON RI.IngredientID = I.IngredientID
+    GROUP BY I.IngredientID
+"""
+_EXPECTED_RECIPE_STATS_SQL = """
+    SELECT R.RecipeID,
+           (SELECT COUNT(*) FROM RecipeIngredients RI WHERE RI.RecipeID = R.RecipeID),
+           (SELECT COUNT(*) FROM Instructions S WHERE S.RecipeID = R.RecipeID)
+    FROM Recipes R
+"""
+_EXPECTED_CATALOG_STATS_SQL = """
+    SELECT 1, (SELECT COUNT(*) FROM Recipes), (SELECT COUNT(*) FROM Ingredients),
+           (SELECT COUNT(*) FROM RecipeIngredients), (SELECT COUNT(*) FROM Instructions)
+"""
+
+# (table, key column, expected rows, stored rows); rows in one set but not the other are mismatches.
+_CHECKS = [
+    ('IngredientUsage', 'IngredientID', _EXPECTED_INGREDIENT_USAGE_SQL,
+     "SELECT IngredientID, RecipeCount FROM IngredientUsage"),
+    ('RecipeStats', 'RecipeID', _EXPECTED_RECIPE_STATS_SQL,
+     "SELECT RecipeID, IngredientCount, StepCount FROM RecipeStats"),
+    ('CatalogStats', 'Id', _EXPECTED_CATALOG_STATS_SQL,
+     "SELECT Id, Recipes, Ingredients, IngredientLinks, Steps FROM CatalogStats"),
+]
+
+# The per-row insert triggers a bulk writer may suspend in favour of record_bulk_insert().
+INSERT_TRIGGERS = ('trg_stats_recipes_insert', 'trg_stats_ingredients_insert',
+                   'trg_stats_recipe_ingredients_insert', 'trg_stats_instructions_insert')
+
+# Statements with the combined effect of INSERT_TRIGGERS for a range of new
+# recipes (with their ingredient lines and steps) and a range of new ingredients.
+_BULK_INSERT_STATEMENTS = [
+    "INSERT OR IGNORE INTO IngredientUsage (IngredientID) SELECT IngredientID FROM Ingredients WHERE IngredientID BETWEEN :first_ingredient AND :last_ingredient",
+    """
+    UPDATE IngredientUsage SET RecipeCount = RecipeCount + New.Uses
+    FROM (SELECT IngredientID, COUNT(*) AS Uses FROM RecipeIngredients
+          WHERE RecipeID BETWEEN :first_recipe AND :last_recipe GROUP BY IngredientID) AS New
+    WHERE IngredientUsage.IngredientID = New.IngredientID
+    """,
+    "INSERT OR IGNORE INTO RecipeStats (RecipeID) SELECT RecipeID FROM Recipes WHERE RecipeID BETWEEN :first_recipe AND :last_recipe",
+    """
+    UPDATE RecipeStats SET
+        IngredientCount = IngredientCount + (SELECT COUNT(*) FROM RecipeIngredients RI WHERE RI.RecipeID = RecipeStats.RecipeID),
+        StepCount = StepCount + (SELECT COUNT(*) FROM Instructions S WHERE S.RecipeID = RecipeStats.RecipeID)
+    WHERE RecipeID BETWEEN :first_recipe AND :last_recipe
+    """,
+    """
+    UPDATE CatalogStats SET
+        Recipes = Recipes + (SELECT COUNT(*) FROM Recipes WHERE RecipeID BETWEEN :first_recipe AND :last_recipe),
+        Ingredients = Ingredients + (SELECT COUNT(*) FROM Ingredients WHERE IngredientID BETWEEN :first_ingredient AND :last_ingredient),
+        IngredientLinks = IngredientLinks + (SELECT COUNT(*) FROM RecipeIngredients WHERE RecipeID BETWEEN :first_recipe AND :last_recipe),
+        Steps = Steps + (SELECT COUNT(*) FROM Instructions WHERE RecipeID BETWEEN :first_recipe AND :last_recipe)
+    WHERE Id = 1
+    """,
+]
+
+def create_stats_tables(conn):
+    """
+    Creates the statistics tables and triggers if they are missing and fills
+    them from the existing rows. The caller commits.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'CatalogStats'").fetchone()
+    for statement in STATS_SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild_stats(conn)
+
+def record_bulk_insert(conn, recipe_ids, ingredient_ids):
+    """
+    Applies what INSERT_TRIGGERS would have counted for newly inserted recipes
+    (IDs recipe_ids[0]..recipe_ids[1], with their ingredient lines and steps) and
+    ingredients (ingredient_ids[0]..ingredient_ids[1]) with a few set-based
+    statements instead of several updates per row. Runs in the caller's transaction.
+    """
+    params = {'first_recipe': recipe_ids[0], 'last_recipe': recipe_ids[1],
+              'first_ingredient': ingredient_ids[0], 'last_ingredient': ingredient_ids[1]}
+    for statement in _BULK_INSERT_STATEMENTS:
+        conn.execute(statement, params)
+
+def rebuild_stats(conn):
+    """Recomputes every stored count from the base tables. Returns the number of recipes counted."""
+    conn.execute("DELETE FROM IngredientUsage")
+    conn.execute(f"INSERT INTO IngredientUsage (IngredientID, RecipeCount) {_EXPECTED_INGREDIENT_USAGE_SQL}")
+    conn.execute("DELETE FROM RecipeStats")
+    conn.execute(f"INSERT INTO RecipeStats (RecipeID, IngredientCount, StepCount) {_EXPECTED_RECIPE_STATS_SQL}")
+    conn.execute("DELETE FROM CatalogStats")
+    conn.execute(f"INSERT INTO CatalogStats (Id, Recipes, Ingredients, IngredientLinks, Steps) {_EXPECTED_CATALOG_STATS_SQL}")
+    return conn.execute("SELECT Recipes FROM CatalogStats").fetchone()[0]
+
+def verify_stats(conn, limit=20):
+    """
+    Compares the stored counts with counts recomputed from the base tables.
+    Returns a list of up to `limit` mismatches per table as dicts with 'table',
+    'key', 'expected' and 'stored' (None for a missing or extra row); empty if all agree.
+    """
+    mismatches = []
+    for table, key, expected_sql, stored_sql in _CHECKS:
+        expected = {row[0]: tuple(row[1:]) for row in conn.execute(expected_sql)}
+        stored = {row[0]: tuple(row[1:]) for row in conn.execute(stored_sql)}
+        differing = [k for k in expected.keys() | stored.keys() if expected.get(k) != stored.get(k)]
+        for k in sorted(differing)[:limit]:
+            mismatches.append({'table': table, 'key': f"{key}={k}", 'expected': expected.get(k), 'stored': stored.get(k)})
+    return mismatches
+
+def catalog_stats(conn, top=10):
+    """
+    Reads the materialized statistics. Returns a dict with the 'recipes',
+    'ingredients', 'ingredient_links' and 'steps' totals, the average
+    ingredients and steps per recipe, and 'top_ingredients': the `top`
+    most-used ingredients as dicts with 'id', 'name' and 'recipes'.
+    """
+    recipes, ingredients, links, steps = conn.execute(
+        "SELECT Recipes, Ingredients, IngredientLinks, Steps FROM CatalogStats WHERE Id = 1").fetchone()
+    cursor = conn.execute("""
+        SELECT U.IngredientID, I.IngredientName, U.RecipeCount
+        FROM IngredientUsage U JOIN Ingredients I ON I.IngredientID = U.IngredientID
+        ORDER BY U.RecipeCount DESC, U.IngredientID
+        LIMIT ?
+    """, (top,))
+    return {
+        'recipes': recipes,
+        'ingredients': ingredients,
+        'ingredient_links': links,
+        'steps': steps,
+        'avg_ingredients_per_recipe': links / recipes if recipes else 0.0,
+        'avg_steps_per_recipe': steps / recipes if recipes else 0.0,
+        'top_ingredients': [{'id': row[0], 'name': row[1], 'recipes': row[2]} for row in cursor.fetchall()],
+    }
+
+if __name__ == '__main__':
+    import sys
+    import database_setup
+
+    conn = sqlite3.connect(database_setup.DATABASE_FILE)
+    create_stats_tables(conn)
+    if '--rebuild' in sys.argv:
+        count = rebuild_stats(conn)
+        print(f"Recomputed statistics for {count} recipes.")
+    elif '--verify' in sys.argv:
+        mismatches = verify_stats(conn)
+        for mismatch in mismatches:
+            print(f"{mismatch['table']} {mismatch['key']}: stored {mismatch['stored']}, expected {mismatch['expected']}")
+        print("Statistics are up to date." if not mismatches else
+              f"{len(mismatches)} mismatches found. Run with --rebuild to recompute them.")
+        conn.close()
+        sys.exit(1 if mismatches else 0)
+    else:
+        print("Statistics tables are ready. Run with --verify to check them or --rebuild to recompute them.")
+    conn.commit()
+    conn.close()
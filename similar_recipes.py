@@ -0,0 +1,405 @@
+"""
+"Recipes like this one": precomputed nearest neighbours by ingredient overlap.
+
+Each recipe is a row of the sparse recipe x ingredient matrix, i.e. its set of
+IngredientIDs in RecipeIngredients. Two recipes score by the Jaccard
+(|A & B| / |A | B|) or cosine (|A & B| / sqrt(|A| * |B|)) similarity of their
+sets, and each recipe's `top_k` best matches are stored in SimilarRecipes, so
+showing them is one short index range read whatever the size of the catalog.
+
+Scoring every pair would be quadratic, so candidates come from MinHash/LSH.
+Each set is summarized by NUM_BANDS x ROWS_PER_BAND min-hashes, and every band
+of ROWS_PER_BAND values is hashed to a bucket. Two recipes land in the same
+bucket of a band with probability J ** ROWS_PER_BAND (J being their Jaccard
+similarity), so a pair with J = 0.5 shares at least one of the 16 buckets 87% of
+the time, one with J = 0.3 35% and one with J = 0.1 only 1.6% of the time.
+Only recipes sharing a bucket are scored exactly. On the bundled synthetic
+catalog the stored best match is the true best (by brute force) for about
+half of the recipes and scores within 0.02 of it on average.
+
+A catalog of up to EXACT_LIMIT recipes skips LSH: every pair of recipes with an
+ingredient in common is scored, so no neighbour is missed (the sample recipes'
+Jaccard 0.4 pairs would share a bucket only 65% of the time), at a cost that is
+still small at that size. Buckets are stored either way, so the index carries
+on with LSH once the catalog grows past the limit.
+
+The buckets are stored in RecipeSignatureBands. sync_similar_recipes() places
+recipes added since the last sync with a few indexed queries each (finding
+their neighbours and entering them into their neighbours' lists) and runs in the
+writer's transaction, like recipe_search.sync_search_index(): add_recipe runs
+it for every recipe, so its cost depends on the new recipe and its buckets, not
+on the catalog size. add_recipes_bulk runs it once after the whole import, and
+rebuilds instead if that import is more than REBUILD_FRACTION of the catalog.
+rebuild_similar_recipes() recomputes everything in memory, one band at a time.
+
+Usage:
+    python similar_recipes.py --rebuild [--metric cosine] [--top-k 10]
+    python similar_recipes.py --recipe 42
+"""
+import bisect
+import json
+import math
+import random
+import sqlite3
+from array import array
+
+NUM_BANDS = 16
+ROWS_PER_BAND = 3
+TOP_K = 10
+BUCKET_WINDOW = 20       # Per bucket, a recipe is compared with at most this many members on either side
+                         # in RecipeID order, so buckets of recipes sharing staples like salt stay cheap
+REBUILD_FRACTION = 0.25  # After a bulk import, rebuild instead when more of the catalog than this is new
+EXACT_LIMIT = 1000       # Catalogs up to this many recipes are scored pair by pair instead of through LSH
+
+_PRIME = (1 << 61) - 1  # Hash arithmetic stays below 2**63, so buckets fit in an SQLite INTEGER
+
+SIMILARITY_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS SimilarRecipes (
+        RecipeID INTEGER NOT NULL REFERENCES Recipes (RecipeID) ON DELETE CASCADE,
+        SimilarRecipeID INTEGER NOT NULL,
+        Score REAL NOT NULL,
+        PRIMARY KEY (RecipeID, SimilarRecipeID)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS RecipeSignatureBands (
+        Bucket INTEGER NOT NULL,
+        RecipeID INTEGER NOT NULL,
+        PRIMARY KEY (Bucket, RecipeID)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS SimilarityState (
+        Id INTEGER PRIMARY KEY CHECK (Id = 1),
+        LastRecipeID INTEGER NOT NULL,  -- Recipes up to this ID have been placed
+        Metric TEXT NOT NULL,
+        TopK INTEGER NOT NULL
+    )
+    """,
+)
+
+def _jaccard(shared, size_a, size_b):
+    return shared / (size_a + size_b - shared)
+
+def _cosine(shared, size_a, size_b):
+    return shared / math.sqrt(size_a * size_b)
+
+METRICS = {'jaccard': _jaccard, 'cosine': _cosine}
+
+class MinHasher:
+    """MinHash signatures and LSH band buckets for sets of IngredientIDs."""
+
+    def __init__(self, num_bands=NUM_BANDS, rows_per_band=ROWS_PER_BAND, seed=4480):
+        rng = random.Random(seed)  # Fixed, so buckets stored by one run match the next.
+        self.num_bands = num_bands
+        self.rows_per_band = rows_per_band
+        self._coefficients = [(rng.randrange(1, _PRIME), rng.randrange(_PRIME))
+                              for _ in range(num_bands * rows_per_band)]
+        self._hashes = {}  # IngredientID -> tuple of its value under each hash function
+
+    def _ingredient_hashes(self, ingredient_id):
+        hashes = self._hashes.get(ingredient_id)
+        if hashes is None:
+            hashes = self._hashes[ingredient_id] = tuple((a * ingredient_id + b) % _PRIME
+                                                         for a, b in self._coefficients)
+        return hashes
+
+    def signature(self, ingredient_ids):
+        """The minimum of each hash function over the set (ingredient_ids must not be empty)."""
+        return tuple(map(min, zip(*map(self._ingredient_hashes, ingredient_ids))))
+
+    def buckets(self, ingredient_ids):
+        """The set's bucket in each band. The band number is hashed in, so bands never share buckets."""
+        signature = self.signature(ingredient_ids)
+        buckets = []
+        for band in range(self.num_bands):
+            bucket = band + 1
+            for value in signature[band * self.rows_per_band:(band + 1) * self.rows_per_band]:
+                bucket = (bucket * 1000003 + value) % _PRIME
+            buckets.append(bucket)
+        return buckets
+
+_hasher = MinHasher()
+
+def _offer(neighbours, other_id, score, top_k):
+    """
+    Adds other_id to a best-first list of (-score, RecipeID) holding at most top_k
+    entries. Returns True if the list changed.
+    """
+    if len(neighbours) >= top_k and (-score, other_id) >= neighbours[-1]:
+        return False
+    for _, existing in neighbours:
+        if existing == other_id:
+            return False  # Already scored through another band.
+    bisect.insort(neighbours, (-score, other_id))
+    del neighbours[top_k:]
+    return True
+
+def create_similarity_index(conn):
+    """Creates the tables if they are missing and fills them from the existing recipes. The caller commits."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'SimilarityState'").fetchone()
+    for statement in SIMILARITY_SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        return rebuild_similar_recipes(conn)
+    return 0
+
+def _state(conn):
+    """Returns (LastRecipeID, metric, top_k), or None if this database has no similarity index."""
+    try:
+        return conn.execute("SELECT LastRecipeID, Metric, TopK FROM SimilarityState").fetchone()
+    except sqlite3.OperationalError:
+        return None
+
+def rebuild_similar_recipes(conn, metric=None, top_k=None):
+    """
+    Recomputes every recipe's neighbours from scratch, optionally switching to
+    another metric ('jaccard' or 'cosine') or list length. The caller commits.
+    Returns the number of recipes indexed.
+    """
+    state = _state(conn)
+    metric = metric or (state[1] if state else 'jaccard')
+    top_k = top_k or (state[2] if state else TOP_K)
+    score = METRICS[metric]
+    last_recipe_id = conn.execute("SELECT COALESCE(MAX(RecipeID), 0) FROM Recipes").fetchone()[0]
+
+    recipe_ids = array('q')
+    ingredient_sets = []  # Tuples of IngredientIDs, parallel to recipe_ids
+    current = None
+    cursor = conn.execute("SELECT RecipeID, IngredientID FROM RecipeIngredients WHERE RecipeID <= ? "
+                          "ORDER BY RecipeID", (last_recipe_id,))
+    for recipe_id, ingredient_id in cursor:
+        if recipe_id != current:
+            recipe_ids.append(recipe_id)
+            ingredient_sets.append([])
+            current = recipe_id
+        ingredient_sets[-1].append(ingredient_id)
+    ingredient_sets = [tuple(ingredients) for ingredients in ingredient_sets]
+
+    buckets_by_band = [array('q') for _ in range(_hasher.num_bands)]
+    for ingredients in ingredient_sets:
+        for band, bucket in enumerate(_hasher.buckets(ingredients)):
+            buckets_by_band[band].append(bucket)
+
+    conn.execute("DELETE FROM RecipeSignatureBands")
+    conn.execute("DELETE FROM SimilarRecipes")
+    neighbours = [[] for _ in recipe_ids]
+    exact = len(recipe_ids) <= EXACT_LIMIT
+    if exact:
+        _score_all_pairs(ingredient_sets, recipe_ids, neighbours, score, top_k)
+    for buckets in buckets_by_band:
+        order = sorted(range(len(recipe_ids)), key=buckets.__getitem__)
+        conn.executemany("INSERT OR IGNORE INTO RecipeSignatureBands (Bucket, RecipeID) VALUES (?, ?)",
+                         [(buckets[i], recipe_ids[i]) for i in order])
+        if exact:
+            continue
+        start = 0
+        while start < len(order):
+            end = start + 1
+            while end < len(order) and buckets[order[end]] == buckets[order[start]]:
+                end += 1
+            group = order[start:end]
+            for position, i in enumerate(group):
+                ingredients = set(ingredient_sets[i])
+                for j in group[position + 1:position + 1 + BUCKET_WINDOW]:
+                    other = ingredient_sets[j]
+                    similarity = score(len(ingredients.intersection(other)), len(ingredients), len(other))
+                    # Inline the cheap "not good enough for either list" check; most pairs stop here.
+                    if len(neighbours[i]) < top_k or -similarity < neighbours[i][-1][0]:
+                        _offer(neighbours[i], recipe_ids[j], similarity, top_k)
+                    if len(neighbours[j]) < top_k or -similarity < neighbours[j][-1][0]:
+                        _offer(neighbours[j], recipe_ids[i], similarity, top_k)
+            start = end
+
+    conn.executemany("INSERT INTO SimilarRecipes (RecipeID, SimilarRecipeID, Score) VALUES (?, ?, ?)",
+                     [(recipe_ids[i], other_id, -negative_score)
+                      for i, best in enumerate(neighbours) for negative_score, other_id in best])
+    conn.execute("DELETE FROM SimilarityState")
+    conn.execute("INSERT INTO SimilarityState (Id, LastRecipeID, Metric, TopK) VALUES (1, ?, ?, ?)",
+                 (last_recipe_id, metric, top_k))
+    return len(recipe_ids)
+
+def _score_all_pairs(ingredient_sets, recipe_ids, neighbours, score, top_k):
+    """Fills `neighbours` (parallel to recipe_ids) by scoring every pair of recipes with an ingredient in common."""
+    sets = [set(ingredients) for ingredients in ingredient_sets]
+    for i, ingredients in enumerate(sets):
+        for j in range(i + 1, len(sets)):
+            shared = len(ingredients.intersection(sets[j]))
+            if shared:
+                similarity = score(shared, len(ingredients), len(sets[j]))
+                if len(neighbours[i]) < top_k or -similarity < neighbours[i][-1][0]:
+                    _offer(neighbours[i], recipe_ids[j], similarity, top_k)
+                if len(neighbours[j]) < top_k or -similarity < neighbours[j][-1][0]:
+                    _offer(neighbours[j], recipe_ids[i], similarity, top_k)
+
+def _ingredient_sets(conn, recipe_ids, known):
+    """Returns {RecipeID: tuple of IngredientIDs} for recipe_ids, reading those not in `known` (and adding them to it)."""
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in known]
+    if missing:
+        sets = {}
+        cursor = conn.execute("""
+            SELECT RecipeID, IngredientID FROM RecipeIngredients
+            WHERE RecipeID IN (SELECT value FROM json_each(?))
+        """, (json.dumps(missing),))
+        for recipe_id, ingredient_id in cursor.fetchall():
+            sets.setdefault(recipe_id, []).append(ingredient_id)
+        for recipe_id in missing:
+            known[recipe_id] = tuple(sets.get(recipe_id, ()))
+    return {recipe_id: known[recipe_id] for recipe_id in recipe_ids if known[recipe_id]}
+
+def _load_neighbours(conn, recipe_ids, lists):
+    """Reads the stored neighbour lists of recipe_ids not already in `lists`."""
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in lists]
+    if not missing:
+        return
+    for recipe_id in missing:
+        lists[recipe_id] = []
+    cursor = conn.execute("""
+        SELECT RecipeID, SimilarRecipeID, Score FROM SimilarRecipes
+        WHERE RecipeID IN (SELECT value FROM json_each(?))
+    """, (json.dumps(missing),))
+    for recipe_id, other_id, score in cursor.fetchall():
+        lists[recipe_id].append((-score, other_id))
+    for recipe_id in missing:
+        lists[recipe_id].sort()
+
+def _place_recipes(conn, recipe_sets, score, top_k, exact=False):
+    """
+    Stores the buckets and neighbour list of each recipe in `recipe_sets`
+    ({RecipeID: IngredientIDs}) and enters it into its neighbours' lists,
+    replacing any score it already had there. With `exact`, every recipe with
+    an ingredient in common is a candidate, not just the bucket members.
+    """
+    lists = {}  # RecipeID -> best-first [(-score, RecipeID)], read from SimilarRecipes when first needed
+    known = {recipe_id: tuple(ingredients) for recipe_id, ingredients in recipe_sets.items()}
+    changed = set()
+    for recipe_id, ingredients in recipe_sets.items():
+        buckets = _hasher.buckets(ingredients)
+        candidate_ids = set()
+        if exact:
+            cursor = conn.execute(_SHARING_RECIPES_SQL, (json.dumps(list(ingredients)),))
+            candidate_ids.update(row[0] for row in cursor.fetchall())
+        else:
+            # The newest BUCKET_WINDOW members of each bucket: the recipes a rebuild would compare a new one with.
+            for bucket in buckets:
+                cursor = conn.execute(_BUCKET_MEMBERS_SQL, (bucket, BUCKET_WINDOW))
+                candidate_ids.update(row[0] for row in cursor.fetchall())
+        candidate_ids.discard(recipe_id)
+        candidates = _ingredient_sets(conn, candidate_ids, known)
+        conn.executemany("INSERT OR IGNORE INTO RecipeSignatureBands (Bucket, RecipeID) VALUES (?, ?)",
+                         [(bucket, recipe_id) for bucket in buckets])
+
+        _load_neighbours(conn, list(candidates), lists)
+        own = lists[recipe_id] = []
+        changed.add(recipe_id)
+        ingredients = set(ingredients)
+        for other_id, other_ingredients in candidates.items():
+            shared = len(ingredients.intersection(other_ingredients))
+            similarity = score(shared, len(ingredients), len(other_ingredients))
+            _offer(own, other_id, similarity, top_k)
+            neighbours = lists[other_id]
+            stale = [entry for entry in neighbours if entry[1] == recipe_id]
+            for entry in stale:
+                neighbours.remove(entry)
+            if _offer(neighbours, recipe_id, similarity, top_k) or stale:
+                changed.add(other_id)
+
+    conn.execute("DELETE FROM SimilarRecipes WHERE RecipeID IN (SELECT value FROM json_each(?))",
+                 (json.dumps(sorted(changed)),))
+    conn.executemany("INSERT INTO SimilarRecipes (RecipeID, SimilarRecipeID, Score) VALUES (?, ?, ?)",
+                     [(recipe_id, other_id, -negative_score)
+                      for recipe_id in changed for negative_score, other_id in lists[recipe_id]])
+
+_BUCKET_MEMBERS_SQL = "SELECT RecipeID FROM RecipeSignatureBands WHERE Bucket = ? ORDER BY RecipeID DESC LIMIT ?"
+_SHARING_RECIPES_SQL = """
+    SELECT DISTINCT RecipeID FROM RecipeIngredients
+    WHERE IngredientID IN (SELECT value FROM json_each(?))
+"""
+
+def _recipe_count(conn):
+    """The number of recipes, from CatalogStats (see recipe_stats.py) when it exists, else counted."""
+    try:
+        return conn.execute("SELECT Recipes FROM CatalogStats WHERE Id = 1").fetchone()[0]
+    except (sqlite3.OperationalError, TypeError):
+        return conn.execute("SELECT COUNT(*) FROM Recipes").fetchone()[0]
+
+def sync_similar_recipes(conn, rebuild_fraction=None):
+    """
+    Finds neighbours for the recipes added since the last sync and enters each
+    of them into its neighbours' lists. With `rebuild_fraction`, rebuilds
+    everything instead if more than that share of the recipes are new (for
+    bulk imports, where that is cheaper). Runs in the caller's transaction;
+    does nothing if the index has not been created. Returns the number of
+    recipes placed.
+    """
+    state = _state(conn)
+    if state is None:
+        return 0
+    last_recipe_id, metric, top_k = state
+    new_sets = {}
+    cursor = conn.execute("SELECT RecipeID, IngredientID FROM RecipeIngredients WHERE RecipeID > ? ORDER BY RecipeID",
+                          (last_recipe_id,))
+    for recipe_id, ingredient_id in cursor.fetchall():
+        new_sets.setdefault(recipe_id, []).append(ingredient_id)
+    newest = conn.execute("SELECT COALESCE(MAX(RecipeID), 0) FROM Recipes").fetchone()[0]
+    if newest <= last_recipe_id:
+        return 0
+    if rebuild_fraction is not None and len(new_sets) > rebuild_fraction * _recipe_count(conn):
+        return rebuild_similar_recipes(conn)  # Cheaper than placing most of the catalog one recipe at a time.
+
+    _place_recipes(conn, new_sets, METRICS[metric], top_k, exact=_recipe_count(conn) <= EXACT_LIMIT)
+    conn.execute("UPDATE SimilarityState SET LastRecipeID = ?", (newest,))
+    return len(new_sets)
+
+def replace_similar_recipes(conn, old_ingredients):
+    """
+    Re-places recipes whose ingredients were edited, or drops deleted ones.
+    `old_ingredients` maps each RecipeID to the IngredientIDs it had before, which
+    locate its stored buckets. Runs in the caller's transaction (after the edit);
+    recipes not synced yet are left to sync_similar_recipes().
+    Lists elsewhere that a changed recipe drops out of keep it until the next
+    rebuild; lookups skip deleted recipes.
+    """
+    state = _state(conn)
+    if state is None:
+        return
+    last_recipe_id, metric, top_k = state
+    recipe_ids = [recipe_id for recipe_id in old_ingredients if recipe_id <= last_recipe_id]
+    for recipe_id in recipe_ids:
+        if old_ingredients[recipe_id]:
+            conn.executemany("DELETE FROM RecipeSignatureBands WHERE Bucket = ? AND RecipeID = ?",
+                             [(bucket, recipe_id) for bucket in _hasher.buckets(old_ingredients[recipe_id])])
+        conn.execute("DELETE FROM SimilarRecipes WHERE RecipeID = ?", (recipe_id,))
+    current = _ingredient_sets(conn, recipe_ids, {})
+    if current:
+        _place_recipes(conn, current, METRICS[metric], top_k, exact=_recipe_count(conn) <= EXACT_LIMIT)
+
+if __name__ == '__main__':
+    import argparse
+    import database_setup
+
+    parser = argparse.ArgumentParser(description="Precomputed 'similar recipes' index.")
+    parser.add_argument('--rebuild', action='store_true', help="recompute every recipe's neighbours")
+    parser.add_argument('--metric', choices=sorted(METRICS), help="similarity measure used by --rebuild")
+    parser.add_argument('--top-k', type=int, help="neighbours kept per recipe by --rebuild")
+    parser.add_argument('--recipe', type=int, help="print the recipes most similar to this RecipeID")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(database_setup.DATABASE_FILE)
+    create_similarity_index(conn)
+    if args.rebuild:
+        count = rebuild_similar_recipes(conn, metric=args.metric, top_k=args.top_k)
+        print(f"Indexed {count} recipes.")
+    else:
+        print(f"Placed {sync_similar_recipes(conn)} new recipes.")
+    conn.commit()
+    if args.recipe is not None:
+        for name, score in conn.execute("""
+            SELECT R.RecipeName, S.Score FROM SimilarRecipes S
+            JOIN Recipes R ON R.RecipeID = S.SimilarRecipeID
+            WHERE S.RecipeID = ? ORDER BY S.Score DESC
+        """, (args.recipe,)):
+            print(f"{score:.2f}  {name}")
+    conn.close()
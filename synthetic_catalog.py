@@ -0,0 +1,159 @@
+"""
+Synthetic recipe catalog generator for benchmarks.
+
+Recipes draw their ingredients from a fixed vocabulary with Zipfian popularity
+(a few staples such as salt or butter appear in a large share of recipes, most
+ingredients are rare), have a realistic spread of ingredient and step counts,
+and use the same dict shape as add_recipe / add_recipes_bulk.
+
+Usage:
+    python synthetic_catalog.py --links 1000000 -o catalog.jsonl
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import sys
+
+BASE_INGREDIENTS = [
+    'salt', 'butter', 'garlic', 'onion', 'olive oil', 'black pepper', 'sugar', 'egg', 'all-purpose flour', 'milk',
+    'water', 'lemon juice', 'tomato', 'baking powder', 'vanilla extract', 'parsley', 'cheddar cheese', 'chicken breast',
+    'soy sauce', 'brown sugar', 'honey', 'ginger', 'cilantro', 'lime', 'carrot', 'celery', 'potato', 'rice',
+    'heavy cream', 'parmesan cheese', 'basil', 'oregano', 'thyme', 'rosemary', 'cumin', 'paprika', 'chili powder',
+    'cinnamon', 'nutmeg', 'baking soda', 'yeast', 'vegetable oil', 'red wine vinegar', 'balsamic vinegar', 'mustard',
+    'mayonnaise', 'sour cream', 'yogurt', 'avocado', 'spinach', 'mushroom', 'bell pepper', 'zucchini', 'broccoli',
+    'cauliflower', 'green beans', 'peas', 'corn', 'black beans', 'chickpeas', 'lentils', 'ground beef', 'pork loin',
+    'bacon', 'ham', 'salmon', 'shrimp', 'tuna', 'cod', 'tofu', 'coconut milk', 'peanut butter', 'almonds', 'walnuts',
+    'pecans', 'raisins', 'oats', 'quinoa', 'pasta', 'spaghetti', 'tortilla', 'bread crumbs', 'chicken stock',
+    'beef stock', 'white wine', 'red wine', 'maple syrup', 'cocoa powder', 'chocolate chips', 'cream cheese',
+    'mozzarella', 'feta', 'cucumber', 'red onion', 'shallot', 'scallion', 'jalapeno', 'cabbage', 'kale', 'apple',
+    'banana', 'blueberries', 'strawberries', 'orange zest', 'dill', 'mint', 'sage', 'bay leaf', 'turmeric',
+    'coriander', 'cardamom', 'cloves', 'sesame oil', 'fish sauce', 'rice vinegar', 'miso', 'tahini', 'capers',
+    'olives', 'anchovies', 'pine nuts', 'sweet potato', 'butternut squash', 'eggplant', 'leek', 'fennel', 'radish',
+]
+
+MODIFIERS = [
+    'fresh', 'dried', 'smoked', 'roasted', 'ground', 'chopped', 'toasted', 'organic', 'frozen', 'canned',
+    'minced', 'sliced', 'grated', 'crushed', 'whole', 'low-fat', 'unsalted', 'spicy', 'sweet', 'aged',
+]
+
+UNITS = ['cup', 'cups', 'tbsp', 'tsp', 'g', 'kg', 'ml', 'oz', 'lb', 'pinch', 'clove', 'cloves', 'slice', 'can']
+AMOUNTS = ['1/4', '1/3', '1/2', '3/4', '1', '1 1/2', '2', '2 1/2', '3', '4', '6', '8', '100', '250', '500']
+NOTES = ['', '', '', ', chopped', ', diced', ', melted', ', softened', ', to taste', ' (optional)', ', divided']
+
+DISHES = ['soup', 'stew', 'salad', 'pasta', 'curry', 'pie', 'cake', 'bread', 'tacos', 'casserole', 'stir-fry',
+          'risotto', 'omelette', 'pancakes', 'muffins', 'cookies', 'chili', 'bowl', 'sandwich', 'roast']
+STYLES = ['Classic', 'Easy', 'Weeknight', 'Spicy', 'Creamy', 'Rustic', 'Quick', 'Hearty', 'Grandma\'s', 'Vegan']
+
+STEP_TEMPLATES = [
+    'Preheat the oven to {temp} degrees.',
+    'Combine the {a} and {b} in a large bowl.',
+    'Chop the {a} and set aside.',
+    'Heat the {a} in a skillet over medium heat.',
+    'Add the {a} and cook for {minutes} minutes, stirring occasionally.',
+    'Whisk in the {a} until smooth.',
+    'Season with {a} and {b}.',
+    'Simmer for {minutes} minutes until thickened.',
+    'Fold in the {a} gently.',
+    'Bake for {minutes} minutes or until golden.',
+    'Let rest for {minutes} minutes before serving.',
+    'Garnish with {a} and serve warm.',
+]
+
+def ingredient_vocabulary(size):
+    """Returns `size` distinct ingredient names, most common-sounding first."""
+    names = list(BASE_INGREDIENTS)
+    for modifier, base in itertools.product(MODIFIERS, BASE_INGREDIENTS):
+        if len(names) >= size:
+            break
+        names.append(f"{modifier} {base}")
+    n = 0
+    while len(names) < size:
+        n += 1
+        names.append(f"{BASE_INGREDIENTS[n % len(BASE_INGREDIENTS)]} variety {n}")
+    return names[:size]
+
+class ZipfSampler:
+    """Samples distinct ranks 0..n-1 with probability proportional to 1 / (rank + 1) ** exponent."""
+
+    def __init__(self, n, exponent, rng):
+        self.rng = rng
+        total = 0.0
+        self.cumulative = []
+        for rank in range(1, n + 1):
+            total += 1.0 / rank ** exponent
+            self.cumulative.append(total)
+        self.total = total
+
+    def sample_distinct(self, k):
+        chosen = set()
+        k = min(k, len(self.cumulative))
+        while len(chosen) < k:
+            chosen.add(bisect.bisect_left(self.cumulative, self.rng.random() * self.total))
+        return list(chosen)
+
+def generate_recipes(link_count=None, recipe_count=None, vocabulary_size=5000, zipf_exponent=1.1,
+                     mean_ingredients=9, seed=42):
+    """
+    Yields synthetic recipes until `link_count` recipe-ingredient links or
+    `recipe_count` recipes have been produced (whichever is given).
+    The same arguments always produce the same catalog.
+    """
+    if link_count is None and recipe_count is None:
+        raise ValueError("give link_count or recipe_count")
+    rng = random.Random(seed)
+    vocabulary = ingredient_vocabulary(vocabulary_size)
+    sampler = ZipfSampler(len(vocabulary), zipf_exponent, rng)
+
+    links = 0
+    for n in itertools.count():
+        if recipe_count is not None and n >= recipe_count:
+            return
+        if link_count is not None and links >= link_count:
+            return
+
+        size = max(2, min(30, int(rng.gauss(mean_ingredients, 3))))
+        if link_count is not None:
+            size = min(size, link_count - links) or 1
+        ingredients = [vocabulary[rank] for rank in sampler.sample_distinct(size)]
+        links += len(ingredients)
+
+        steps = []
+        for _ in range(rng.randint(3, 10)):
+            template = rng.choice(STEP_TEMPLATES)
+            steps.append(template.format(a=rng.choice(ingredients), b=rng.choice(ingredients),
+                                         temp=rng.choice([325, 350, 375, 400, 425]),
+                                         minutes=rng.choice([5, 10, 15, 20, 30, 45])))
+
+        main = ingredients[0]
+        yield {
+            'name': f"{rng.choice(STYLES)} {main.title()} {rng.choice(DISHES).title()} #{n + 1}",
+            'description': f"A {rng.choice(['simple', 'family', 'festive', 'healthy', 'comforting'])} "
+                           f"{rng.choice(DISHES)} featuring {main} and {ingredients[-1]}.",
+            'ingredients': [{'name': name, 'quantity': f"{rng.choice(AMOUNTS)} {rng.choice(UNITS)}{rng.choice(NOTES)}"}
+                            for name in ingredients],
+            'instructions': steps,
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic recipe catalog as JSONL.")
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--links', type=int, help="number of recipe-ingredient links to generate")
+    size.add_argument('--recipes', type=int, help="number of recipes to generate")
+    parser.add_argument('--vocabulary', type=int, default=5000, help="number of distinct ingredients")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of ingredient popularity")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for recipe in generate_recipes(args.links, args.recipes, args.vocabulary, args.zipf, seed=args.seed):
+            out.write(json.dumps(recipe) + '\n')
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == '__main__':
+    main()
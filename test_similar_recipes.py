@@ -0,0 +1,50 @@
+"""
+Checks that the sample recipes find their neighbours in the similar-recipes index.
+
+    python -m unittest test_similar_recipes
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import database_setup
+import db_operations
+import insert_sample_data
+import similar_recipes
+
+class SampleCatalogNeighboursTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database = os.path.join(directory.name, 'recipes.db')
+        previous = db_operations.DATABASE_FILE
+        db_operations.DATABASE_FILE = self.database
+        self.addCleanup(setattr, db_operations, 'DATABASE_FILE', previous)
+        with contextlib.redirect_stdout(io.StringIO()):
+            database_setup.upgrade_database(self.database)
+            insert_sample_data.insert_samples()
+        self.ids = {name: recipe_id for recipe_id, name in db_operations.list_all_recipes()}
+
+    def assertOmeletteIsPancakesNeighbour(self):
+        similar = db_operations.get_similar_recipes(self.ids['Classic Pancakes'])
+        self.assertIn({'id': self.ids['Basic Omelette'], 'name': 'Basic Omelette', 'score': 0.4}, similar)
+        self.assertEqual(similar[0]['name'], 'Basic Omelette')
+
+    def test_neighbour_found_as_recipes_are_added(self):
+        self.assertOmeletteIsPancakesNeighbour()
+
+    def test_neighbour_found_after_rebuild(self):
+        conn = sqlite3.connect(self.database)
+        try:
+            similar_recipes.rebuild_similar_recipes(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        self.assertOmeletteIsPancakesNeighbour()
+
+if __name__ == '__main__':
+    unittest.main()